@@ -1,9 +1,11 @@
 import random
-from typing import Dict, Tuple, Union
+from typing import Optional, Tuple, Union
 
 from Crypto.Cipher import AES
 
-from crypto_pkg.attacks.block_ciphers.utils import Text, prepare_key
+from crypto_pkg.attacks.block_ciphers.external_mitm import ExternalMITM
+from crypto_pkg.attacks.block_ciphers.mitm import MITMCache, MITMTable
+from crypto_pkg.attacks.block_ciphers.utils import KeySpace, Text, prepare_key
 from crypto_pkg.utils.logging import get_logger, set_level
 
 log = get_logger(__name__)
@@ -24,33 +26,64 @@ class DoubleAESAttack:
         return Text(text=plain_text)
 
     @classmethod
-    def lookup_table_computation(cls, plain_text: str, max_key: int = 24) -> Dict[int, int]:
+    def lookup_table_computation(cls, plain_text: str, max_key: int = 24, workers: Optional[int] = 1,
+                                 cache: bool = False) -> MITMTable:
         log.info(f"Compute lookup table for plaintext {plain_text}")
-        p = Text(text=bytes.fromhex(plain_text))
         log.debug("Starting lookup table computation")
-        out = {cls.encrypt(key=prepare_key(key=i, max_key=max_key), plain_text=p).integer: i for i in
-               range(1, 2 ** max_key)}
-        log.debug("Lookup table computation completed")
+        if cache:
+            out = MITMCache().get_or_build(plain_text=bytes.fromhex(plain_text), max_key=max_key, workers=workers)
+        else:
+            out = MITMTable.build(plain_text=bytes.fromhex(plain_text), max_key=max_key, workers=workers)
+        log.debug(f"Lookup table computation completed ({out.nbytes / 2 ** 20:.0f} MiB)")
         return out
 
     @classmethod
-    def search_match(cls, cipher_text: str, lookup_table: Dict[int, int]) -> Union[Tuple[Text, Text], None]:
+    def search_match(cls, cipher_text: str, lookup_table: MITMTable, max_key: int = 24,
+                     workers: Optional[int] = 1, checkpoint: Optional[str] = None) -> Union[Tuple[Text, Text], None]:
         log.info(f"Search match for ciphertext {cipher_text}")
-        c = Text(text=bytes.fromhex(cipher_text))
-        for i in range(2 ** 24):
-            key = prepare_key(i)
-            m = cls.decrypt(key=key, cipher_text=c)
-            if lookup_table.get(m.integer):
-                log.debug(f"Match found for key {key}")
-                return prepare_key(lookup_table.get(m.integer)), key
+        match = lookup_table.search(bytes.fromhex(cipher_text), max_key=max_key, workers=workers,
+                                    checkpoint=checkpoint)
+        if match:
+            k1 = Text(text=KeySpace.prefix(lookup_table.max_key).key(match[0]))
+            k2 = Text(text=KeySpace.prefix(max_key).key(match[1]))
+            log.debug(f"Match found for key {k2}")
+            return k1, k2
 
     @classmethod
     @set_level(logger=log)
-    def attack(cls, plain_text: str, cipher_text: str, max_key: int = 24, _verbose: bool = False):
+    def attack(cls, plain_text: str, cipher_text: str, max_key: int = 24, workers: Optional[int] = None,
+               cache: bool = False, memory_budget: Optional[int] = None, checkpoint: Optional[str] = None,
+               _verbose: bool = False):
+        """
+        Meet-in-the-middle key recovery of a double AES encryption
+
+        Args:
+            plain_text: 128bits plain text in hexadecimal
+            cipher_text: 128bits double encryption of the plain text in hexadecimal
+            max_key: number of unknown leading bits of each key
+            workers: number of processes for both phases - default: number of cores
+            cache: reuse the table of a previous attack on the same plain text, stored in settings.cache_dir
+            memory_budget: if the in-memory table (12 bytes per key) does not fit in this many bytes, run the
+                out-of-core sort-merge attack within the budget instead (single process, no cache)
+            checkpoint: JSON file of the second keys already searched, to resume an interrupted search
+        Returns:
+            the two keys as Text objects, None if no pair of keys matches
+        """
+        space = KeySpace.prefix(max_key)
+        if memory_budget is not None and 12 * space.size > memory_budget:
+            log.info(f"Running the out-of-core attack with a memory budget of {memory_budget} bytes")
+            match = ExternalMITM(plain_text=bytes.fromhex(plain_text), cipher_text=bytes.fromhex(cipher_text),
+                                 max_key=max_key, memory_budget=memory_budget).search()
+            if match:
+                log.debug("Key Found")
+                return Text(text=space.key(match[0])), Text(text=space.key(match[1]))
+            return None
         log.info(f"Constructing encryption lookup table for plain text {plain_text} ans maximum key size {max_key}")
-        look_up_table = cls.lookup_table_computation(plain_text=plain_text, max_key=max_key)
-        log.info("Search encryption match in lookup table")
-        keys = cls.search_match(cipher_text=cipher_text, lookup_table=look_up_table)
+        with cls.lookup_table_computation(plain_text=plain_text, max_key=max_key, workers=workers,
+                                          cache=cache) as look_up_table:
+            log.info("Search encryption match in lookup table")
+            keys = cls.search_match(cipher_text=cipher_text, lookup_table=look_up_table, max_key=max_key,
+                                    workers=workers, checkpoint=checkpoint)
         log.debug("Key Found")
         return keys
 
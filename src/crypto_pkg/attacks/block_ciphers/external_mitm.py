@@ -0,0 +1,197 @@
+import os
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.mitm import MITM_CHUNK
+from crypto_pkg.attacks.block_ciphers.utils import key_blocks
+from crypto_pkg.ciphers.symmetric.aes_variants import STANDARD_AES, VariantAES
+from crypto_pkg.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Run file record: first 64 bits of the encryption (or decryption) and key index
+RECORD = np.dtype([('fingerprint', '<u8'), ('key', '<u4')])
+# Bytes per record while a run is sorted: the records, the int64 permutation and the sorted copy
+_SORT_BYTES = 2 * RECORD.itemsize + 8
+MEMORY_BUDGET = 256 * 2 ** 20
+_MAX_FINGERPRINT = 2 ** 64 - 1
+
+
+class _SortedStream:
+    """ Buffered reader of an iterator of sorted record blocks, consumed up to increasing bounds """
+
+    def __init__(self, blocks: Iterator[np.ndarray]):
+        self._blocks = blocks
+        self._buffer = np.empty(0, dtype=RECORD)
+        self._finished = False
+        self._fill()
+
+    def _fill(self) -> None:
+        # The buffer always holds a record below the horizon, so that pop_before makes progress
+        while not self._finished and (not len(self._buffer) or
+                                      self._buffer['fingerprint'][0] == self._buffer['fingerprint'][-1]):
+            block = next(self._blocks, None)
+            if block is None:
+                self._finished = True
+            else:
+                self._buffer = np.concatenate([self._buffer, block])
+
+    @property
+    def empty(self) -> bool:
+        return self._finished and not len(self._buffer)
+
+    @property
+    def horizon(self) -> int:
+        """ Largest fingerprint that can be consumed without reading further blocks """
+        return _MAX_FINGERPRINT if self._finished else int(self._buffer['fingerprint'][-1])
+
+    def pop_before(self, bound: int, inclusive: bool = False) -> np.ndarray:
+        """ Remove and return the buffered records whose fingerprint is below bound (or equal, if inclusive) """
+        side = 'right' if inclusive else 'left'
+        n = int(np.searchsorted(self._buffer['fingerprint'], np.uint64(bound), side=side))
+        out, self._buffer = self._buffer[:n], self._buffer[n:]
+        self._fill()
+        return out
+
+
+def read_run(path: str, block: int) -> Iterator[np.ndarray]:
+    """ Sequential blocks of a run file """
+    records = np.memmap(path, dtype=RECORD, mode='r')
+    for start in range(0, len(records), block):
+        yield np.array(records[start:start + block])
+
+
+def merge_runs(paths: List[str], block: int) -> Iterator[np.ndarray]:
+    """
+    k-way merge of sorted run files
+
+    Each step consumes every buffered record up to the smallest buffer horizon, so the run whose buffer ends
+    first is refilled and at most k blocks are held in memory.
+
+    Args:
+        paths: run files, each sorted by fingerprint
+        block: records read at once from each run
+    Returns:
+        iterator of sorted record blocks
+    """
+    streams = [_SortedStream(read_run(path, block)) for path in paths]
+    while True:
+        streams = [s for s in streams if not s.empty]
+        if not streams:
+            return
+        bound = min(s.horizon for s in streams)
+        merged = np.concatenate([s.pop_before(bound, inclusive=True) for s in streams])
+        yield merged[np.argsort(merged['fingerprint'], kind='stable')]
+
+
+def merge_join(left: Iterator[np.ndarray], right: Iterator[np.ndarray]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Streaming join of two sorted record streams on the fingerprint
+
+    Returns:
+        iterator of (left keys, right keys) arrays, pair i having equal fingerprints
+    """
+    a, b = _SortedStream(left), _SortedStream(right)
+    while not a.empty and not b.empty:
+        # Records equal to the bound may continue in the next blocks, they are kept for a later step unless both
+        # streams are fully buffered
+        bound = min(a.horizon, b.horizon)
+        inclusive = a.horizon == b.horizon == _MAX_FINGERPRINT
+        ra, rb = a.pop_before(bound, inclusive), b.pop_before(bound, inclusive)
+        if not len(ra) or not len(rb):
+            continue
+        low = np.searchsorted(ra['fingerprint'], rb['fingerprint'], side='left')
+        high = np.searchsorted(ra['fingerprint'], rb['fingerprint'], side='right')
+        counts = high - low
+        if not counts.any():
+            continue
+        rows = np.repeat(np.arange(len(rb)), counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        yield ra['key'][low[rows] + offsets], rb['key'][rows]
+
+
+class ExternalMITM:
+    """
+    Out-of-core meet-in-the-middle attack on double AES encryption. The encryptions of the plain text under the
+    first keys and the decryptions of the cipher text under the second keys are written to disk as sorted runs
+    that fit in the memory budget, then each side is merged and the two are joined in one sequential pass.
+    """
+
+    def __init__(self, plain_text: bytes, cipher_text: bytes, max_key: int = 28, memory_budget: int = MEMORY_BUDGET,
+                 work_dir: Optional[str] = None, aes: Optional[VariantAES] = None):
+        """
+        Args:
+            plain_text: 16-byte plain text
+            cipher_text: 16-byte double encryption of the plain text
+            max_key: number of unknown leading bits of each key, at most 32
+            memory_budget: bytes used by the runs being sorted and by the merge buffers
+            work_dir: directory of the temporary run files - default: system temporary directory
+            aes: cipher, FIPS-197 AES by default
+        """
+        if max_key > 32:
+            raise ValueError("Key indices are stored on 32 bits")
+        self.plain_text = bytes(plain_text)
+        self.cipher_text = bytes(cipher_text)
+        self.max_key = max_key
+        self.memory_budget = memory_budget
+        self.work_dir = work_dir
+        self.aes = aes if aes is not None else VariantAES(STANDARD_AES)
+
+    @property
+    def run_size(self) -> int:
+        """ Records per run """
+        return max(1024, self.memory_budget // _SORT_BYTES)
+
+    def _fingerprints(self, keys: np.ndarray, decrypt: bool) -> np.ndarray:
+        blocks = key_blocks(keys.astype(np.uint64), self.max_key)
+        if decrypt:
+            return self.aes.decrypt_under_keys(self.cipher_text, blocks, packed=True)[:, 0]
+        return self.aes.encrypt_under_keys(self.plain_text, blocks, packed=True)[:, 0]
+
+    def write_runs(self, directory: str, decrypt: bool) -> List[str]:
+        """
+        Write the sorted runs of one side of the attack
+
+        Args:
+            directory: destination of the run files
+            decrypt: backward side (decryptions of the cipher text) instead of the forward side
+        Returns:
+            paths of the run files
+        """
+        n = 2 ** self.max_key
+        paths = []
+        for first in range(0, n, self.run_size):
+            run = np.empty(min(self.run_size, n - first), dtype=RECORD)
+            run['key'] = np.arange(first, first + len(run), dtype=np.uint32)
+            chunk = min(MITM_CHUNK, self.run_size)
+            for start in range(0, len(run), chunk):
+                run['fingerprint'][start:start + chunk] = self._fingerprints(run['key'][start:start + chunk], decrypt)
+            run = run[np.argsort(run['fingerprint'], kind='stable')]
+            path = os.path.join(directory, f"{'backward' if decrypt else 'forward'}-{len(paths):05d}.run")
+            run.tofile(path)
+            paths.append(path)
+        log.debug(f"{len(paths)} {'backward' if decrypt else 'forward'} runs written")
+        return paths
+
+    def candidates(self, directory: str) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """ Key index pairs with equal fingerprints, the run files being written in directory """
+        forward = self.write_runs(directory, decrypt=False)
+        backward = self.write_runs(directory, decrypt=True)
+        # Both merges hold one block per run, the output blocks being at most as large
+        block = max(1024, self.memory_budget // (2 * RECORD.itemsize * (len(forward) + len(backward))))
+        yield from merge_join(merge_runs(forward, block), merge_runs(backward, block))
+
+    def matches(self) -> Iterator[Tuple[int, int]]:
+        """ (first key index, second key index) pairs whose full 128-bit middle values are equal """
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as directory:
+            for first_keys, second_keys in self.candidates(directory):
+                middle = self.aes.encrypt_under_keys(self.plain_text, key_blocks(first_keys, self.max_key), True)
+                back = self.aes.decrypt_under_keys(self.cipher_text, key_blocks(second_keys, self.max_key), True)
+                for i in np.flatnonzero((middle == back).all(axis=1)):
+                    yield int(first_keys[i]), int(second_keys[i])
+
+    def search(self) -> Optional[Tuple[int, int]]:
+        """ First matching (first key index, second key index) pair, None if there is none """
+        return next(self.matches(), None)
@@ -0,0 +1,199 @@
+import random
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import reversed_box
+from crypto_pkg.ciphers.symmetric.aes_variants import AESVariant, VariantAES
+from crypto_pkg.number_theory import gf256
+from crypto_pkg.utils.logging import get_logger, set_level
+
+log = get_logger(__name__)
+
+_INV_SBOX = np.array(reversed_box, dtype=np.uint8)
+_INV_MIX = np.array([[0x0e, 0x0b, 0x0d, 0x09], [0x09, 0x0e, 0x0b, 0x0d], [0x0d, 0x09, 0x0e, 0x0b],
+                     [0x0b, 0x0d, 0x09, 0x0e]], dtype=np.uint8)
+_GUESSES = np.arange(256, dtype=np.uint8)
+# Key candidates of the 5-round attack processed at once: (chunk, 256 guesses, 256 texts) bytes
+CANDIDATE_CHUNK = 256
+
+
+def lambda_set(active: int = 0, constant: Optional[bytes] = None) -> np.ndarray:
+    """
+    Λ-set of 256 plain texts: the active byte takes every value, the other bytes are constant
+
+    Args:
+        active: position of the active byte (column-major, 4 * column + row)
+        constant: value of the constant bytes, random if not provided
+    Returns:
+        (256, 16) uint8 array
+    """
+    constant = constant if constant is not None else bytes(random.getrandbits(8) for _ in range(16))
+    blocks = np.tile(np.frombuffer(bytes(constant), dtype=np.uint8), (256, 1))
+    blocks[:, active] = _GUESSES
+    return blocks
+
+
+def balanced_guesses(cipher_texts: np.ndarray) -> np.ndarray:
+    """
+    Last round key guesses passing the balance test on every byte position
+
+    The bytes before the last SubBytes of a 4-round encryption of a Λ-set are balanced (they XOR to zero), so a guess
+    g of key byte i is kept if the XOR over the set of InvSBox(c[i] ^ g) is zero. All 16 x 256 guesses are tested
+    with one lookup in a (16, 256 guesses, 256 texts) array.
+
+    Args:
+        cipher_texts: (256, 16) uint8 array, encryptions of a Λ-set
+    Returns:
+        (16, 256) boolean array, True for the guesses of each key byte consistent with the set
+    """
+    partial = _INV_SBOX[cipher_texts.T[:, None, :] ^ _GUESSES[None, :, None]]
+    return np.bitwise_xor.reduce(partial, axis=2) == 0
+
+
+def column_positions(column: int) -> List[int]:
+    """ Cipher text positions of the bytes of a state column after the last ShiftRows """
+    return [4 * ((column - r) % 4) + r for r in range(4)]
+
+
+def balanced_guesses_5_rounds(cipher_texts: np.ndarray, candidates: np.ndarray, column: int = 0,
+                              row: int = 0) -> np.ndarray:
+    """
+    Balance test of the 5-round attack for candidate values of four last round key bytes
+
+    The four bytes of a column of the fourth round output are partially decrypted through the last round with the
+    candidate key bytes, then through InvMixColumns, leaving one byte of the equivalent fourth round key (the
+    extra guessed byte) before the balanced SubBytes input of round 4.
+
+    Args:
+        cipher_texts: (256, 16) uint8 array, 5-round encryptions of a Λ-set
+        candidates: (M, 4) uint8 array of last round key bytes at column_positions(column)
+        column: state column attacked
+        row: byte of the column checked after InvMixColumns
+    Returns:
+        (M, 256) boolean array, True for the (candidate, extra byte) pairs consistent with the set
+    """
+    c = cipher_texts[:, column_positions(column)]
+    out = np.empty((len(candidates), 256), dtype=bool)
+    for start in range(0, len(candidates), CANDIDATE_CHUNK):
+        k = np.asarray(candidates[start:start + CANDIDATE_CHUNK], dtype=np.uint8)
+        # (m, 256 texts, 4) bytes of the column before the last SubBytes
+        y = _INV_SBOX[c[None, :, :] ^ k[:, None, :]]
+        z = np.bitwise_xor.reduce(gf256.MUL_TABLE[_INV_MIX[row], y], axis=2)
+        partial = _INV_SBOX[z[:, None, :] ^ _GUESSES[None, :, None]]
+        out[start:start + len(k)] = np.bitwise_xor.reduce(partial, axis=2) == 0
+    return out
+
+
+class IntegralAttack:
+    """
+    Integral (Square) attack on round-reduced AES, using chosen Λ-sets of plain texts.
+
+    The CustomAES key schedule drops the third column and the last byte of the second column of each round key,
+    so it cannot be run backwards: the attack returns the last round key, not the cipher key.
+    """
+
+    def __init__(self, oracle: Callable[[np.ndarray], np.ndarray], rounds: int = 4):
+        """
+        Args:
+            oracle: encrypts an (N, 16) uint8 array of plain texts under the unknown key
+            rounds: number of rounds of the cipher, 4 or 5, the last one without MixColumns
+        """
+        if rounds not in (4, 5):
+            raise ValueError("The integral attack is implemented for 4 and 5 rounds")
+        self.oracle = oracle
+        self.rounds = rounds
+        self.queries = 0
+
+    def encrypt_set(self, active: int = 0, constant: Optional[bytes] = None) -> np.ndarray:
+        self.queries += 256
+        return self.oracle(lambda_set(active=active, constant=constant))
+
+    @set_level(logger=log)
+    def attack_4_rounds(self, max_sets: int = 8, _verbose: bool = False) -> bytes:
+        """
+        Recover the last round key of 4-round AES
+
+        Args:
+            max_sets: maximum number of Λ-sets to query, each one divides the wrong guesses by about 256
+        Returns:
+            16-byte last round key
+        Raises:
+            ValueError: if some key byte is still ambiguous after max_sets sets
+        """
+        if self.rounds != 4:
+            raise ValueError("attack_4_rounds needs a 4-round oracle")
+        candidates = np.ones((16, 256), dtype=bool)
+        for i in range(max_sets):
+            candidates &= balanced_guesses(self.encrypt_set())
+            remaining = candidates.sum(axis=1)
+            log.debug(f"Λ-set {i + 1}: {remaining.sum()} candidates left")
+            if (remaining == 1).all():
+                key = bytes(int(np.argmax(row)) for row in candidates)
+                log.info(f"Last round key: {key.hex()}")
+                return key
+        raise ValueError(f"Key bytes still ambiguous after {max_sets} Λ-sets")
+
+    @set_level(logger=log)
+    def attack_5_rounds(self, candidates: np.ndarray, column: int = 0, max_sets: int = 8,
+                        _verbose: bool = False) -> np.ndarray:
+        """
+        Filter candidates of one column of the last round key of 5-round AES, guessing an extra byte of the fourth
+        round key. Testing all 2^32 column values would cost 2^40 partial decryptions per set, so the candidates are
+        restricted by the caller (e.g. side information or a partially known key).
+
+        Args:
+            candidates: (M, 4) uint8 array of last round key bytes at column_positions(column)
+            column: state column attacked
+            max_sets: maximum number of Λ-sets to query
+        Returns:
+            (M', 4) uint8 array of the candidates consistent with all queried sets
+        """
+        if self.rounds != 5:
+            raise ValueError("attack_5_rounds needs a 5-round oracle")
+        candidates = np.asarray(candidates, dtype=np.uint8).reshape(-1, 4)
+        for i in range(max_sets):
+            cipher_texts = self.encrypt_set()
+            # A candidate survives if at least one extra byte balances every checked row
+            keep = np.ones(len(candidates), dtype=bool)
+            for row in range(4):
+                keep &= balanced_guesses_5_rounds(cipher_texts, candidates, column=column, row=row).any(axis=1)
+            candidates = candidates[keep]
+            log.debug(f"Λ-set {i + 1}: {len(candidates)} candidates left")
+            if len(candidates) <= 1:
+                break
+        log.info(f"Column {column} candidates: {[bytes(c).hex() for c in candidates]}")
+        return candidates
+
+
+def reduced_round_oracle(key: bytes, rounds: int = 4) -> Callable[[np.ndarray], np.ndarray]:
+    """ Encryption oracle of CustomAES reduced to the given number of rounds """
+    aes = VariantAES(AESVariant(rounds=rounds))
+    expanded_key = aes.expand_key(key)
+    return lambda blocks: aes.encrypt_blocks(blocks, expanded_key)
+
+
+def last_round_key(key: bytes, rounds: int = 4) -> bytes:
+    """ Last round key of CustomAES reduced to the given number of rounds """
+    words = VariantAES(AESVariant(rounds=rounds)).expand_key(key).words
+    return b"".join(w.to_bytes(4, 'big') for w in words[-4:])
+
+
+if __name__ == '__main__':
+    ''' Example '''
+    secret = bytes(random.getrandbits(8) for _ in range(16))
+
+    # ---- 4 rounds: the full last round key is recovered
+    attack = IntegralAttack(oracle=reduced_round_oracle(secret, rounds=4), rounds=4)
+    found = attack.attack_4_rounds(_verbose=True)
+    assert found == last_round_key(secret, rounds=4)
+    print(f"4 rounds: last round key {found.hex()} recovered with {attack.queries} chosen plain texts")
+
+    # ---- 5 rounds: one column of the last round key among 4096 candidates
+    k5 = np.frombuffer(last_round_key(secret, rounds=5), dtype=np.uint8)[column_positions(0)]
+    guesses = np.random.default_rng().integers(0, 256, size=(4096, 4), dtype=np.uint8)
+    guesses[1234] = k5
+    attack = IntegralAttack(oracle=reduced_round_oracle(secret, rounds=5), rounds=5)
+    left = attack.attack_5_rounds(guesses, column=0)
+    assert (left == k5).all(axis=1).any()
+    print(f"5 rounds: {len(left)} column candidate(s) left, {attack.queries} chosen plain texts")
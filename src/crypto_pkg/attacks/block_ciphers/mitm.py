@@ -0,0 +1,454 @@
+import hashlib
+import os
+import struct
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from crypto_pkg import settings
+from crypto_pkg.attacks.block_ciphers.utils import KeySpace, key_blocks
+from crypto_pkg.attacks.scheduler import Scheduler
+from crypto_pkg.ciphers.symmetric.aes_variants import STANDARD_AES, AESVariant, KeySchedule, VariantAES
+from crypto_pkg.contracts.exceptions import IntegrityException
+from crypto_pkg.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Keys encrypted per step while building or searching a table
+MITM_CHUNK = 1 << 18
+
+# State of the pool workers, set by the initializers
+_worker = {}
+
+# Table file: header, fingerprints (uint64 little-endian), key indices (uint32 little-endian)
+# Header: magic, version, max_key, number of keys, plain text, SHA-256 of the arrays, key space descriptor
+_MAGIC = b"MITMTBL\0"
+_VERSION = 1
+_HEADER = struct.Struct("<8sHHQ16s32s48s")
+HEADER_SIZE = 128
+
+
+def _shared_array(shape, dtype, name: Optional[str] = None) -> Tuple[SharedMemory, np.ndarray]:
+    """ Create (name None) or attach a shared memory block, viewed as an array """
+    dtype = np.dtype(dtype)
+    size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    memory = SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _init_build(name: str, n: int, plain_text: bytes, max_key: int, variant: AESVariant):
+    memory, fingerprints = _shared_array((n,), np.uint64, name=name)
+    _worker.update(memory=memory, fingerprints=fingerprints, plain_text=plain_text, max_key=max_key,
+                   aes=VariantAES(variant))
+
+
+def _build_chunk(task: Tuple[int, int]) -> None:
+    first, count = task
+    keys = KeySpace.prefix(_worker["max_key"]).blocks(first, count)
+    _worker["fingerprints"][first:first + count] = _worker["aes"].encrypt_under_keys(
+        _worker["plain_text"], keys, packed=True)[:, 0]
+
+
+def _build_shared(fp_memory: SharedMemory, index_memory: SharedMemory, n: int, plain_text: bytes, max_key: int,
+                  variant: AESVariant, chunk: int, workers: int) -> None:
+    # Separate function so that the array views are released when it returns or raises
+    fingerprints = np.ndarray((n,), dtype=np.uint64, buffer=fp_memory.buf)
+    indices = np.ndarray((n,), dtype=np.uint32, buffer=index_memory.buf)
+    with Pool(workers, initializer=_init_build, initargs=(fp_memory.name, n, plain_text, max_key, variant)) as pool:
+        pool.map(_build_chunk, KeySpace.prefix(max_key).chunks(chunk), chunksize=1)
+    indices[:] = np.argsort(fingerprints, kind='stable')
+    fingerprints[:] = fingerprints[indices]
+
+
+def _init_search(descriptor: Tuple, cipher_text: bytes, max_key: int):
+    _worker.update(table=MITMTable.attach(descriptor), cipher_text=cipher_text, max_key=max_key)
+
+
+def _search_keys(table: 'MITMTable', cipher_text: bytes, max_key: int, first: int,
+                 count: int) -> Optional[Tuple[int, int]]:
+    keys = KeySpace.prefix(max_key).blocks(first, count)
+    found = table.lookup(table.aes.decrypt_under_keys(cipher_text, keys, packed=True))
+    hits = np.flatnonzero(found >= 0)
+    if len(hits):
+        return int(found[hits[0]]), first + int(hits[0])
+    return None
+
+
+def _search_chunk(first: int, count: int) -> Optional[Tuple[int, int]]:
+    return _search_keys(_worker["table"], _worker["cipher_text"], _worker["max_key"], first, count)
+
+
+def _variant_name(variant: AESVariant) -> str:
+    # FIPS-197 AES keeps the name of the tables written before other variants were supported
+    if variant == STANDARD_AES:
+        return "aes128-fips197"
+    flags = (variant.sub_bytes, variant.shift_rows, variant.mix_columns, variant.final_mix_columns)
+    flags = "".join(str(int(flag)) for flag in flags)
+    return f"aes128-{variant.key_schedule.value}-{variant.rounds}-{flags}"
+
+
+def _parse_variant(name: str) -> Optional[AESVariant]:
+    """ Variant of a name written by _variant_name, None if it is not one """
+    if name == "aes128-fips197":
+        return STANDARD_AES
+    try:
+        _, schedule, rounds, flags = name.split("-")
+        variant = AESVariant(int(rounds), *(flag == "1" for flag in flags), key_schedule=KeySchedule(schedule))
+    except (TypeError, ValueError):
+        return None
+    return variant if _variant_name(variant) == name else None
+
+
+def key_space(max_key: int, variant: AESVariant = STANDARD_AES) -> str:
+    """ Descriptor of the keys of the variant made of max_key unknown leading bits followed by zero bits """
+    return f"{_variant_name(variant)}/{KeySpace.prefix(max_key).descriptor}"
+
+
+def _arrays_digest(fingerprints: np.ndarray, indices: np.ndarray) -> bytes:
+    h = hashlib.sha256()
+    for array, dtype in ((fingerprints, '<u8'), (indices, '<u4')):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        # Hashed by slices to avoid copying whole memory-mapped arrays
+        for start in range(0, len(array), MITM_CHUNK):
+            h.update(memoryview(array[start:start + MITM_CHUNK]).cast('B'))
+    return h.digest()
+
+
+class MITMTable:
+    """
+    Meet-in-the-middle lookup table of the encryptions of one plain text under the keys 0 to 2^max_key - 1
+    (as built by prepare_key), stored as a sorted uint64 array of cipher text fingerprints (the first 64 bits)
+    and the parallel uint32 array of key indices: 12 bytes per key.
+    A table built with several workers lives in shared memory, which the search workers attach instead of receiving
+    copies; a table loaded from a file is memory-mapped, the workers mapping the same file. close() releases them.
+    """
+
+    def __init__(self, plain_text: bytes, max_key: int, fingerprints: np.ndarray, indices: np.ndarray,
+                 aes: Optional[VariantAES] = None, memory: Tuple[SharedMemory, ...] = (), owner: bool = False,
+                 path: Optional[str] = None):
+        self.plain_text = bytes(plain_text)
+        self.max_key = max_key
+        self.fingerprints = fingerprints
+        self.indices = indices
+        self.aes = aes if aes is not None else VariantAES(STANDARD_AES)
+        self.path = path
+        self._memory = memory
+        self._owner = owner
+
+    @property
+    def key_space(self) -> str:
+        """ Descriptor of the keys of the table, including the cipher """
+        return key_space(self.max_key, self.aes.variant)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """ Release the shared memory blocks of the table, unlinking them if this process created them """
+        if self.path is not None:
+            # Dropping the memory maps unmaps the file
+            self.fingerprints = self.indices = None
+            return
+        if not self._memory:
+            return
+        # The array views must be released before the blocks can be closed
+        del self.fingerprints, self.indices
+        for memory in self._memory:
+            memory.close()
+            if self._owner:
+                memory.unlink()
+        self._memory = ()
+
+    def share(self) -> 'MITMTable':
+        """ The table in shared memory, self if it already is or if it is mapped from a file """
+        if self._memory or self.path is not None:
+            return self
+        fp_memory, fingerprints = _shared_array(self.fingerprints.shape, np.uint64)
+        index_memory, indices = _shared_array(self.indices.shape, np.uint32)
+        fingerprints[:] = self.fingerprints
+        indices[:] = self.indices
+        return MITMTable(self.plain_text, self.max_key, fingerprints, indices, self.aes,
+                         memory=(fp_memory, index_memory), owner=True)
+
+    @property
+    def descriptor(self) -> Tuple:
+        """ What another process needs to attach the shared or file-backed table """
+        if self.path is not None:
+            return self.path,
+        return self.plain_text, self.max_key, len(self), self._memory[0].name, self._memory[1].name, self.aes.variant
+
+    @classmethod
+    def attach(cls, descriptor: Tuple) -> 'MITMTable':
+        if len(descriptor) == 1:
+            return cls.load(descriptor[0], verify=False)
+        plain_text, max_key, n, fp_name, index_name, variant = descriptor
+        fp_memory, fingerprints = _shared_array((n,), np.uint64, name=fp_name)
+        index_memory, indices = _shared_array((n,), np.uint32, name=index_name)
+        return cls(plain_text, max_key, fingerprints, indices, VariantAES(variant), memory=(fp_memory, index_memory))
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self) -> int:
+        return self.fingerprints.nbytes + self.indices.nbytes
+
+    def save(self, path: str) -> None:
+        """ Write the table in the memory-mappable format read by load, atomically """
+        digest = _arrays_digest(self.fingerprints, self.indices)
+        header = _HEADER.pack(_MAGIC, _VERSION, self.max_key, len(self), self.plain_text, digest,
+                              self.key_space.encode())
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.write(np.ascontiguousarray(self.fingerprints, dtype='<u8').tobytes())
+            f.write(np.ascontiguousarray(self.indices, dtype='<u4').tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, verify: bool = True) -> 'MITMTable':
+        """
+        Memory-map a table written by save
+
+        Args:
+            path: table file
+            verify: check the SHA-256 of the arrays against the header
+        Returns:
+            the table, its arrays being read-only memory maps of the file
+        Raises:
+            IntegrityException: if the file is truncated, of another format or key space or its checksum does not
+                match
+        """
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise IntegrityException(f"{path}: truncated header")
+        magic, version, max_key, n, plain_text, digest, space = _HEADER.unpack(header[:_HEADER.size])
+        if magic != _MAGIC or version != _VERSION:
+            raise IntegrityException(f"{path}: not a version {_VERSION} table file")
+        if os.path.getsize(path) != HEADER_SIZE + 12 * n:
+            raise IntegrityException(f"{path}: size does not match {n} keys")
+        name, _, descriptor = space.rstrip(b"\0").decode(errors='replace').partition("/")
+        variant = _parse_variant(name)
+        if variant is None or descriptor != KeySpace.prefix(max_key).descriptor:
+            raise IntegrityException(f"{path}: unknown key space {space!r}")
+        fingerprints = np.memmap(path, dtype='<u8', mode='r', offset=HEADER_SIZE, shape=(n,))
+        indices = np.memmap(path, dtype='<u4', mode='r', offset=HEADER_SIZE + 8 * n, shape=(n,))
+        if verify and _arrays_digest(fingerprints, indices) != digest:
+            raise IntegrityException(f"{path}: checksum mismatch")
+        return cls(plain_text, max_key, fingerprints, indices, VariantAES(variant), path=path)
+
+    @classmethod
+    def build(cls, plain_text: bytes, max_key: int = 24, aes: Optional[VariantAES] = None,
+              chunk: int = MITM_CHUNK, workers: Optional[int] = 1) -> 'MITMTable':
+        """
+        Encrypt the plain text under every key index and sort the fingerprints
+
+        Args:
+            plain_text: 16-byte plain text
+            max_key: number of unknown leading key bits, at most 32
+            aes: cipher, FIPS-197 AES by default; with several workers each process runs the same AESVariant
+            chunk: keys encrypted per step
+            workers: number of processes, None for the number of cores; with more than one the encryptions are
+                split across a pool and the table is returned in shared memory
+        Returns:
+            the table
+        """
+        if max_key > 32:
+            raise ValueError("Key indices are stored on 32 bits")
+        n = 2 ** max_key
+        workers = workers or os.cpu_count()
+        aes = aes if aes is not None else VariantAES(STANDARD_AES)
+        if workers == 1:
+            fingerprints = np.empty(n, dtype=np.uint64)
+            space = KeySpace.prefix(max_key)
+            for first, count in space.chunks(chunk):
+                keys = space.blocks(first, count)
+                fingerprints[first:first + count] = aes.encrypt_under_keys(plain_text, keys, packed=True)[:, 0]
+            # The int64 permutation is released before the fingerprints are reordered to bound the peak memory
+            indices = np.argsort(fingerprints, kind='stable').astype(np.uint32)
+            fingerprints = fingerprints[indices]
+            log.debug(f"Table of {n} keys built")
+            return cls(plain_text, max_key, fingerprints, indices, aes)
+
+        fp_memory, index_memory = _shared_array((n,), np.uint64)[0], _shared_array((n,), np.uint32)[0]
+        try:
+            log.debug(f"Building the table of {n} keys with {workers} processes")
+            _build_shared(fp_memory, index_memory, n, bytes(plain_text), max_key, aes.variant, chunk, workers)
+        except BaseException:
+            for memory in (fp_memory, index_memory):
+                memory.close()
+                memory.unlink()
+            raise
+        fingerprints = np.ndarray((n,), dtype=np.uint64, buffer=fp_memory.buf)
+        indices = np.ndarray((n,), dtype=np.uint32, buffer=index_memory.buf)
+        return cls(plain_text, max_key, fingerprints, indices, aes, memory=(fp_memory, index_memory), owner=True)
+
+    def lookup(self, values: np.ndarray) -> np.ndarray:
+        """
+        Key indices whose encryption of the plain text equals each value
+
+        Fingerprint hits are re-checked on the full 128 bits by re-encrypting the plain text with the candidate keys.
+
+        Args:
+            values: (N, 2) uint64 array of packed blocks (see pack_blocks)
+        Returns:
+            (N,) int64 array of key indices, -1 where no key matches
+        """
+        values = np.asarray(values, dtype=np.uint64).reshape(-1, 2)
+        left = np.searchsorted(self.fingerprints, values[:, 0], side='left')
+        right = np.searchsorted(self.fingerprints, values[:, 0], side='right')
+        counts = right - left
+        out = np.full(len(values), -1, dtype=np.int64)
+        if not counts.any():
+            return out
+        # One (query, table position) pair per fingerprint hit
+        rows = np.repeat(np.arange(len(values)), counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = self.indices[left[rows] + offsets].astype(np.uint64)
+        full = self.aes.encrypt_under_keys(self.plain_text, key_blocks(candidates, self.max_key), packed=True)
+        valid = (full == values[rows]).all(axis=1)
+        # First matching candidate of each row
+        matched, first = np.unique(rows[valid], return_index=True)
+        out[matched] = candidates[valid][first].astype(np.int64)
+        return out
+
+    def search(self, cipher_text: bytes, max_key: Optional[int] = None, chunk: int = MITM_CHUNK,
+               workers: Optional[int] = 1, checkpoint: Optional[str] = None, start: int = 0,
+               count: Optional[int] = None, stop=None) -> Optional[Tuple[int, int]]:
+        """
+        Decrypt the cipher text under every second key index and look the results up in the table
+
+        Args:
+            cipher_text: 16-byte cipher text of the double encryption of the table plain text
+            max_key: number of unknown leading bits of the second key - default: those of the table
+            chunk: keys decrypted per step
+            workers: number of processes, None for the number of cores; the workers attach the table in shared
+                memory (it is copied there if needed) and all stop once one of them finds a match
+            checkpoint: JSON file of the chunks already searched, to resume an interrupted search
+            start: first second key index searched
+            count: number of second key indices searched - default: up to the end of the key space
+            stop: multiprocessing Event cancelling the search when set
+        Returns:
+            (first key index, second key index) of a match, None if there is none. With one worker it is the match
+            with the smallest second key index, with several the first one found.
+        """
+        max_key = max_key if max_key is not None else self.max_key
+        space = KeySpace.prefix(max_key)
+        job = f"mitm-search/{self.plain_text.hex()}/{bytes(cipher_text).hex()}/{self.key_space}/{space.descriptor}"
+        count = space.size - start if count is None else count
+        workers = workers or os.cpu_count()
+        if workers == 1 or count <= chunk:
+            task = partial(_search_keys, self, bytes(cipher_text), max_key)
+            scheduler = Scheduler(task, count, chunk=chunk, workers=1, checkpoint=checkpoint, job=job, start=start,
+                                  stop=stop)
+            match = scheduler.run()
+            return tuple(match) if match else None
+
+        table = self.share()
+        try:
+            scheduler = Scheduler(_search_chunk, count, chunk=chunk, workers=workers, checkpoint=checkpoint,
+                                  job=job, start=start, stop=stop, initializer=_init_search,
+                                  initargs=(table.descriptor, bytes(cipher_text), max_key))
+            match = scheduler.run()
+            return tuple(match) if match else None
+        finally:
+            if table is not self:
+                table.close()
+
+
+class MITMCache:
+    """
+    Directory of table files named after (plain text, cipher and key space), reused across runs. Tables are
+    memory-mapped on access; the least recently used ones are deleted when the directory grows beyond max_bytes.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            directory: cache directory - default: mitm under settings.cache_dir
+            max_bytes: total size of the tables kept - default: settings.mitm_cache_size
+        """
+        self.directory = directory or os.path.join(settings.cache_dir, "mitm")
+        self.max_bytes = max_bytes if max_bytes is not None else settings.mitm_cache_size
+
+    def path(self, plain_text: bytes, max_key: int, variant: AESVariant = STANDARD_AES) -> str:
+        name = hashlib.sha256(bytes(plain_text) + key_space(max_key, variant).encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}.mitm")
+
+    def get(self, plain_text: bytes, max_key: int, variant: AESVariant = STANDARD_AES) -> Optional[MITMTable]:
+        """
+        Cached table for the plain text, cipher and key space, None if absent or corrupted (corrupted files are
+        deleted)
+        """
+        path = self.path(plain_text, max_key, variant)
+        if not os.path.exists(path):
+            return None
+        try:
+            table = MITMTable.load(path)
+        except IntegrityException as exc:
+            log.warning(f"Discarding cached table: {exc}")
+            os.remove(path)
+            return None
+        if table.plain_text != bytes(plain_text) or table.key_space != key_space(max_key, variant):
+            log.warning(f"Discarding cached table {path} built for another plain text or cipher")
+            table.close()
+            os.remove(path)
+            return None
+        # The modification time records the last use for the eviction
+        os.utime(path)
+        log.debug(f"Loaded cached table {path}")
+        return table
+
+    def put(self, table: MITMTable) -> str:
+        """ Store a table, then evict the least recently used tables; returns its path """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(table.plain_text, table.max_key, table.aes.variant)
+        table.save(path)
+        self.evict(keep=path)
+        return path
+
+    def get_or_build(self, plain_text: bytes, max_key: int = 24, aes: Optional[VariantAES] = None,
+                     workers: Optional[int] = 1) -> MITMTable:
+        """ Cached table of the cipher (FIPS-197 AES by default), built, stored and memory-mapped if not cached yet """
+        table = self.get(plain_text, max_key, aes.variant if aes is not None else STANDARD_AES)
+        if table is not None:
+            return table
+        with MITMTable.build(plain_text, max_key=max_key, aes=aes, workers=workers) as built:
+            path = self.put(built)
+        return MITMTable.load(path, verify=False)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Delete the least recently used tables until the cache fits in max_bytes
+
+        Args:
+            keep: table never deleted, e.g. the one just stored
+        Returns:
+            deleted paths
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".mitm"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        total = sum(size for _, size, _ in entries)
+        deleted = []
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+            deleted.append(path)
+            log.debug(f"Evicted cached table {path}")
+        return deleted
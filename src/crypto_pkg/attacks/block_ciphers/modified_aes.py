@@ -1,14 +1,118 @@
-from multiprocessing import Pool
+from functools import partial
+import os
 import random
+import sys
+from typing import Optional
 
-from crypto_pkg.attacks.block_ciphers.utils import prepare_key
-from crypto_pkg.ciphers.symmetric.aes import CustomAES, array_to_matrix, get_array_from_state
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.utils import KeySpace, Text
+from crypto_pkg.attacks.scheduler import Scheduler
+from crypto_pkg.ciphers.symmetric.aes import Te0, Te1, Te2, Te3, array_to_matrix, get_array_from_state, sbox_table
+from crypto_pkg.ciphers.symmetric.aes_variants import MODIFIED_AES, VariantAES
 from crypto_pkg.utils.logging import set_level, get_logger
 
 log = get_logger(__name__)
 
+# Column keys evaluated per NumPy step of the batched search
+COLUMN_BATCH = 1 << 20
+# Column keys per scheduler chunk, 256 chunks per column
+COLUMN_CHUNK = 1 << 24
+_TE = [np.array(t, dtype=np.uint32) for t in (Te0, Te1, Te2, Te3)]
+_SBOX = np.array(sbox_table, dtype=np.uint32)
+# Positions of the bytes of a uint32 in its uint8 view, most significant first
+_MSB_FIRST = (3, 2, 1, 0) if sys.byteorder == 'little' else (0, 1, 2, 3)
+
+
+def column_encrypt(word: int, key_word: int, rounds: int = 10) -> int:
+    """
+    ModifiedAES encryption of one state column. Without ShiftRows each column only depends on the same column of
+    the plain text and of the key, and SubBytes followed by MixColumns on a column is a lookup in the four T-tables.
+
+    Args:
+        word: plain text column as a big-endian 32-bit integer
+        key_word: key column as a big-endian 32-bit integer
+        rounds: number of rounds
+    Returns:
+        cipher text column as a big-endian 32-bit integer
+    """
+    t0, t1, t2, t3, s = Te0, Te1, Te2, Te3, sbox_table
+    w = word ^ key_word
+    for _ in range(rounds - 1):
+        w = t0[w >> 24] ^ t1[(w >> 16) & 0xff] ^ t2[(w >> 8) & 0xff] ^ t3[w & 0xff] ^ key_word
+    return ((s[w >> 24] << 24) | (s[(w >> 16) & 0xff] << 16) | (s[(w >> 8) & 0xff] << 8) | s[w & 0xff]) ^ key_word
+
+
+def column_encrypt_batch(word: int, key_words: np.ndarray, rounds: int = 10) -> np.ndarray:
+    """
+    column_encrypt of one plain text column under many key columns
+
+    Args:
+        word: plain text column as a big-endian 32-bit integer
+        key_words: uint32 array of key columns
+        rounds: number of rounds
+    Returns:
+        uint32 array of the cipher text columns
+    """
+    key_words = np.asarray(key_words, dtype=np.uint32)
+    n = len(key_words)
+    a, b, c, d = _MSB_FIRST
+    w = key_words ^ np.uint32(word)
+    for _ in range(rounds - 1):
+        # The bytes are read through a uint8 view rather than with shifts and masks
+        v = w.view(np.uint8).reshape(n, 4)
+        w = _TE[0].take(v[:, a])
+        w ^= _TE[1].take(v[:, b])
+        w ^= _TE[2].take(v[:, c])
+        w ^= _TE[3].take(v[:, d])
+        w ^= key_words
+    v = w.view(np.uint8).reshape(n, 4)
+    out = _SBOX.take(v[:, a]) << 24
+    out |= _SBOX.take(v[:, b]) << 16
+    out |= _SBOX.take(v[:, c]) << 8
+    out |= _SBOX.take(v[:, d])
+    out ^= key_words
+    return out
 
-class ModifiedAES(CustomAES):
+
+def search_column(word: int, target: int, start: int = 0, stop: int = 2 ** 32,
+                  batch_size: int = COLUMN_BATCH) -> Optional[int]:
+    """
+    Smallest key column in [start, stop) encrypting the plain text column to the target column
+
+    Args:
+        word: plain text column as a big-endian 32-bit integer
+        target: cipher text column as a big-endian 32-bit integer
+        start: first key column tested
+        stop: end of the tested range, at most 2^32
+        batch_size: key columns evaluated per step
+    Returns:
+        the key column, None if no key column of the range matches
+    """
+    steps = np.arange(batch_size, dtype=np.uint32)
+    for n, first in enumerate(range(start, stop, batch_size), 1):
+        keys = steps[:min(batch_size, stop - first)] + np.uint32(first)
+        matches = np.flatnonzero(column_encrypt_batch(word, keys) == target)
+        if len(matches):
+            return first + int(matches[0])
+        if n % 256 == 0:
+            log.debug(f"Column search: {first + len(keys) - start} keys tested")
+    return None
+
+
+def search_column_chunk(word: int, target: int, batch_size: int, first: int, count: int) -> Optional[int]:
+    """ Scheduler task: search_column over [first, first + count), key by key if batch_size is 0 """
+    if batch_size:
+        return search_column(word, target, start=first, stop=first + count, batch_size=batch_size)
+    return next((i for i in range(first, first + count) if column_encrypt(word, i) == target), None)
+
+
+class ModifiedAES(VariantAES):
+    """
+    AES without ShiftRows, using the cipher key as every round key. encrypt/decrypt run the compiled MODIFIED_AES
+    variant, aes_round_trans is the reference list-matrix round.
+    """
+    variant = MODIFIED_AES
 
     def aes_round_trans(self, plain_text, round_key=None, last=False):
         state_matrix = array_to_matrix(plain_text)
@@ -23,48 +127,57 @@ class ModifiedAES(CustomAES):
             s_k = self.aes_add_round_key(c, round_key)
             return get_array_from_state(s_k)
 
-    def encrypt(self, plain_text, key):
-        ks = array_to_matrix(key)
-        state = array_to_matrix(plain_text)
-        s_k = self.aes_add_round_key(state, ks)
-
-        pn = get_array_from_state(s_k)
-        for i in range(1, 10):
-            tmp = self.aes_round_trans(plain_text=pn, round_key=ks)
-            pn = tmp
-        pn = self.aes_round_trans(plain_text=pn, round_key=ks, last=True)
-        return pn
-
-    def attack_section(self, plain_text, cipher_block_ref, init_pos, section_n=0):
-        for i in range(2 ** 32):
-            key = prepare_key(i, max_key=init_pos)
-            k_block = [int(item, 16) for item in [key.hex[i * 2:i * 2 + 2] for i in range(len(key.hex))] if item != '']
-            c = self.encrypt(key=k_block, plain_text=plain_text)
-            c_by_block = [c[i * 4:i * 4 + 4] for i in range(len(c))]
-            if c_by_block[section_n] == cipher_block_ref[section_n]:
-                log.info(f"key guess for block {section_n}: {key.hex}")
-                return key
+    def attack_section(self, plain_text, cipher_block_ref, init_pos, section_n=0, batch_size=COLUMN_BATCH,
+                       workers: Optional[int] = 1, checkpoint: Optional[str] = None, chunk: int = COLUMN_CHUNK):
+        # The key guess i fills column section_n of the key (bits init_pos - 32 to init_pos), the other columns being
+        # zero, so only that column of the state is encrypted
+        space = KeySpace(32, shift=128 - init_pos)
+        word = int.from_bytes(bytes(plain_text[4 * section_n:4 * section_n + 4]), 'big')
+        target = int.from_bytes(bytes(cipher_block_ref[section_n]), 'big')
+        scheduler = Scheduler(partial(search_column_chunk, word, target, batch_size), space.size, chunk=chunk,
+                              workers=workers, checkpoint=checkpoint, job=f"modified-aes/{word:08x}/{target:08x}")
+        i = scheduler.run()
+        if i is None:
+            return None
+        key = Text(text=space.key(i))
+        log.info(f"key guess for block {section_n}: {key.hex}")
+        return key
 
     @set_level(logger=log)
-    def attack(self, plain_text: str, cipher_text: str, _verbose: bool = False):
+    def attack(self, plain_text: str, cipher_text: str, batch_size: int = COLUMN_BATCH, workers: Optional[int] = None,
+               checkpoint_dir: Optional[str] = None, _verbose: bool = False):
+        """
+        Recover the key column by column, each column search being spread over the workers
+
+        Args:
+            plain_text: 128bits plain text in hexadecimal
+            cipher_text: 128bits encryption of the plain text in hexadecimal
+            batch_size: key columns evaluated per NumPy step, 0 to test the keys one by one
+            workers: number of processes - default: number of cores
+            checkpoint_dir: directory of the checkpoints of the column searches, to resume an interrupted attack
+        Returns:
+            the key as an integer, None if a column has no solution or its search was cancelled
+        """
         p_int_list = [int(item, 16) for item in [plain_text[i * 2:i * 2 + 2] for i in range(len(plain_text))] if
                       item != '']
         c_int_list = [int(item, 16) for item in [cipher_text[i * 2:i * 2 + 2] for i in range(len(cipher_text))] if
                       item != '']
 
         c_by_block_ref = [c_int_list[i * 4:i * 4 + 4] for i in range(len(c_int_list))]
-        args = (
-            [p_int_list, c_by_block_ref, 32, 0],
-            [p_int_list, c_by_block_ref, 64, 1],
-            [p_int_list, c_by_block_ref, 96, 2],
-            [p_int_list, c_by_block_ref, 128, 3]
-        )
-
-        log.debug("Run attack on sub-blocks in parallel")
-        with Pool() as pool:
-            res = pool.starmap(self.attack_section, args)
-        r = [int(item.hex, 16) for item in res]
-        log.debug(f"Parallel execution terminated with keys guesses {r}")
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        res = []
+        for n in range(4):
+            log.debug(f"Search key column {n}")
+            checkpoint = os.path.join(checkpoint_dir, f"modified-aes-{n}.json") if checkpoint_dir else None
+            column = self.attack_section(p_int_list, c_by_block_ref, 32 * (n + 1), n, batch_size=batch_size,
+                                         workers=workers, checkpoint=checkpoint)
+            if column is None:
+                log.info(f"No key found for column {n}")
+                return None
+            res.append(column)
+        r = [item.integer for item in res]
+        log.debug(f"Column searches terminated with keys guesses {r}")
         out = r[0] ^ r[1] ^ r[2] ^ r[3]
         log.info(f"128bits key guess: {out}")
         return out
@@ -89,6 +202,6 @@ if __name__ == '__main__':
     # ---- Run the attack
     log.debug(f"Run the attack with plain-text {p} and cipher-text {p}")
     aes = ModifiedAES()
-    result = aes.attack(plain_text=pt, cipher_text=ct, verbose=True)
+    result = aes.attack(plain_text=pt, cipher_text=ct, _verbose=True)
     assert result == int(to_find_key, 16)
     print(f"\nSuccess: key {to_find_key} recovered")
@@ -0,0 +1,288 @@
+import hashlib
+import os
+import random
+import struct
+from multiprocessing import Pool
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.utils import key_blocks, prepare_key
+from crypto_pkg.ciphers.symmetric.aes_variants import STANDARD_AES, VariantAES
+from crypto_pkg.contracts.exceptions import IntegrityException
+from crypto_pkg.utils.logging import get_logger, set_level
+
+log = get_logger(__name__)
+
+# Chains computed per step while generating a table
+CHAIN_CHUNK = 1 << 14
+_GOLDEN = 0x9E3779B97F4A7C15
+
+# Table file: header, start points, end points (uint32 little-endian, sorted by end point)
+# Header: magic, version, max_key, table index, chain length, number of chains, plain text, SHA-256 of the arrays
+_MAGIC = b"RAINBOW\0"
+_VERSION = 1
+_HEADER = struct.Struct("<8sHHIIQ16s32s")
+HEADER_SIZE = 96
+
+
+def _fingerprints(aes: VariantAES, plain_text: bytes, keys: np.ndarray, max_key: int) -> np.ndarray:
+    """ First 64 bits of the encryptions of the plain text under the key indices """
+    return aes.encrypt_under_keys(plain_text, key_blocks(keys, max_key), packed=True)[:, 0]
+
+
+def _mix(table_index: int, column: int) -> int:
+    """ SplitMix64 finalizer of (table index, column), so that the low bits depend on both """
+    z = ((table_index << 32) + column + 1) * _GOLDEN % 2 ** 64
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 % 2 ** 64
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB % 2 ** 64
+    return z ^ (z >> 31)
+
+
+def reduce(fingerprints: np.ndarray, column: int, table_index: int, max_key: int) -> np.ndarray:
+    """
+    Rainbow reduction of column `column`: maps cipher text fingerprints back to key indices, with a different
+    function per column and per table
+
+    Args:
+        fingerprints: uint64 array, first 64 bits of cipher texts
+        column: position in the chain
+        table_index: index of the table, tables with different indices are independent
+        max_key: size of the key space in bits
+    Returns:
+        uint64 array of key indices in [0, 2^max_key)
+    """
+    return (fingerprints ^ np.uint64(_mix(table_index, column))) & np.uint64(2 ** max_key - 1)
+
+
+def walk(aes: VariantAES, plain_text: bytes, keys: np.ndarray, first_column: int, last_column: int,
+         table_index: int, max_key: int) -> np.ndarray:
+    """ Advance chains from column first_column to column last_column (key indices at each column) """
+    keys = np.asarray(keys, dtype=np.uint64)
+    for column in range(first_column, last_column):
+        keys = reduce(_fingerprints(aes, plain_text, keys, max_key), column, table_index, max_key)
+    return keys
+
+
+def _generate_chunk(task: Tuple) -> np.ndarray:
+    plain_text, starts, chain_length, table_index, max_key = task
+    return walk(VariantAES(STANDARD_AES), plain_text, starts, 0, chain_length, table_index, max_key)
+
+
+class RainbowTable:
+    """
+    Rainbow table of FIPS-197 AES for a chosen plain text and the prepare_key key space (max_key unknown leading
+    bits). Chains alternate encryptions of the plain text and column-dependent reductions; only their start and end
+    points are stored (8 bytes per chain). Online, a cipher text costs chain_length^2 / 2 encryptions instead of
+    2^max_key / 2 for brute force: longer chains mean a smaller table and a slower lookup.
+    """
+
+    def __init__(self, plain_text: bytes, max_key: int, chain_length: int, starts: np.ndarray, ends: np.ndarray,
+                 table_index: int = 0):
+        self.plain_text = bytes(plain_text)
+        self.max_key = max_key
+        self.chain_length = chain_length
+        self.table_index = table_index
+        self.starts = starts
+        self.ends = ends
+        self.aes = VariantAES(STANDARD_AES)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def coverage(self) -> float:
+        """ Upper bound of the fraction of the key space covered, chains x length / keys """
+        return min(1., len(self) * self.chain_length / 2 ** self.max_key)
+
+    @classmethod
+    def generate(cls, plain_text: bytes, max_key: int, chain_length: int, n_chains: int, table_index: int = 0,
+                 perfect: bool = True, workers: Optional[int] = 1, chunk: int = CHAIN_CHUNK) -> 'RainbowTable':
+        """
+        Compute the chains, all chains of a chunk advancing together through the many-keys engine
+
+        Args:
+            plain_text: 16-byte chosen plain text
+            max_key: number of unknown leading key bits, at most 32
+            chain_length: keys per chain
+            n_chains: number of chains, started from distinct keys
+            table_index: index of the table, giving independent reduction functions
+            perfect: keep a single chain per end point, merged chains being redundant
+            workers: number of processes, None for the number of cores
+            chunk: chains per worker task
+        Returns:
+            the table, sorted by end point
+        """
+        if max_key > 32:
+            raise ValueError("Key indices are stored on 32 bits")
+        if n_chains > 2 ** max_key:
+            raise ValueError("More chains than keys")
+        # Start points spread over the key space
+        starts = (np.arange(n_chains, dtype=np.uint64) * np.uint64(2 ** max_key // n_chains))
+        tasks = [(bytes(plain_text), starts[i:i + chunk], chain_length, table_index, max_key)
+                 for i in range(0, n_chains, chunk)]
+        workers = workers or os.cpu_count()
+        if workers == 1 or len(tasks) == 1:
+            ends = [_generate_chunk(task) for task in tasks]
+        else:
+            with Pool(workers) as pool:
+                ends = pool.map(_generate_chunk, tasks, chunksize=1)
+        ends = np.concatenate(ends)
+        if perfect:
+            ends, first = np.unique(ends, return_index=True)
+            starts = starts[first]
+        else:
+            order = np.argsort(ends, kind='stable')
+            starts, ends = starts[order], ends[order]
+        log.debug(f"Table {table_index}: {len(starts)} chains of length {chain_length} kept out of {n_chains}")
+        return cls(plain_text, max_key, chain_length, starts.astype(np.uint32), ends.astype(np.uint32), table_index)
+
+    def lookup(self, cipher_text: bytes) -> Optional[int]:
+        """
+        Key index encrypting the table plain text to the cipher text, if it lies on a chain of the table
+
+        The cipher text is assumed to appear at every column of a chain at once: all candidate end points are
+        computed together, then the chains whose end point matches are regenerated up to the assumed column and
+        the key found there is checked against the full cipher text (false alarms come from merging chains).
+
+        Args:
+            cipher_text: 16-byte encryption of the plain text
+        Returns:
+            the key index, None if not found
+        """
+        t = self.chain_length
+        fingerprint = np.frombuffer(bytes(cipher_text)[:8], dtype='>u8').astype(np.uint64)
+        # candidates[i]: end point of a chain holding the key at column i
+        candidates = np.concatenate([reduce(fingerprint, i, self.table_index, self.max_key) for i in range(t)])
+        for column in range(1, t):
+            candidates[:column] = walk(self.aes, self.plain_text, candidates[:column], column, column + 1,
+                                       self.table_index, self.max_key)
+        low = np.searchsorted(self.ends, candidates, side='left')
+        high = np.searchsorted(self.ends, candidates, side='right')
+        counts = high - low
+        if not counts.any():
+            return None
+        # One (column, chain) pair per end point hit, regenerated together up to their column
+        columns = np.repeat(np.arange(t), counts)
+        chains = low[columns] + np.arange(len(columns)) - np.repeat(np.cumsum(counts) - counts, counts)
+        keys = self.starts[chains].astype(np.uint64)
+        for column in range(int(columns.max())):
+            moving = columns > column
+            keys[moving] = walk(self.aes, self.plain_text, keys[moving], column, column + 1, self.table_index,
+                                self.max_key)
+        found = self.aes.encrypt_under_keys(self.plain_text, key_blocks(keys, self.max_key))
+        target = np.frombuffer(bytes(cipher_text), dtype=np.uint8)
+        hits = np.flatnonzero((found == target).all(axis=1))
+        return int(keys[hits[0]]) if len(hits) else None
+
+    def _digest(self) -> bytes:
+        h = hashlib.sha256()
+        h.update(np.ascontiguousarray(self.starts, dtype='<u4').tobytes())
+        h.update(np.ascontiguousarray(self.ends, dtype='<u4').tobytes())
+        return h.digest()
+
+    def save(self, path: str) -> None:
+        """ Write the start and end points, atomically """
+        header = _HEADER.pack(_MAGIC, _VERSION, self.max_key, self.table_index, self.chain_length, len(self),
+                              self.plain_text, self._digest())
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.write(np.ascontiguousarray(self.starts, dtype='<u4').tobytes())
+            f.write(np.ascontiguousarray(self.ends, dtype='<u4').tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, verify: bool = True) -> 'RainbowTable':
+        """
+        Memory-map a table written by save
+
+        Raises:
+            IntegrityException: if the file is truncated, of another format or its checksum does not match
+        """
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise IntegrityException(f"{path}: truncated header")
+        magic, version, max_key, table_index, chain_length, n, plain_text, digest = _HEADER.unpack(
+            header[:_HEADER.size])
+        if magic != _MAGIC or version != _VERSION:
+            raise IntegrityException(f"{path}: not a version {_VERSION} rainbow table file")
+        if os.path.getsize(path) != HEADER_SIZE + 8 * n:
+            raise IntegrityException(f"{path}: size does not match {n} chains")
+        starts = np.memmap(path, dtype='<u4', mode='r', offset=HEADER_SIZE, shape=(n,))
+        ends = np.memmap(path, dtype='<u4', mode='r', offset=HEADER_SIZE + 4 * n, shape=(n,))
+        table = cls(plain_text, max_key, chain_length, starts, ends, table_index)
+        if verify and table._digest() != digest:
+            raise IntegrityException(f"{path}: checksum mismatch")
+        return table
+
+
+def table_path(directory: str, plain_text: bytes, max_key: int, chain_length: int, n_chains: int,
+               table_index: int) -> str:
+    """ File of a table in a directory of tables, named after its parameters """
+    return os.path.join(directory, f"{bytes(plain_text).hex()}-{max_key}-{chain_length}-{n_chains}-{table_index}.rbt")
+
+
+def generate_tables(plain_text: bytes, max_key: int, chain_length: int, n_chains: int, n_tables: int = 4,
+                    workers: Optional[int] = 1, directory: Optional[str] = None) -> List[RainbowTable]:
+    """
+    Independent tables, each one raising the probability of success
+
+    Args:
+        plain_text: 16-byte chosen plain text
+        max_key: number of unknown leading key bits
+        chain_length: keys per chain
+        n_chains: chains generated per table
+        n_tables: number of tables
+        workers: number of processes, None for the number of cores
+        directory: tables are loaded from this directory if present, generated and saved there otherwise
+    Returns:
+        list of tables
+    """
+    tables = []
+    for i in range(n_tables):
+        path = table_path(directory, plain_text, max_key, chain_length, n_chains, i) if directory else None
+        if path and os.path.exists(path):
+            try:
+                tables.append(RainbowTable.load(path))
+                continue
+            except IntegrityException as e:
+                log.warning(f"Regenerating table {i}: {e}")
+        table = RainbowTable.generate(plain_text, max_key, chain_length, n_chains, table_index=i, workers=workers)
+        if path:
+            os.makedirs(directory, exist_ok=True)
+            table.save(path)
+        tables.append(table)
+    return tables
+
+
+@set_level(logger=log)
+def crack(tables: Sequence[RainbowTable], cipher_text: bytes, _verbose: bool = False) -> Optional[bytes]:
+    """
+    Recover the key of a cipher text of the tables' plain text
+
+    Returns:
+        16-byte key, None if no table covers it
+    """
+    for table in tables:
+        key = table.lookup(cipher_text)
+        if key is not None:
+            found = prepare_key(key, max_key=table.max_key)
+            log.info(f"Key found in table {table.table_index}: {found.hex}")
+            return found.ascii_hex
+    log.info("Key not covered by the tables")
+    return None
+
+
+if __name__ == '__main__':
+    ''' Example '''
+    pt = bytes(range(16))
+    # 2^20 keys: 4 tables of 2^13 chains of length 2^8, 256 KiB in total
+    rainbow_tables = generate_tables(pt, max_key=20, chain_length=256, n_chains=2 ** 13, workers=None)
+    successes = 0
+    for _ in range(10):
+        k = prepare_key(random.getrandbits(20), max_key=20).ascii_hex
+        ct = VariantAES(STANDARD_AES).encrypt_under_keys(pt, [k])[0].tobytes()
+        successes += crack(rainbow_tables, ct) == k
+    print(f"{successes}/10 keys recovered")
@@ -0,0 +1,197 @@
+import hashlib
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from crypto_pkg import settings
+from crypto_pkg.ciphers.symmetric.aes import sbox_table
+from crypto_pkg.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+TABLES = ("ddt", "lat", "bct")
+
+
+def as_sbox(sbox) -> np.ndarray:
+    """
+    Validate an S-box given as a lookup table
+
+    Args:
+        sbox: sequence of 2^n output values, n <= 8
+    Returns:
+        int64 array of the outputs
+    Raises:
+        ValueError: if the size is not a power of two up to 256 or an output does not fit in 8 bits
+    """
+    table = np.asarray(sbox, dtype=np.int64).reshape(-1)
+    n = len(table)
+    if n < 2 or n > 256 or n & (n - 1):
+        raise ValueError(f"An S-box has 2^n entries with 1 <= n <= 8, got {n}")
+    if table.min() < 0 or table.max() > 255:
+        raise ValueError("S-box outputs must be in [0, 255]")
+    return table
+
+
+def output_size(table: np.ndarray) -> int:
+    """ Number of possible outputs 2^m, m being the smallest output width holding every value """
+    return 1 << max(int(table.max()).bit_length(), 1)
+
+
+def sbox_hash(sbox) -> str:
+    """ SHA-256 of the S-box lookup table, identifying its cached analysis """
+    table = as_sbox(sbox)
+    return hashlib.sha256(table.astype(np.uint16).tobytes()).hexdigest()
+
+
+def _popcount_parity(x: np.ndarray) -> np.ndarray:
+    x = x ^ (x >> 4)
+    x = x ^ (x >> 2)
+    x = x ^ (x >> 1)
+    return x & 1
+
+
+def fwht(values: np.ndarray, axis: int = 0) -> np.ndarray:
+    """
+    Fast Walsh-Hadamard transform along an axis, W[a] = sum_x (-1)^(a.x) values[x]
+
+    Args:
+        values: array whose length along axis is a power of two
+        axis: axis to transform, the transform is vectorized over the others
+    Returns:
+        int64 array of the same shape
+    """
+    out = np.moveaxis(np.array(values, dtype=np.int64), axis, 0)
+    n = out.shape[0]
+    rest = out.shape[1:]
+    h = 1
+    while h < n:
+        # Butterflies between the halves of each block of 2h entries
+        blocks = out.reshape((n // (2 * h), 2, h) + rest)
+        low, high = blocks[:, 0].copy(), blocks[:, 1]
+        blocks[:, 0] += high
+        blocks[:, 1] = low - high
+        h *= 2
+    return np.moveaxis(out, 0, axis)
+
+
+def ddt(sbox) -> np.ndarray:
+    """
+    Difference distribution table, DDT[a, b] = #{x : S(x) ^ S(x ^ a) = b}
+
+    Returns:
+        (2^n, 2^m) int64 array
+    """
+    table = as_sbox(sbox)
+    n, m = len(table), output_size(table)
+    x = np.arange(n)
+    differences = table[x[None, :]] ^ table[x[None, :] ^ x[:, None]]
+    counts = np.bincount((x[:, None] * m + differences).reshape(-1), minlength=n * m)
+    return counts.reshape(n, m)
+
+
+def lat(sbox) -> np.ndarray:
+    """
+    Linear approximation table, LAT[a, b] = #{x : a.x = b.S(x)} - 2^(n-1), computed with one Walsh-Hadamard transform
+    of the (2^n, 2^m) matrix (-1)^(b.S(x)) along the inputs
+
+    Returns:
+        (2^n, 2^m) int64 array
+    """
+    table = as_sbox(sbox)
+    m = output_size(table)
+    signs = 1 - 2 * _popcount_parity(table[:, None] & np.arange(m)[None, :])
+    return fwht(signs, axis=0) // 2
+
+
+def bct(sbox) -> np.ndarray:
+    """
+    Boomerang connectivity table of a bijective S-box,
+    BCT[a, b] = #{x : S^-1(S(x) ^ b) ^ S^-1(S(x ^ a) ^ b) = a}
+
+    Returns:
+        (2^n, 2^n) int64 array
+    Raises:
+        ValueError: if the S-box is not a permutation
+    """
+    table = as_sbox(sbox)
+    n = len(table)
+    if sorted(table.tolist()) != list(range(n)):
+        raise ValueError("The boomerang connectivity table is defined for permutations")
+    inverse = np.argsort(table)
+    x = np.arange(n)
+    b = x[:, None]
+    out = np.empty((n, n), dtype=np.int64)
+    # S^-1(S(x) ^ b) for every (b, x)
+    left = inverse[table[None, :] ^ b]
+    for a in range(n):
+        right = inverse[table[None, x ^ a] ^ b]
+        out[a] = ((left ^ right) == a).sum(axis=1)
+    return out
+
+
+def metrics(tables: Dict[str, np.ndarray]) -> Dict[str, int]:
+    """
+    Derived metrics of the S-box tables
+
+    Args:
+        tables: ddt and lat arrays, bct optional
+    Returns:
+        differential uniformity, linearity (max |LAT| over non-zero output masks), nonlinearity and, with a BCT,
+        boomerang uniformity
+    """
+    n = tables["ddt"].shape[0]
+    linearity = int(np.abs(tables["lat"][:, 1:]).max()) if tables["lat"].shape[1] > 1 else 0
+    out = {
+        "differential_uniformity": int(tables["ddt"][1:].max()),
+        "linearity": linearity,
+        "nonlinearity": n // 2 - linearity,
+    }
+    if "bct" in tables:
+        out["boomerang_uniformity"] = int(tables["bct"][1:, 1:].max())
+    return out
+
+
+def _cache_path(digest: str, cache_dir: Optional[str]) -> str:
+    return os.path.join(cache_dir or settings.cache_dir, "sbox", f"{digest}.npz")
+
+
+def analyze(sbox=sbox_table, cache: bool = True, cache_dir: Optional[str] = None) -> Dict:
+    """
+    DDT, LAT, BCT (for permutations) and metrics of an S-box, cached on disk by S-box hash
+
+    Args:
+        sbox: lookup table of 2^n entries, n <= 8 - default: the AES S-box
+        cache: read and write the cache
+        cache_dir: cache directory - default: settings.cache_dir
+    Returns:
+        dict with the hash, the tables and the metrics
+    """
+    table = as_sbox(sbox)
+    digest = sbox_hash(table)
+    path = _cache_path(digest, cache_dir)
+    if cache and os.path.exists(path):
+        log.debug(f"Loading S-box analysis from {path}")
+        with np.load(path) as data:
+            tables = {name: data[name] for name in TABLES if name in data}
+    else:
+        tables = {"ddt": ddt(table), "lat": lat(table)}
+        if sorted(table.tolist()) == list(range(len(table))):
+            tables["bct"] = bct(table)
+        if cache:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so that concurrent readers never see a partial file
+            tmp = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez_compressed(tmp, **tables)
+            os.replace(tmp, path)
+            log.debug(f"S-box analysis cached in {path}")
+    return {"hash": digest, **tables, **metrics(tables)}
+
+
+if __name__ == '__main__':
+    ''' Example '''
+    result = analyze()
+    print(f"AES S-box {result['hash'][:16]}...")
+    print(f"\tdifferential uniformity: {result['differential_uniformity']}")
+    print(f"\tnonlinearity: {result['nonlinearity']}")
+    print(f"\tboomerang uniformity: {result['boomerang_uniformity']}")
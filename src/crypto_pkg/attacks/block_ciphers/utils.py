@@ -1,21 +1,160 @@
+from functools import cached_property
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
 class Text:
     """
     Number object whose attributes are
         ascii_hex: Hexadecimal ASCII representation
         hex: string with Hexadecimal base representation
         integer: integer number
+    The hex and integer representations are computed on first access.
     """
 
     def __init__(self, text):
         self.ascii_hex = text
-        self.hex = text.hex()
-        self.integer = int(text.hex(), 16)
+
+    @cached_property
+    def hex(self) -> str:
+        return self.ascii_hex.hex()
+
+    @cached_property
+    def integer(self) -> int:
+        return int.from_bytes(self.ascii_hex, 'big')
+
+
+class KeySpace:
+    """
+    Keys whose free bits form one contiguous field: key(i) = base | (i << shift) for 0 <= i < 2^bits.
+    The keys made of max_key unknown leading bits followed by zero bits (see prepare_key) are KeySpace.prefix(max_key).
+    Keys are enumerated as bytes or as uint8 arrays of contiguous index ranges, shards split the indices between
+    workers, and an index is mapped to its key and back in constant time.
+    """
+
+    def __init__(self, bits: int, shift: Optional[int] = None, base: int = 0, key_size: int = 128):
+        """
+        Args:
+            bits: number of free bits, at most 64
+            shift: position of the least significant free bit - default: the free bits lead the key
+            base: value of the fixed bits, its free bits must be zero
+            key_size: key size in bits, a multiple of 64
+        """
+        shift = key_size - bits if shift is None else shift
+        if not 0 < bits <= 64 or shift < 0 or bits + shift > key_size or key_size % 64:
+            raise ValueError(f"Invalid key space: {bits} free bits at {shift} in a {key_size}-bit key")
+        if base >> key_size or base & self._mask(bits, shift):
+            raise ValueError("The base key must fit in the key size and have its free bits set to zero")
+        self.bits = bits
+        self.shift = shift
+        self.base = base
+        self.key_size = key_size
+
+    @classmethod
+    def prefix(cls, max_key: int, key_size: int = 128) -> 'KeySpace':
+        """ Keys made of max_key unknown leading bits followed by zero bits """
+        return cls(max_key, key_size=key_size)
+
+    @staticmethod
+    def _mask(bits: int, shift: int) -> int:
+        return ((1 << bits) - 1) << shift
+
+    @property
+    def size(self) -> int:
+        """ Number of keys """
+        return 1 << self.bits
+
+    @property
+    def descriptor(self) -> str:
+        """ Identifier of the key space, e.g. for file headers """
+        if self.base == 0 and self.shift + self.bits == self.key_size:
+            return f"prefix-{self.bits}"
+        return f"field-{self.bits}-{self.shift}-{self.base:x}"
+
+    def __eq__(self, other):
+        return isinstance(other, KeySpace) and (self.bits, self.shift, self.base, self.key_size) == (
+            other.bits, other.shift, other.base, other.key_size)
+
+    def __hash__(self):
+        return hash((self.bits, self.shift, self.base, self.key_size))
+
+    def __repr__(self):
+        return f"KeySpace({self.descriptor}, key_size={self.key_size})"
+
+    def key(self, index: int) -> bytes:
+        """ Key of an index """
+        if not 0 <= index < self.size:
+            raise ValueError(f"Key index {index} out of range [0, 2^{self.bits})")
+        return (self.base | index << self.shift).to_bytes(self.key_size // 8, 'big')
+
+    def index(self, key: bytes) -> int:
+        """
+        Index of a key
+
+        Raises:
+            ValueError: if the fixed bits of the key differ from the base
+        """
+        value = int.from_bytes(bytes(key), 'big')
+        if len(key) * 8 != self.key_size or value & ~self._mask(self.bits, self.shift) != self.base:
+            raise ValueError("Key outside of the key space")
+        return value >> self.shift & (self.size - 1)
+
+    def __contains__(self, key: bytes) -> bool:
+        try:
+            self.index(key)
+        except ValueError:
+            return False
+        return True
+
+    def iter_keys(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """ Keys of the indices start to stop - 1, as bytes """
+        n_bytes, base, shift = self.key_size // 8, self.base, self.shift
+        for i in range(start, self.size if stop is None else stop):
+            yield (base | i << shift).to_bytes(n_bytes, 'big')
+
+    def keys(self, indices) -> np.ndarray:
+        """
+        Keys of an array of indices
+
+        Args:
+            indices: integers in [0, 2^bits)
+        Returns:
+            (N, key_size / 8) uint8 array of keys
+        """
+        indices = np.asarray(indices, dtype=np.uint64).reshape(-1)
+        words = self.key_size // 64
+        out = np.zeros((len(indices), words), dtype='>u8')
+        # The free bits start in the 64-bit word holding bit `shift` and may spill over into the previous one
+        word, bit = words - 1 - self.shift // 64, self.shift % 64
+        out[:, word] = indices << np.uint64(bit)
+        if bit + self.bits > 64:
+            out[:, word - 1] = indices >> np.uint64(64 - bit)
+        if self.base:
+            out |= np.array([self.base >> 64 * (words - 1 - i) & (2 ** 64 - 1) for i in range(words)], dtype='>u8')
+        return out.view(np.uint8)
+
+    def blocks(self, start: int = 0, count: Optional[int] = None) -> np.ndarray:
+        """ Keys of the indices start to start + count - 1, as an (N, key_size / 8) uint8 array """
+        count = self.size - start if count is None else count
+        return self.keys(np.arange(start, start + count, dtype=np.uint64))
+
+    def chunks(self, chunk: int, start: int = 0, stop: Optional[int] = None) -> List[Tuple[int, int]]:
+        """ (first index, count) of consecutive ranges of at most chunk indices covering [start, stop) """
+        stop = self.size if stop is None else stop
+        return [(first, min(chunk, stop - first)) for first in range(start, stop, chunk)]
+
+    def shards(self, n: int) -> List[range]:
+        """ Split the indices into n contiguous ranges of sizes differing by at most one """
+        q, r = divmod(self.size, n)
+        bounds = [i * q + min(i, r) for i in range(n + 1)]
+        return [range(bounds[i], bounds[i + 1]) for i in range(n)]
 
 
 def prepare_key(key: int, max_key=24) -> Text:
     """
     Converts and integer to usable key. Appends 128-max_kex 0 bits after the integer and pads 0 bits before the number
-     to satisfy the required number of bits. Then it converts to hexadecimal and instantiate a Text object
+     to satisfy the required number of bits. Then it instantiates a Text object
     Args:
         key: integer number
         max_key: after max_key bits, a sequence of 0 bits starts
@@ -23,13 +162,19 @@ def prepare_key(key: int, max_key=24) -> Text:
     Returns:
         Text object corresponding to the prepared key.
     """
-    try:
-        k = bin(key)
-        k_n = k[2:] + (128 - max_key) * '0'
-        n_k = format(int(k_n, 2), 'x')
-        n_k2 = n_k.rjust(2 * 16, '0')
-        k_n = bytes.fromhex(n_k2)
+    return Text(text=(key << (128 - max_key)).to_bytes(16, 'big'))
+
+
+def key_blocks(indices, max_key=24) -> np.ndarray:
+    """
+    Vectorized prepare_key: keys made of the max_key bits of each index followed by 128 - max_key zero bits
 
-    except Exception as exc:
-        raise exc
-    return Text(text=k_n)
+    Args:
+        indices: array of integers in [0, 2^max_key)
+        max_key: number of leading key bits, at most 64
+    Returns:
+        (N, 16) uint8 array of keys
+    """
+    if not 0 < max_key <= 64:
+        raise ValueError("key_blocks supports at most 64 unknown key bits")
+    return KeySpace.prefix(max_key).keys(indices)
@@ -0,0 +1,393 @@
+import itertools
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from functools import partial
+from multiprocessing import Event
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from crypto_pkg.attacks.block_ciphers.mitm import MITMCache, MITMTable
+from crypto_pkg.attacks.block_ciphers.modified_aes import COLUMN_BATCH, search_column_chunk
+from crypto_pkg.attacks.block_ciphers.utils import KeySpace, Text
+from crypto_pkg.attacks.scheduler import REPORT_INTERVAL, Progress, Scheduler
+from crypto_pkg.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_PORT = 7788
+# Keys per lease handed to a worker host
+LEASE_SIZE = 1 << 24
+# Seconds between two heartbeats of a worker, a lease not renewed for LEASE_TIMEOUT seconds is handed out again
+HEARTBEAT = 2.
+LEASE_TIMEOUT = 3 * HEARTBEAT
+# Seconds an idle worker waits before asking again for a lease
+IDLE_DELAY = .2
+
+
+class Job(NamedTuple):
+    """ Search over the indices 0 to total - 1, run by the workers with the runner of its kind """
+    kind: str
+    params: Dict
+    total: int
+
+
+def modified_aes_jobs(plain_text: bytes, cipher_text: bytes, batch_size: int = COLUMN_BATCH) -> List[Job]:
+    """ Jobs of the four key column searches of the ModifiedAES attack """
+    jobs = []
+    for n in range(4):
+        params = {"word": int.from_bytes(plain_text[4 * n:4 * n + 4], 'big'),
+                  "target": int.from_bytes(cipher_text[4 * n:4 * n + 4], 'big'), "batch_size": batch_size}
+        jobs.append(Job("modified-aes-column", params, 2 ** 32))
+    return jobs
+
+
+def double_aes_job(plain_text: bytes, cipher_text: bytes, max_key: int = 24, cache: bool = False) -> Job:
+    """ Job of the meet-in-the-middle search on double AES, each worker host building (or loading) the table """
+    params = {"plain_text": plain_text.hex(), "cipher_text": cipher_text.hex(), "max_key": max_key, "cache": cache}
+    return Job("double-aes", params, 2 ** max_key)
+
+
+class _ModifiedAESColumn:
+
+    def __init__(self, params: Dict, workers: Optional[int]):
+        self.task = partial(search_column_chunk, params["word"], params["target"], params["batch_size"])
+        self.chunk = max(params["batch_size"], COLUMN_BATCH)
+
+    def run(self, first: int, count: int, workers: Optional[int], stop) -> Any:
+        return Scheduler(self.task, count, chunk=self.chunk, workers=workers, start=first, stop=stop,
+                         report_interval=float('inf')).run()
+
+    def close(self):
+        pass
+
+
+class _DoubleAES:
+
+    def __init__(self, params: Dict, workers: Optional[int]):
+        self.cipher_text = bytes.fromhex(params["cipher_text"])
+        self.max_key = params["max_key"]
+        plain_text = bytes.fromhex(params["plain_text"])
+        if params["cache"]:
+            table = MITMCache().get_or_build(plain_text=plain_text, max_key=self.max_key, workers=workers)
+        else:
+            table = MITMTable.build(plain_text=plain_text, max_key=self.max_key, workers=workers)
+        # Put in shared memory once rather than by every search over several processes
+        self.table = table.share() if (workers or os.cpu_count()) > 1 else table
+
+    def run(self, first: int, count: int, workers: Optional[int], stop) -> Any:
+        return self.table.search(self.cipher_text, max_key=self.max_key, workers=workers, start=first, count=count,
+                                 stop=stop)
+
+    def close(self):
+        self.table.close()
+
+
+RUNNERS = {"modified-aes-column": _ModifiedAESColumn, "double-aes": _DoubleAES}
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """ One worker connection: JSON messages, one per line, each answered by one reply """
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = coordinator.connected(self.client_address)
+        try:
+            for line in self.rfile:
+                reply = coordinator.handle(worker, json.loads(line))
+                self.wfile.write(json.dumps(reply).encode() + b"\n")
+        except (OSError, ValueError) as e:
+            log.debug(f"Worker {worker}: {e}")
+        finally:
+            coordinator.disconnected(worker)
+
+
+class Coordinator:
+    """
+    Hands out ranges of the key space of a job to worker hosts over TCP (see run_worker), one job at a time.
+
+    Protocol, JSON objects one per line, each request answered by one reply:
+        hello -> welcome (heartbeat interval)
+        request -> lease (job id, kind, parameters, first index, count), wait (delay) or shutdown
+        heartbeat (job id, first index) -> ok, or stop if the job is over or the lease was handed to another worker
+        result (job id, first index, result or null) -> ok
+    A lease not renewed by a heartbeat within lease_timeout seconds, or held by a worker whose connection closes,
+    is handed out again. Once a result is found the next heartbeats of the other workers are answered by stop.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = DEFAULT_PORT, lease_size: int = LEASE_SIZE,
+                 heartbeat: float = HEARTBEAT, lease_timeout: float = LEASE_TIMEOUT):
+        """
+        Args:
+            host: interface to listen on
+            port: TCP port, 0 for any free port
+            lease_size: keys per lease
+            heartbeat: seconds between two heartbeats of a worker
+            lease_timeout: seconds without heartbeat after which a lease is handed out again
+        """
+        self.lease_size = lease_size
+        self.heartbeat = heartbeat
+        self.lease_timeout = lease_timeout
+        self._condition = threading.Condition()
+        self._ids = itertools.count()
+        self._workers = set()
+        self._closing = False
+        self._job = None
+        self._job_id = None
+        self._pending = deque()
+        # first index -> (worker, deadline, count)
+        self._leases: Dict[int, Tuple[int, float, int]] = {}
+        self._completed = set()
+        self._result = None
+        self._done = 0
+        self._started = 0.
+        self._last_report = 0.
+        self._server = _Server((host, port), _Handler)
+        self._server.coordinator = self
+        self._thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self) -> 'Coordinator':
+        """ Accept workers in a background thread """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        log.info(f"Coordinator listening on {self.address[0]}:{self.address[1]}")
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connected(self, address) -> int:
+        with self._condition:
+            worker = next(self._ids)
+            self._workers.add(worker)
+        log.info(f"Worker {worker} connected from {address[0]}")
+        return worker
+
+    def disconnected(self, worker: int) -> None:
+        with self._condition:
+            self._workers.discard(worker)
+            self._reclaim(lambda owner, deadline: owner == worker)
+            self._condition.notify_all()
+        log.info(f"Worker {worker} disconnected")
+
+    def _reclaim(self, expired) -> None:
+        for first, (owner, deadline, count) in list(self._leases.items()):
+            if expired(owner, deadline):
+                del self._leases[first]
+                self._pending.appendleft((first, count))
+                log.info(f"Range {first}+{count} of worker {owner} handed out again")
+
+    def _finished(self) -> bool:
+        return self._result is not None or (not self._pending and not self._leases)
+
+    def handle(self, worker: int, message: Dict) -> Dict:
+        """ Reply to a message of a worker """
+        kind = message.get("type")
+        with self._condition:
+            if kind == "hello":
+                return {"type": "welcome", "heartbeat": self.heartbeat}
+            if kind == "request":
+                if self._closing:
+                    return {"type": "shutdown"}
+                now = time.monotonic()
+                self._reclaim(lambda owner, deadline: deadline < now)
+                if self._job is None or self._finished() or not self._pending:
+                    return {"type": "wait", "delay": IDLE_DELAY}
+                first, count = self._pending.popleft()
+                self._leases[first] = (worker, now + self.lease_timeout, count)
+                return {"type": "lease", "job": self._job_id, "kind": self._job.kind, "params": self._job.params,
+                        "first": first, "count": count}
+            if kind == "heartbeat":
+                lease = self._leases.get(message["first"])
+                if self._closing or message["job"] != self._job_id or self._finished() or not lease or \
+                        lease[0] != worker:
+                    return {"type": "stop"}
+                self._leases[message["first"]] = (worker, time.monotonic() + self.lease_timeout, lease[2])
+                return {"type": "ok"}
+            if kind == "result":
+                if message["job"] == self._job_id and message["first"] not in self._completed:
+                    self._complete(message["first"], message["result"])
+                return {"type": "ok"}
+        return {"type": "error", "message": f"Unknown message type {kind}"}
+
+    def _complete(self, first: int, result: Any) -> None:
+        self._completed.add(first)
+        lease = self._leases.pop(first, None)
+        if lease is None:
+            # Handed out again after a timeout, then completed by the first worker
+            self._pending = deque(c for c in self._pending if c[0] != first)
+        self._done += min(self.lease_size, self._job.total - first)
+        if result is not None:
+            self._result = result
+        now = time.monotonic()
+        if now - self._last_report >= REPORT_INTERVAL:
+            self._last_report = now
+            elapsed = now - self._started
+            rate = self._done / elapsed if elapsed > 0 else 0.
+            eta = (self._job.total - self._done) / rate if rate > 0 else None
+            log.info(f"Job {self._job_id}: {Progress(self._done, self._job.total, rate, eta)}")
+        self._condition.notify_all()
+
+    def run(self, job: Job) -> Any:
+        """
+        Search the key space of a job with the connected workers
+
+        Returns:
+            the first result reported by a worker, None if the whole key space was searched without result
+        """
+        with self._condition:
+            self._job, self._job_id = job, (self._job_id or 0) + 1
+            self._pending = deque((first, min(self.lease_size, job.total - first))
+                                  for first in range(0, job.total, self.lease_size))
+            self._leases, self._completed, self._result, self._done = {}, set(), None, 0
+            self._started = self._last_report = time.monotonic()
+            log.info(f"Job {self._job_id} ({job.kind}): {job.total} keys in {len(self._pending)} ranges")
+            while not self._finished():
+                self._condition.wait(timeout=self.heartbeat)
+                now = time.monotonic()
+                self._reclaim(lambda owner, deadline: deadline < now)
+            log.info(f"Job {self._job_id} finished in {time.monotonic() - self._started:.1f}s")
+            return self._result
+
+    def close(self, linger: float = 5.) -> None:
+        """ Tell the workers to shut down, waiting up to linger seconds for them to disconnect, and stop listening """
+        with self._condition:
+            self._closing = True
+            self._condition.wait_for(lambda: not self._workers, timeout=linger)
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _Connection:
+    """ Worker side of a coordinator connection, shared by the search and heartbeat threads """
+
+    def __init__(self, host: str, port: int, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._socket = socket.create_connection((host, port), timeout=timeout)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(.5)
+        self._socket.settimeout(None)
+        self._file = self._socket.makefile('rwb')
+        self._lock = threading.Lock()
+
+    def call(self, message: Dict) -> Dict:
+        with self._lock:
+            self._file.write(json.dumps(message).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the coordinator")
+        return json.loads(line)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+def _heartbeats(connection: _Connection, job: int, first: int, stop, done: threading.Event, interval: float):
+    while not done.wait(interval):
+        try:
+            if connection.call({"type": "heartbeat", "job": job, "first": first})["type"] == "stop":
+                stop.set()
+                return
+        except (OSError, ValueError):
+            stop.set()
+            return
+
+
+def run_worker(host: str = "127.0.0.1", port: int = DEFAULT_PORT, workers: Optional[int] = None,
+               connect_timeout: float = 30.) -> int:
+    """
+    Search the ranges leased by a coordinator until it shuts down
+
+    Args:
+        host: address of the coordinator
+        port: port of the coordinator
+        workers: number of local processes per range - default: number of cores
+        connect_timeout: seconds to retry connecting to the coordinator
+    Returns:
+        number of ranges searched
+    """
+    connection = _Connection(host, port, connect_timeout)
+    interval = connection.call({"type": "hello"})["heartbeat"]
+    runner, runner_job, searched = None, None, 0
+    try:
+        while True:
+            reply = connection.call({"type": "request"})
+            if reply["type"] == "shutdown":
+                break
+            if reply["type"] == "wait":
+                time.sleep(reply["delay"])
+                continue
+            stop, done = Event(), threading.Event()
+            beat = threading.Thread(target=_heartbeats, args=(connection, reply["job"], reply["first"], stop, done,
+                                                              interval), daemon=True)
+            # Heartbeats start with the lease, as building the runner of a new job (e.g. a MITM table) takes time
+            beat.start()
+            try:
+                if reply["job"] != runner_job:
+                    if runner is not None:
+                        runner.close()
+                        runner = None
+                    runner, runner_job = RUNNERS[reply["kind"]](reply["params"], workers), reply["job"]
+                log.debug(f"Searching range {reply['first']}+{reply['count']} of job {reply['job']}")
+                result = runner.run(reply["first"], reply["count"], workers, stop)
+            finally:
+                done.set()
+                beat.join()
+            if stop.is_set() and result is None:
+                # Lease cancelled before the range was fully searched
+                continue
+            searched += 1
+            connection.call({"type": "result", "job": reply["job"], "first": reply["first"], "result": result})
+    except (ConnectionError, OSError) as e:
+        log.warning(f"Lost the coordinator: {e}")
+    finally:
+        if runner is not None:
+            runner.close()
+        connection.close()
+    log.info(f"Worker done, {searched} ranges searched")
+    return searched
+
+
+def modified_aes_attack(coordinator: Coordinator, plain_text: bytes, cipher_text: bytes,
+                        batch_size: int = COLUMN_BATCH) -> Optional[int]:
+    """ ModifiedAES key recovery with the workers of the coordinator, the key as an integer """
+    key = 0
+    for n, job in enumerate(modified_aes_jobs(plain_text, cipher_text, batch_size)):
+        column = coordinator.run(job)
+        if column is None:
+            return None
+        key |= int.from_bytes(KeySpace(32, shift=96 - 32 * n).key(column), 'big')
+        log.info(f"key guess for block {n}: {column:08x}")
+    return key
+
+
+def double_aes_attack(coordinator: Coordinator, plain_text: bytes, cipher_text: bytes, max_key: int = 24,
+                      cache: bool = False) -> Optional[Tuple[Text, Text]]:
+    """ Double AES meet-in-the-middle key recovery with the workers of the coordinator """
+    match = coordinator.run(double_aes_job(plain_text, cipher_text, max_key, cache))
+    if match is None:
+        return None
+    space = KeySpace.prefix(max_key)
+    return Text(text=space.key(match[0])), Text(text=space.key(match[1]))
@@ -4,7 +4,7 @@ import multiprocessing
 import os
 import time
 from multiprocessing import Pool
-from typing import Tuple, List
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 import numpy as np
 import pickle
 import matplotlib.pyplot as plt
@@ -14,6 +14,13 @@ from crypto_pkg.utils.logging import get_logger, set_level
 
 log = get_logger(__name__)
 
+# Samples correlated per step of compute_c, bounding the standardized block of measurements and of the output
+SAMPLE_TILE = 1024
+
+# HW_SBOX_TABLE[k, p] = Hamming weight of SBOX(k ^ p), the predicted current of key byte k for plain text byte p
+HW_SBOX_TABLE = np.array([bin(v).count('1') for v in sbox_table], dtype=np.uint8)[
+    np.bitwise_xor.outer(np.arange(256), np.arange(256))]
+
 
 def plot_c(data: np.ndarray, byte_position: int, plot: bool = False) -> None:
     """
@@ -34,15 +41,49 @@ def plot_c(data: np.ndarray, byte_position: int, plot: bool = False) -> None:
     plt.savefig(f'plots/plot_{byte_position}.png')
 
 
-def to_hex(n, size=16):
-    return hex(n)[2:].zfill(size * 2)
+def plain_text_bytes(plain_texts: List[int]) -> np.ndarray:
+    """
+    Plain texts as a uint8 array whose column b is the byte in position b, the b-th least significant byte
+
+    Args:
+        plain_texts: plain texts as 128-bit integers
+    Returns:
+        (N, 16) uint8 array
+    """
+    data = b''.join(int(p).to_bytes(16, 'little') for p in plain_texts)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+
+
+def _unit_rows(x: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """ Rows centered and scaled to unit norm, constant rows being left at zero """
+    z = np.asarray(x, dtype=dtype)
+    z = z - z.mean(axis=1, keepdims=True)
+    norms = np.sqrt(np.einsum('ij,ij->i', z, z))
+    norms[norms == 0] = np.inf
+    return z / norms[:, None].astype(dtype)
+
 
+def pearson_matrix(x: np.ndarray, y: np.ndarray, dtype=np.float64, tile: int = SAMPLE_TILE) -> np.ndarray:
+    """
+    Pearson coefficients of every row of x with every row of y, computed as one product of the rows centered and
+    scaled to unit norm, tiled over the rows of y
 
-def process_plain_text(text: str) -> List[str]:
-    return [item for item in [text[i * 2:i * 2 + 2] for i in range(len(text))] if item != ''][::-1]
+    Args:
+        x: (H, N) array, e.g. the predicted currents of H key hypotheses for N traces
+        y: (S, N) array, e.g. S samples of N traces
+        dtype: float64, or float32 for half the memory and faster products
+        tile: rows of y standardized and multiplied at once
+    Returns:
+        (H, S) array of coefficients, 0 for constant rows
+    """
+    zx = _unit_rows(x, dtype)
+    out = np.empty((len(zx), len(y)), dtype=dtype)
+    for start in range(0, len(y), tile):
+        np.matmul(zx, _unit_rows(y[start:start + tile], dtype).T, out=out[:, start:start + tile])
+    return out
 
 
-def load(filename: str, max_datapoints: int = 4000) -> Tuple[List[List[str]], List[np.ndarray]]:
+def load(filename: str, max_datapoints: int = 4000) -> Tuple[np.ndarray, np.ndarray]:
     """
     Load measurements from the pickle file to the memory
 
@@ -50,7 +91,8 @@ def load(filename: str, max_datapoints: int = 4000) -> Tuple[List[List[str]], Li
         filename: name of the pickle file
         max_datapoints: data point position after which the measurement data wll be ignored
     Returns:
-        Tuple(plain texts converted to a list of lists of 16 bytes, processed measurements according to the matrix M)
+        Tuple(plain texts as an (N, 16) uint8 array of bytes (see plain_text_bytes), measurements matrix M of shape
+        (data points, traces))
     """
     if max_datapoints > max_datapoints:
         log.warning(
@@ -63,10 +105,155 @@ def load(filename: str, max_datapoints: int = 4000) -> Tuple[List[List[str]], Li
                 objects.append(pickle.load(openfile))
             except EOFError:
                 break
-    p_texts = [process_plain_text(to_hex(item)) for item in objects[0][0]]
+    p_texts = plain_text_bytes(objects[0][0])
     measures = np.array([item[:max_datapoints] for item in objects[0][1]])
-    measurements_processed = [np.array([item[idx] for item in measures]) for idx in range(len(measures[0]))]
-    return p_texts, measurements_processed
+    return p_texts, np.ascontiguousarray(measures.T)
+
+
+def load_batches(filename: str, batch_size: int = 1000, max_datapoints: int = 4000) -> Iterator[
+        Tuple[np.ndarray, np.ndarray]]:
+    """
+    Read the measurements of a pickle file in batches of traces. The file may hold several pickled (plain texts,
+    measurements) objects, e.g. appended as the traces are collected, only one of them being in memory at a time
+
+    Args:
+        filename: name of the pickle file
+        batch_size: number of traces per batch
+        max_datapoints: data point position after which the measurement data wll be ignored
+    Returns:
+        Iterator of (plain texts as an (N, 16) uint8 array, measurements of shape (N, data points))
+    """
+    with open(filename, "rb") as openfile:
+        while True:
+            try:
+                plain_texts, measures = pickle.load(openfile)
+            except EOFError:
+                return
+            for start in range(0, len(plain_texts), batch_size):
+                yield plain_text_bytes(plain_texts[start:start + batch_size]), np.array(
+                    [item[:max_datapoints] for item in measures[start:start + batch_size]], dtype=np.float64)
+
+
+class CPAAccumulator:
+    """
+    Online correlation power analysis: running sums of the predicted currents x, of the measurements y, of their
+    squares and of their products, per key hypothesis and data point, updated with batches of traces.
+    The correlation matrix, and so the best key bytes, are available after each batch while the memory used does not
+    depend on the number of traces. Accumulators of disjoint sets of traces, e.g. computed in separate processes, are
+    merged by adding their sums.
+    """
+
+    def __init__(self, n_datapoints: int, byte_positions: Sequence[int] = tuple(range(16))):
+        """
+        Args:
+            n_datapoints: number of data points of each trace, further ones are ignored
+            byte_positions: key byte positions to attack - default: all of them
+        """
+        self.n_datapoints = n_datapoints
+        self.byte_positions = tuple(byte_positions)
+        self.n = 0
+        # Shapes (byte positions, 256) for x, (data points,) for y and (byte positions, 256, data points) for x * y
+        self.sum_x = np.zeros((len(self.byte_positions), 256))
+        self.sum_x2 = np.zeros((len(self.byte_positions), 256))
+        self.sum_y = np.zeros(n_datapoints)
+        self.sum_y2 = np.zeros(n_datapoints)
+        self.sum_xy = np.zeros((len(self.byte_positions), 256, n_datapoints))
+
+    def update(self, plain_texts: np.ndarray, traces: np.ndarray) -> None:
+        """
+        Add a batch of traces to the sums
+
+        Args:
+            plain_texts: (N, 16) uint8 array of plain text bytes (see plain_text_bytes)
+            traces: (N, data points) measurements
+        """
+        traces = np.asarray(traces, dtype=np.float64)
+        if traces.ndim != 2 or traces.shape[1] < self.n_datapoints or len(traces) != len(plain_texts):
+            raise ValueError(f"Expected {len(plain_texts)} traces of at least {self.n_datapoints} data points, got an "
+                             f"array of shape {traces.shape}")
+        y = traces[:, :self.n_datapoints]
+        x = HW_SBOX_TABLE[:, np.asarray(plain_texts)[:, list(self.byte_positions)].T].swapaxes(0, 1).astype(np.float64)
+        self.n += len(y)
+        self.sum_x += x.sum(axis=2)
+        self.sum_x2 += np.einsum('bkn,bkn->bk', x, x)
+        self.sum_y += y.sum(axis=0)
+        self.sum_y2 += np.einsum('ns,ns->s', y, y)
+        self.sum_xy += np.matmul(x, y)
+
+    def merge(self, other: 'CPAAccumulator') -> 'CPAAccumulator':
+        """
+        Add the sums of an accumulator of other traces
+
+        Returns:
+            this accumulator
+        Raises:
+            ValueError: if the accumulators attack other byte positions or data points
+        """
+        if (other.byte_positions, other.n_datapoints) != (self.byte_positions, self.n_datapoints):
+            raise ValueError("Cannot merge accumulators of different byte positions or data points")
+        self.n += other.n
+        self.sum_x += other.sum_x
+        self.sum_x2 += other.sum_x2
+        self.sum_y += other.sum_y
+        self.sum_y2 += other.sum_y2
+        self.sum_xy += other.sum_xy
+        return self
+
+    def correlation(self) -> np.ndarray:
+        """
+        Pearson coefficients of the traces added so far
+
+        Returns:
+            (byte positions, 256, data points) array of coefficients, 0 where the predictions or the measurements are
+            constant
+        """
+        n = self.n
+        cov = n * self.sum_xy - self.sum_x[:, :, None] * self.sum_y
+        var_x = np.clip(n * self.sum_x2 - self.sum_x ** 2, 0, None)
+        var_y = np.clip(n * self.sum_y2 - self.sum_y ** 2, 0, None)
+        den = np.sqrt(var_x[:, :, None] * var_y)
+        den[den == 0] = np.inf
+        return cov / den
+
+    def best(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            Tuple(key byte of highest absolute correlation for each byte position, that correlation)
+        """
+        peaks = np.abs(self.correlation()).max(axis=2)
+        key_bytes = peaks.argmax(axis=1)
+        return key_bytes.astype(np.uint8), peaks[np.arange(len(peaks)), key_bytes]
+
+    @set_level(logger=log)
+    def run(self, batches: Iterable[Tuple[np.ndarray, np.ndarray]], stable_batches: Optional[int] = None,
+            on_batch: Optional[Callable[[int, np.ndarray, np.ndarray], None]] = None,
+            _verbose: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Update the sums with each batch and report the best key bytes after it
+
+        Args:
+            batches: iterable of (plain texts, traces), e.g. load_batches
+            stable_batches: stop once the key bytes are unchanged for this many batches - default: use every batch
+            on_batch: called with the number of traces, the key bytes and their correlations after each batch
+            _verbose:
+        Returns:
+            Tuple(key bytes in the order of the byte positions, their correlations)
+        """
+        key_bytes, peaks = np.zeros(len(self.byte_positions), dtype=np.uint8), np.zeros(len(self.byte_positions))
+        previous, stable = None, 0
+        for plain_texts, traces in batches:
+            self.update(plain_texts, traces)
+            key_bytes, peaks = self.best()
+            stable = stable + 1 if previous is not None and np.array_equal(previous, key_bytes) else 0
+            previous = key_bytes
+            found = ' '.join(f"{position}:{byte:02x}" for position, byte in zip(self.byte_positions, key_bytes))
+            log.info(f"{self.n} traces - key bytes {found} - lowest correlation {peaks.min():.3f}")
+            if on_batch is not None:
+                on_batch(self.n, key_bytes, peaks)
+            if stable_batches and stable >= stable_batches:
+                log.info(f"Key bytes unchanged for {stable} batches -> stopping")
+                break
+        return key_bytes, peaks
 
 
 class Attack:
@@ -87,7 +274,7 @@ class Attack:
         Returns:
             Hamming wight of SBOX(keyByte oplus plainTextByte)
         """
-        return bin(sbox_table[key_byte ^ plaintext_byte])[2:].count('1')
+        return int(HW_SBOX_TABLE[key_byte, plaintext_byte])
 
     @staticmethod
     def calculate_pearson_coefficient(x: np.ndarray, y: np.ndarray) -> float:
@@ -100,32 +287,27 @@ class Attack:
         Returns:
             The Pearson Coefficient
         """
-        mu_x, mu_y = sum(x) / len(x), sum(y) / len(y)
-        z = np.array([(x_item - mu_x) * (y_item - mu_y) for (x_item, y_item) in zip(x, y)])
-        z_mean = sum(z) / len(z)
-        std_x, std_y = np.sqrt(sum(x ** 2) / len(x) - mu_x ** 2), np.sqrt(sum(y ** 2) / len(y) - mu_y ** 2)
-        return z_mean / (std_x * std_y)
-
-    @classmethod
-    def generate_predicted_currents(cls, plain_texts, byte_position: int) -> np.ndarray:
+        return float(pearson_matrix(np.reshape(x, (1, -1)), np.reshape(y, (1, -1)))[0, 0])
+
+    @staticmethod
+    def generate_predicted_currents(plain_texts: np.ndarray, byte_position: Optional[int] = None) -> np.ndarray:
         """
-        Generate the matrix P of the predicted currents for all key bytes and plain text bytes
+        Generate the matrix P of the predicted currents for all key bytes and plain text bytes, looked up in
+        HW_SBOX_TABLE
 
         Args:
-            plain_texts: list of list of 16 bytes (each list of 16 bytes being one plain text)
-            byte_position: byte position to consider
+            plain_texts: (N, 16) uint8 array of plain text bytes (see plain_text_bytes)
+            byte_position: byte position to consider - default: all of them
         Returns:
-            Matrix P
+            Matrix P of shape (256, N), or (16, 256, N) for all byte positions, as uint8
         """
-        p = np.zeros((2 ** 8, 500))
-        for k in range(2 ** 8):
-            for i in range(len(plain_texts)):
-                b = plain_texts[i][byte_position]
-                hexa = int(b, 16)
-                p[k][i] = cls.predict_current(key_byte=k, plaintext_byte=hexa)
-        return p
-
-    def compute_c(self, predicted_currents: np.ndarray, byte_position: int, save: bool = False) -> np.ndarray:
+        if byte_position is not None:
+            return HW_SBOX_TABLE[:, plain_texts[:, byte_position]]
+        # One gather for every byte position, axes swapped without a copy
+        return HW_SBOX_TABLE[:, plain_texts.T].swapaxes(0, 1)
+
+    def compute_c(self, predicted_currents: np.ndarray, byte_position: int, save: bool = False, dtype=np.float64,
+                  tile: int = SAMPLE_TILE) -> np.ndarray:
         """
         Compute the correlation matrix
 
@@ -133,13 +315,12 @@ class Attack:
             predicted_currents: predicted currents P
             byte_position: byte position to consider
             save: Save the matrix into a .npy file - Default False
+            dtype: float64 or float32 - Default float64
+            tile: data points correlated at once, bounding the memory used
         Returns:
             Correlation matrix C between the measurements and the predicted current
         """
-        c = np.zeros((len(predicted_currents), len(self.measurements)))
-        for i in range(len(predicted_currents)):
-            for j in range(len(self.measurements)):
-                c[i][j] = abs(self.calculate_pearson_coefficient(predicted_currents[i], self.measurements[j]))
+        c = np.abs(pearson_matrix(predicted_currents, self.measurements, dtype=dtype, tile=tile))
         if save:
             np.save(f"matrices/matrix_{byte_position}.npy", np.array(c))
         return c
@@ -0,0 +1,211 @@
+import json
+import os
+import time
+from multiprocessing import Event, Pool
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from crypto_pkg.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+# Keys per chunk: small enough for the pool to balance the load and for a resumed run to lose little work
+CHUNK = 1 << 22
+CHECKPOINT_INTERVAL = 5.
+REPORT_INTERVAL = 10.
+
+# State of the pool workers, set by the initializer
+_worker = {}
+
+
+class Progress(NamedTuple):
+    done: int
+    total: int
+    keys_per_second: float
+    eta: Optional[float]
+
+    def __str__(self):
+        eta = f"{self.eta:.0f}s" if self.eta is not None else "-"
+        return f"{self.done}/{self.total} keys ({100 * self.done / max(self.total, 1):.1f}%), " \
+               f"{self.keys_per_second:.0f} keys/s, ETA {eta}"
+
+
+def _init_worker(task: Callable, stop, first_match: bool, initializer: Optional[Callable], initargs: Tuple):
+    _worker.update(task=task, stop=stop, first_match=first_match)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_chunk(chunk: Tuple[int, int]) -> Tuple[int, int, Any, bool]:
+    first, count = chunk
+    if _worker["stop"].is_set():
+        return first, count, None, False
+    result = _worker["task"](first, count)
+    if result is not None and _worker["first_match"]:
+        # Tell the other workers to skip their remaining chunks
+        _worker["stop"].set()
+    return first, count, result, True
+
+
+class Scheduler:
+    """
+    Brute-force job over the indices start to start + total - 1, cut into small chunks handed to a pool of workers:
+    idle workers take the next chunk, so fast workers do more of the work. In first-match mode the first result found
+    sets a shared stop event and the pool is terminated; otherwise the results of all chunks are collected.
+    The completed chunks (and their results) are written to a JSON checkpoint, from which a killed run resumes.
+    """
+
+    def __init__(self, task: Callable[[int, int], Any], total: int, chunk: int = CHUNK, workers: Optional[int] = None,
+                 checkpoint: Optional[str] = None, job: str = "", first_match: bool = True,
+                 initializer: Optional[Callable] = None, initargs: Tuple = (),
+                 on_progress: Optional[Callable[[Progress], None]] = None,
+                 checkpoint_interval: float = CHECKPOINT_INTERVAL, report_interval: float = REPORT_INTERVAL,
+                 start: int = 0, stop=None):
+        """
+        Args:
+            task: picklable function (first index, count) -> result, None when the chunk has no result
+            total: number of indices
+            chunk: indices per chunk
+            workers: number of processes, None for the number of cores, 1 to run in this process
+            checkpoint: JSON file of the completed chunks, read at start and rewritten as chunks complete
+            job: identifier of the job, a checkpoint written for another job or chunk size is ignored
+            first_match: stop at the first result instead of collecting the results of every chunk
+            initializer: called with initargs in each worker (in this process if workers is 1) before any chunk
+            initargs: arguments of the initializer
+            on_progress: called with the progress at each report
+            checkpoint_interval: minimum seconds between two checkpoint writes
+            report_interval: seconds between two progress reports
+            start: first index
+            stop: multiprocessing Event cancelling the job when set, e.g. from another thread - default: a new one
+        """
+        self.task = task
+        self.total = total
+        self.chunk = chunk
+        self.workers = workers or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.job = job
+        self.first_match = first_match
+        self.initializer = initializer
+        self.initargs = initargs
+        self.on_progress = on_progress
+        self.checkpoint_interval = checkpoint_interval
+        self.report_interval = report_interval
+        self.start = start
+        self.stop = stop if stop is not None else Event()
+        self.completed: Dict[int, Any] = {}
+        self._started = self._done_at_start = 0
+        self._last_report = self._last_checkpoint = 0.
+
+    def chunks(self) -> List[Tuple[int, int]]:
+        """ (first index, count) of every chunk """
+        end = self.start + self.total
+        return [(first, min(self.chunk, end - first)) for first in range(self.start, end, self.chunk)]
+
+    @property
+    def done(self) -> int:
+        """ Number of indices of the completed chunks """
+        return sum(min(self.chunk, self.start + self.total - first) for first in self.completed)
+
+    @property
+    def progress(self) -> Progress:
+        done = self.done
+        elapsed = time.monotonic() - self._started
+        rate = (done - self._done_at_start) / elapsed if elapsed > 0 else 0.
+        eta = (self.total - done) / rate if rate > 0 else None
+        return Progress(done, self.total, rate, eta)
+
+    def _header(self) -> Dict:
+        return {"job": self.job, "start": self.start, "total": self.total, "chunk": self.chunk}
+
+    def load_checkpoint(self) -> None:
+        """ Restore the completed chunks of the checkpoint, if it belongs to this job """
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable checkpoint {self.checkpoint}: {e}")
+            return
+        if {k: state.get(k) for k in self._header()} != self._header():
+            log.warning(f"Ignoring checkpoint {self.checkpoint} of another job")
+            return
+        self.completed = {int(first): result for first, result in state["completed"]}
+        log.info(f"Resuming from {self.checkpoint}: {len(self.completed)} chunks already done")
+
+    def save_checkpoint(self) -> None:
+        """ Write the completed chunks, atomically """
+        if not self.checkpoint:
+            return
+        state = {**self._header(), "completed": sorted(self.completed.items())}
+        tmp = f"{self.checkpoint}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint)
+        self._last_checkpoint = time.monotonic()
+
+    def _found(self) -> Any:
+        return next((r for _, r in sorted(self.completed.items()) if r is not None), None)
+
+    def _complete(self, first: int, result: Any) -> None:
+        self.completed[first] = result
+        now = time.monotonic()
+        if now - self._last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+        if now - self._last_report >= self.report_interval:
+            self._last_report = now
+            progress = self.progress
+            log.info(str(progress))
+            if self.on_progress is not None:
+                self.on_progress(progress)
+
+    def _results(self) -> Any:
+        if self.first_match:
+            return self._found()
+        return [r for _, r in sorted(self.completed.items()) if r is not None]
+
+    def run(self) -> Any:
+        """
+        Run the chunks not completed yet
+
+        Returns:
+            in first-match mode the first result found (None if no chunk has one), otherwise the list of the
+            results of the chunks, ordered by index
+        """
+        self.load_checkpoint()
+        if self.first_match and self._found() is not None:
+            return self._found()
+        pending = [c for c in self.chunks() if c[0] not in self.completed]
+        self._started, self._done_at_start = time.monotonic(), self.done
+        self._last_report = self._last_checkpoint = self._started
+        try:
+            if self.workers == 1 or len(pending) <= 1:
+                self._run_here(pending)
+            else:
+                self._run_pool(pending)
+        finally:
+            # Also reached on KeyboardInterrupt, so that an interrupted run resumes where it stopped
+            self.save_checkpoint()
+        return self._results()
+
+    def _run_here(self, pending: List[Tuple[int, int]]) -> None:
+        # The task is called directly: nothing is left in the module state of this process
+        if self.initializer is not None:
+            self.initializer(*self.initargs)
+        for first, count in pending:
+            if self.stop.is_set():
+                return
+            result = self.task(first, count)
+            self._complete(first, result)
+            if self.first_match and result is not None:
+                return
+
+    def _run_pool(self, pending: List[Tuple[int, int]]) -> None:
+        with Pool(self.workers, initializer=_init_worker,
+                  initargs=(self.task, self.stop, self.first_match, self.initializer, self.initargs)) as pool:
+            for first, count, result, ran in pool.imap_unordered(_run_chunk, pending, chunksize=1):
+                if not ran:
+                    continue
+                self._complete(first, result)
+                if self.first_match and result is not None:
+                    # Leaving the context terminates the workers still running
+                    return
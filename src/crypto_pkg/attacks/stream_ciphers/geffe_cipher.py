@@ -1,7 +1,10 @@
+import os
 from decimal import Decimal
 from enum import Enum
-from typing import List, Tuple, Union, Dict
+from functools import partial
+from typing import List, Optional, Tuple, Union, Dict
 
+from crypto_pkg.attacks.scheduler import Scheduler
 from crypto_pkg.ciphers.symmetric.geffe import Geffe
 from crypto_pkg.utils.logging import get_logger, set_level
 
@@ -35,6 +38,11 @@ class ThresholdsOperator(Enum):
     MAX = max_check
 
 
+def thresholds_id(thresholds) -> str:
+    """ Stable text of the thresholds, the operators being named instead of printed with their address """
+    return ",".join("-" if t is None else f"{t[0].__name__}:{t[1]}" for t in thresholds)
+
+
 class Attack:
 
     def __init__(self, all_taps: List[List[int]], n: int, f: List[int], stream_ref: str, max_clock: int):
@@ -86,24 +94,43 @@ class Attack:
         else:
             return False, None
 
-    def look_for_correlation(self, thresholds: Union[List[Tuple[ThresholdsOperator, float]], None]):
-
+    def correlation_chunk(self, thresholds, first: int, count: int) -> Optional[Tuple[List[int], List[int]]]:
+        """ Scheduler task: seeds of LFSR 1 and 3 in [first, first + count) passing the correlation thresholds """
         g = Geffe(self.n, self.all_taps, self.f)
-        d = [self.try_guess(g=g, threshold=thresholds, guess=i) for i in range(self.max_iter)]
+        d = [self.try_guess(g=g, threshold=thresholds, guess=i) for i in range(first, first + count)]
         key0 = [item[0][0] for item in d if item[0] is not None]
         key2 = [item[2][0] for item in d if item[2] is not None]
+        return (key0, key2) if key0 or key2 else None
+
+    def look_for_correlation(self, thresholds: Union[List[Tuple[ThresholdsOperator, float]], None],
+                             workers: Optional[int] = 1, checkpoint: Optional[str] = None):
+        scheduler = Scheduler(partial(self.correlation_chunk, thresholds), self.max_iter, chunk=1 << 10,
+                              workers=workers, checkpoint=checkpoint, first_match=False,
+                              job=f"geffe-correlation/{self.stream_ref}/{self.n}/{thresholds_id(thresholds)}")
+        found = scheduler.run()
+        key0 = [k for item in found for k in item[0]]
+        key2 = [k for item in found for k in item[1]]
 
         return key0, key2
 
-    def find_k1(self, key0, key2) -> Dict[str, list]:
+    def seed_chunk(self, key0, key2, first: int, count: int) -> Optional[List[int]]:
+        """ Scheduler task: full seeds (k0, k1, k2) of indices [first, first + count) generating the stream """
         g = Geffe(self.n, self.all_taps, self.f)
-        all_keys = [[k0_item, k1, k2_item] for k0_item in key0 for k1 in range(self.max_iter) for k2_item in
-                    key2]
-        res = [self.try_guess_for_1(guess=key, g=g) for key in
-               all_keys]
-        success = [item[1] for item in res if item[0] is True]
-        if success:
-            result = success[0]
+        for i in range(first, first + count):
+            rest, c = divmod(i, len(key2))
+            a, k1 = divmod(rest, self.max_iter)
+            match, guess = self.try_guess_for_1(guess=[key0[a], k1, key2[c]], g=g)
+            if match:
+                return guess
+        return None
+
+    def find_k1(self, key0, key2, workers: Optional[int] = 1, checkpoint: Optional[str] = None) -> Dict[str, list]:
+        # The candidates (k0, k1, k2) are indexed in the order k0, then k1, then k2
+        scheduler = Scheduler(partial(self.seed_chunk, key0, key2), len(key0) * self.max_iter * len(key2),
+                              chunk=1 << 10, workers=workers, checkpoint=checkpoint,
+                              job=f"geffe-seeds/{self.stream_ref}/{key0}/{key2}")
+        result = scheduler.run()
+        if result:
             return {"k0": int_2_base_2(result[0], self.n),
                     "k1": int_2_base_2(result[1], self.n),
                     "k2": int_2_base_2(result[2], self.n)
@@ -112,15 +139,27 @@ class Attack:
             raise Exception("Attack Failed")
 
     @set_level(log)
-    def attack(self, thresholds, _verbose: bool = False):
+    def attack(self, thresholds, workers: Optional[int] = None, checkpoint_dir: Optional[str] = None,
+               _verbose: bool = False):
+        """
+        Args:
+            thresholds: correlation thresholds of LFSR 1 and 3 (the second entry is unused)
+            workers: number of processes - default: number of cores
+            checkpoint_dir: directory of the checkpoints of both searches, to resume an interrupted attack
+        """
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
         log.info("Search for possible seeds")
-        k0, k2 = self.look_for_correlation(thresholds=thresholds)
+        k0, k2 = self.look_for_correlation(
+            thresholds=thresholds, workers=workers,
+            checkpoint=os.path.join(checkpoint_dir, "geffe-correlation.json") if checkpoint_dir else None)
         log.info("Possible choices for seeds of LFSR 1 and 3")
         msg = f"Possible choices\n\tk_0 = {k0} = {[int_2_base_2(item, 16) for item in k0]}\n" \
               f"\tk_2 = {k2} = {[int_2_base_2(item, 16) for item in k2]}"
         log.debug(msg)
         log.info("Find seed for LFSR 2")
-        out = self.find_k1(key0=k0, key2=k2)
+        out = self.find_k1(key0=k0, key2=k2, workers=workers,
+                           checkpoint=os.path.join(checkpoint_dir, "geffe-seeds.json") if checkpoint_dir else None)
         msg = f"\nSuccess\nThe key is (k0,k1,k2)\n\t = {out['k0']},{out['k1']},{out['k2']}"
         log.info(f"{msg}")
         return out
@@ -0,0 +1,45 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from crypto_pkg.benchmarks.utils import throughput
+from crypto_pkg.ciphers.symmetric.aes import expand_key, ttable_encrypt
+from crypto_pkg.ciphers.symmetric.aes_bitsliced import BitslicedAES
+
+
+def benchmark_bitsliced(n_blocks: int = 4096, widths: Sequence[int] = (64, 128, 1024),
+                        lanes: Sequence[str] = ('int', 'uint64'), min_time: float = 0.2) -> List[Dict]:
+    """
+    Encryption throughput of the bitsliced engine for several slice widths, compared with the T-table engine
+
+    Args:
+        n_blocks: number of blocks encrypted per measurement
+        widths: slice widths to measure
+        lanes: plane representations to measure
+        min_time: minimum duration of each measurement in seconds
+    Returns:
+        one row per engine with its blocks/s and its speed-up over the T-table engine
+    """
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(0, 256, size=(n_blocks, 16), dtype=np.uint8)
+    key = expand_key(rng.integers(0, 256, size=16, dtype=np.uint8).tobytes())
+    raw_blocks = [b.tobytes() for b in blocks]
+
+    table_rate = throughput(lambda: [ttable_encrypt(b, key.words) for b in raw_blocks], n_blocks, min_time)
+    rows = [{"engine": "ttable", "width": 1, "blocks_per_second": table_rate, "speedup": 1.}]
+    for lane in lanes:
+        for width in widths:
+            if lane == 'uint64' and width % 64:
+                continue
+            aes = BitslicedAES(width=width, lanes=lane)
+            rate = throughput(lambda: aes.encrypt_blocks(blocks, key), n_blocks, min_time)
+            rows.append({"engine": f"bitsliced-{lane}", "width": width, "blocks_per_second": rate,
+                         "speedup": rate / table_rate})
+    return rows
+
+
+if __name__ == '__main__':
+    ''' Example '''
+    for row in benchmark_bitsliced(widths=(64, 128, 1024, 4096)):
+        print(f"{row['engine']:>18} width {row['width']:>5}: {row['blocks_per_second']:>12.0f} blocks/s "
+              f"(x{row['speedup']:.1f})")
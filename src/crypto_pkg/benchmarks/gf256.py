@@ -0,0 +1,39 @@
+from typing import Dict
+
+import numpy as np
+
+from crypto_pkg.benchmarks.utils import throughput
+from crypto_pkg.ciphers.symmetric.aes import CustomAES, gf256_mul
+from crypto_pkg.number_theory import gf256
+
+
+def benchmark_gf256(n: int = 1 << 16, min_time: float = 0.2) -> Dict[str, float]:
+    """
+    Multiplications per second of the log/antilog gf256_mul function against the gf256 tables, and MixColumns
+    calls per second of CustomAES.aes_mix_columns.
+
+    Args:
+        n: number of products computed per measurement
+        min_time: minimum duration of each measurement in seconds
+    Returns:
+        rates keyed by implementation
+    """
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 256, size=n, dtype=np.uint8)
+    b = rng.integers(0, 256, size=n, dtype=np.uint8)
+    a_list, b_list = a.tolist(), b.tolist()
+    rows = gf256.MUL_TABLE.tolist()
+    state = rng.integers(0, 256, size=(4, 4)).tolist()
+    aes = CustomAES()
+    return {
+        "log_antilog_mul": throughput(lambda: [gf256_mul(x, y) for x, y in zip(a_list, b_list)], n, min_time),
+        "table_mul_scalar": throughput(lambda: [rows[x][y] for x, y in zip(a_list, b_list)], n, min_time),
+        "table_mul_vectorized": throughput(lambda: gf256.mul(a, b), n, min_time),
+        "mix_columns": throughput(lambda: aes.aes_mix_columns(state), 1, min_time),
+    }
+
+
+if __name__ == '__main__':
+    ''' Example '''
+    for name, rate in benchmark_gf256().items():
+        print(f"{name:>22}: {rate:>14.0f} /s")
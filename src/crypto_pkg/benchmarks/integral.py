@@ -0,0 +1,53 @@
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.integral import (IntegralAttack, balanced_guesses_5_rounds, lambda_set,
+                                                       reduced_round_oracle)
+from crypto_pkg.benchmarks.utils import throughput
+from crypto_pkg.ciphers.symmetric.aes_variants import AESVariant, VariantAES
+
+
+def benchmark_integral(candidate_counts: Sequence[int] = (256, 1024, 4096, 16384), repeat: int = 3,
+                       min_time: float = 0.2) -> List[Dict]:
+    """
+    Scaling of the integral attack compared with an exhaustive search on the same reduced-round cipher
+
+    Args:
+        candidate_counts: numbers of last round key column candidates tested by the 5-round measurements
+        repeat: number of 4-round key recoveries averaged
+        min_time: minimum duration of each throughput measurement in seconds
+    Returns:
+        one row per measurement with its duration in seconds; for the 5-round rows, the time extrapolated to all
+        2^32 candidates of a column, and for the exhaustive search the expected time over 2^128 keys
+    """
+    rng = np.random.default_rng(0)
+    rows = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        key = rng.integers(0, 256, size=16, dtype=np.uint8).tobytes()
+        IntegralAttack(reduced_round_oracle(key, rounds=4), rounds=4).attack_4_rounds()
+    rows.append({"attack": "integral-4-rounds", "candidates": 16 * 256,
+                 "seconds": (time.perf_counter() - start) / repeat})
+
+    cipher_texts = reduced_round_oracle(rng.integers(0, 256, size=16, dtype=np.uint8).tobytes(), rounds=5)(
+        lambda_set(constant=bytes(16)))
+    for n in candidate_counts:
+        candidates = rng.integers(0, 256, size=(n, 4), dtype=np.uint8)
+        rate = throughput(lambda: balanced_guesses_5_rounds(cipher_texts, candidates), n, min_time)
+        rows.append({"attack": "integral-5-rounds-column", "candidates": n, "seconds": n / rate,
+                     "full_column_seconds": 2 ** 32 / rate})
+
+    aes = VariantAES(AESVariant(rounds=4))
+    keys = rng.integers(0, 256, size=(1 << 14, 16), dtype=np.uint8)
+    rate = throughput(lambda: aes.encrypt_under_keys(bytes(16), keys), len(keys), min_time)
+    rows.append({"attack": "exhaustive-4-rounds", "candidates": 2 ** 128, "seconds": 2 ** 127 / rate})
+    return rows
+
+
+if __name__ == '__main__':
+    ''' Example '''
+    for row in benchmark_integral():
+        extra = f" (all 2^32: {row['full_column_seconds']:.3g} s)" if "full_column_seconds" in row else ""
+        print(f"{row['attack']:>26} {row['candidates']:>10.3g} candidates: {row['seconds']:.3g} s{extra}")
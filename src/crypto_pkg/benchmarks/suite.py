@@ -0,0 +1,169 @@
+import json
+import platform
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from Crypto.Cipher import AES
+
+from crypto_pkg.attacks.block_ciphers.modified_aes import ModifiedAES, column_encrypt, column_encrypt_batch
+from crypto_pkg.benchmarks.utils import throughput
+from crypto_pkg.ciphers.symmetric.aes import CustomAES, array_to_matrix, expand_key_words, get_array_from_state
+from crypto_pkg.ciphers.symmetric.aes_bitsliced import BitslicedAES
+from crypto_pkg.ciphers.symmetric.aes_variants import STANDARD_AES, KeySchedule, VariantAES, key_words_array
+
+# Relative slow-down over the baseline above which a case is flagged as a regression
+TOLERANCE = 0.15
+
+
+class Case(NamedTuple):
+    """
+    One benchmark measurement
+        name: unique identifier, "<engine>/<shape>"
+        engine: implementation measured
+        shape: single (one block per call), batch (many blocks, one key), key_search (one block, many keys) or
+            key_schedule (key expansions)
+        unit: what the rate counts
+        func: function without arguments processing `items` items per call
+        items: number of items processed by one call
+    """
+    name: str
+    engine: str
+    shape: str
+    unit: str
+    func: Callable
+    items: int
+
+
+def _reference_encrypt(aes: CustomAES, plain_text, round_keys):
+    # Pre-optimization CustomAES.encrypt: list-matrix rounds
+    pn = get_array_from_state(aes.aes_add_round_key(array_to_matrix(plain_text), round_keys[0]))
+    for i in range(1, 10):
+        pn = aes.aes_round_trans(plain_text=pn, round_key=round_keys[i])
+    return aes.aes_round_trans(plain_text=pn, round_key=round_keys[-1], last=True)
+
+
+def cases(batch_size: int = 4096, n_keys: int = 4096) -> List[Case]:
+    """
+    Benchmark cases of every engine and shape
+
+    Args:
+        batch_size: blocks per call of the batch cases
+        n_keys: keys per call of the key search and key schedule cases
+    Returns:
+        list of cases
+    """
+    rng = np.random.default_rng(0)
+    key = rng.integers(0, 256, size=16, dtype=np.uint8).tobytes()
+    block = rng.integers(0, 256, size=16, dtype=np.uint8).tobytes()
+    blocks = rng.integers(0, 256, size=(batch_size, 16), dtype=np.uint8)
+    keys = rng.integers(0, 256, size=(n_keys, 16), dtype=np.uint8)
+    key_list, block_list = list(key), list(block)
+    raw_keys = [k.tobytes() for k in keys]
+    key_columns = keys[:, :4].copy().view('>u4').astype(np.uint32).reshape(-1)
+    column_list = key_columns.tolist()
+
+    custom, modified, standard = CustomAES(), ModifiedAES(), VariantAES(STANDARD_AES)
+    # CustomAES has no many-keys path of its own, its compiled variant does
+    compiled = VariantAES()
+    reference_keys = custom.generate_keys(base_key=key_list)
+    ecb = AES.new(key, AES.MODE_ECB)
+    raw_blocks = blocks.tobytes()
+    bitsliced = BitslicedAES(width=1024)
+
+    def case(engine, shape, func, items, unit="blocks"):
+        return Case(f"{engine}/{shape}", engine, shape, unit, func, items)
+
+    return [
+        case("custom-reference", "single", lambda: _reference_encrypt(custom, block_list, reference_keys), 1),
+        case("custom", "single", lambda: custom.encrypt(plain_text=block_list, key=key_list), 1),
+        case("custom", "batch", lambda: custom.encrypt_blocks(blocks, key), batch_size),
+        case("custom", "key_search", lambda: compiled.encrypt_under_keys(block, keys), n_keys, "keys"),
+        case("custom", "key_schedule", lambda: [expand_key_words(k) for k in raw_keys], n_keys, "keys"),
+        case("custom-vectorized", "key_schedule", lambda: key_words_array(keys, KeySchedule.CUSTOM), n_keys, "keys"),
+        case("bitsliced", "batch", lambda: bitsliced.encrypt_blocks(blocks, key), batch_size),
+        case("modified", "single", lambda: modified.encrypt(plain_text=block_list, key=key_list), 1),
+        case("modified", "batch", lambda: modified.encrypt_blocks(blocks, key), batch_size),
+        case("modified", "key_search", lambda: modified.encrypt_under_keys(block, keys), n_keys, "keys"),
+        case("modified-column", "key_search", lambda: [column_encrypt(0x01234567, k) for k in column_list], n_keys,
+             "keys"),
+        case("modified-column-batch", "key_search", lambda: column_encrypt_batch(0x01234567, key_columns), n_keys,
+             "keys"),
+        case("standard", "single", lambda: standard.encrypt(plain_text=block_list, key=key_list), 1),
+        case("standard", "batch", lambda: standard.encrypt_blocks(blocks, key), batch_size),
+        case("standard", "key_search", lambda: standard.encrypt_under_keys(block, keys), n_keys, "keys"),
+        case("standard-vectorized", "key_schedule", lambda: key_words_array(keys, KeySchedule.FIPS197), n_keys,
+             "keys"),
+        case("pycryptodome", "single", lambda: ecb.encrypt(block), 1),
+        case("pycryptodome", "batch", lambda: ecb.encrypt(raw_blocks), batch_size),
+        case("pycryptodome", "key_search", lambda: [AES.new(k, AES.MODE_ECB).encrypt(block) for k in raw_keys],
+             n_keys, "keys"),
+        case("pycryptodome", "key_schedule", lambda: [AES.new(k, AES.MODE_ECB) for k in raw_keys], n_keys, "keys"),
+    ]
+
+
+def run_suite(min_time: float = 0.5, match: Optional[str] = None, batch_size: int = 4096,
+              n_keys: int = 4096) -> Dict:
+    """
+    Run the benchmark cases
+
+    Args:
+        min_time: minimum duration of each measurement in seconds
+        match: only run the cases whose name contains this string
+        batch_size: blocks per call of the batch cases
+        n_keys: keys per call of the key search and key schedule cases
+    Returns:
+        JSON-serializable report with the environment and one result per case
+    """
+    results = []
+    for c in cases(batch_size=batch_size, n_keys=n_keys):
+        if match and match not in c.name:
+            continue
+        rate = throughput(c.func, c.items, min_time)
+        results.append({"name": c.name, "engine": c.engine, "shape": c.shape, "unit": f"{c.unit}/s", "rate": rate})
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "results": results,
+    }
+
+
+def save_report(report: Dict, path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = TOLERANCE) -> List[Dict]:
+    """
+    Compare a report with a baseline report
+
+    Args:
+        report: current report
+        baseline: reference report
+        tolerance: relative slow-down tolerated before flagging a regression
+    Returns:
+        one row per case present in both reports with both rates, their ratio and the regression flag
+    """
+    reference = {r["name"]: r["rate"] for r in baseline["results"]}
+    rows = []
+    for r in report["results"]:
+        if r["name"] not in reference:
+            continue
+        ratio = r["rate"] / reference[r["name"]]
+        rows.append({"name": r["name"], "baseline": reference[r["name"]], "rate": r["rate"], "ratio": ratio,
+                     "regression": ratio < 1 - tolerance})
+    return rows
+
+
+if __name__ == '__main__':
+    ''' Example '''
+    for result in run_suite(min_time=0.2)["results"]:
+        print(f"{result['name']:>32}: {result['rate']:>14.0f} {result['unit']}")
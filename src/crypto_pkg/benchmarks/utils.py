@@ -0,0 +1,24 @@
+import time
+from typing import Callable
+
+
+def throughput(func: Callable, items: int, min_time: float = 0.2) -> float:
+    """
+    Measure how many items per second a function processes
+
+    Args:
+        func: function without arguments processing `items` items per call
+        items: number of items processed by one call
+        min_time: the function is called repeatedly until at least min_time seconds have elapsed
+    Returns:
+        items per second
+    """
+    func()
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.
+    while elapsed < min_time:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls * items / elapsed
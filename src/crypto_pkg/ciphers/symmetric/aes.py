@@ -1,4 +1,10 @@
 import copy
+import struct
+from functools import lru_cache
+
+import numpy as np
+
+from crypto_pkg.number_theory import gf256
 
 gf256_log_table = [
     0x00, 0x00, 0x19, 0x01, 0x32, 0x02, 0x1a, 0xc6, 0x4b, 0xc7, 0x1b, 0x68, 0x33, 0xee, 0xdf, 0x03,
@@ -129,8 +135,345 @@ def array_to_matrix(byte_array) -> []:
     return matrix
 
 
+def _rotate_word(word, n):
+    return ((word >> n) | (word << (32 - n))) & 0xffffffff
+
+
+def build_t_tables(box, column):
+    """
+    Build the four 32-bit lookup tables combining a byte substitution with one column of a MixColumns matrix.
+
+    Args:
+        box: byte substitution table (sbox_table or reversed_box)
+        column: first column of the MixColumns matrix, e.g. [2, 1, 1, 3]
+    Returns:
+        Tables T0..T3 where T_i is T0 rotated right by 8 * i bits
+    """
+    products = [gf256.MUL_TABLE[c][box].astype(np.uint32) for c in column]
+    t0 = ((products[0] << 24) | (products[1] << 16) | (products[2] << 8) | products[3]).tolist()
+    return [t0] + [[_rotate_word(w, 8 * i) for w in t0] for i in range(1, 4)]
+
+
+Te0, Te1, Te2, Te3 = build_t_tables(sbox_table, [0x02, 0x01, 0x01, 0x03])
+Td0, Td1, Td2, Td3 = build_t_tables(reversed_box, [0x0e, 0x09, 0x0d, 0x0b])
+
+_block_words = struct.Struct(">4I")
+
+
+def expand_key_words(base_key) -> list:
+    """
+    Key schedule of CustomAES as a flat list of 32-bit words, four words per round key.
+    Mirrors CustomAES.generate_keys byte for byte: g() takes the reversed last column and the following columns are
+    read with get_column, i.e. from byte offsets 1, 2 and 3 of the previous round key.
+
+    Args:
+        base_key: 16-byte key as a list of integers or bytes
+    Returns:
+        list of 44 big-endian words, word 4 * r + c being column c of round key r
+    """
+    s = sbox_table
+    w0, w1, w2, w3 = _block_words.unpack(bytes(base_key))
+    out = [w0, w1, w2, w3]
+    for rc in r_con:
+        g = (s[w3 & 0xff] << 24) | (s[(w3 >> 8) & 0xff] << 16) | (s[(w3 >> 16) & 0xff] << 8) | s[w3 >> 24]
+        c0 = w0 ^ (rc[0] << 24) ^ g
+        c1 = (((w0 << 8) | (w1 >> 24)) & 0xffffffff) ^ c0
+        c2 = (((w0 << 16) | (w1 >> 16)) & 0xffffffff) ^ c1
+        c3 = (((w0 << 24) | (w1 >> 8)) & 0xffffffff) ^ c2
+        w0, w1, w2, w3 = c0, c1, c2, c3
+        out += [w0, w1, w2, w3]
+    return out
+
+
+def inverse_key_words(round_key_words) -> list:
+    """
+    Round keys for the table-driven decryption: reversed round order, with InvMixColumns applied to all but the
+    first and the last round key.
+
+    Args:
+        round_key_words: encryption round keys as returned by expand_key_words
+    Returns:
+        list of words in decryption order
+    """
+    rounds = len(round_key_words) // 4 - 1
+    out = list(round_key_words[4 * rounds:])
+    for r in range(rounds - 1, 0, -1):
+        for w in round_key_words[4 * r:4 * r + 4]:
+            out.append(Td0[sbox_table[w >> 24]] ^ Td1[sbox_table[(w >> 16) & 0xff]] ^
+                       Td2[sbox_table[(w >> 8) & 0xff]] ^ Td3[sbox_table[w & 0xff]])
+    out += round_key_words[:4]
+    return out
+
+
+def ttable_encrypt(block, round_key_words) -> bytes:
+    """
+    Encrypt one 16-byte block with the 32-bit T-table engine. The number of rounds follows from the number of round
+    keys.
+
+    Args:
+        block: 16 bytes (bytes or list of integers), column by column as in CustomAES
+        round_key_words: round keys as returned by expand_key_words
+    Returns:
+        encrypted block as bytes
+    """
+    rk = round_key_words
+    s0, s1, s2, s3 = _block_words.unpack(bytes(block))
+    s0 ^= rk[0]
+    s1 ^= rk[1]
+    s2 ^= rk[2]
+    s3 ^= rk[3]
+    for i in range(4, len(rk) - 4, 4):
+        t0 = Te0[s0 >> 24] ^ Te1[(s1 >> 16) & 0xff] ^ Te2[(s2 >> 8) & 0xff] ^ Te3[s3 & 0xff] ^ rk[i]
+        t1 = Te0[s1 >> 24] ^ Te1[(s2 >> 16) & 0xff] ^ Te2[(s3 >> 8) & 0xff] ^ Te3[s0 & 0xff] ^ rk[i + 1]
+        t2 = Te0[s2 >> 24] ^ Te1[(s3 >> 16) & 0xff] ^ Te2[(s0 >> 8) & 0xff] ^ Te3[s1 & 0xff] ^ rk[i + 2]
+        t3 = Te0[s3 >> 24] ^ Te1[(s0 >> 16) & 0xff] ^ Te2[(s1 >> 8) & 0xff] ^ Te3[s2 & 0xff] ^ rk[i + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+    s = sbox_table
+    return _block_words.pack(
+        ((s[s0 >> 24] << 24) | (s[(s1 >> 16) & 0xff] << 16) | (s[(s2 >> 8) & 0xff] << 8) | s[s3 & 0xff]) ^ rk[-4],
+        ((s[s1 >> 24] << 24) | (s[(s2 >> 16) & 0xff] << 16) | (s[(s3 >> 8) & 0xff] << 8) | s[s0 & 0xff]) ^ rk[-3],
+        ((s[s2 >> 24] << 24) | (s[(s3 >> 16) & 0xff] << 16) | (s[(s0 >> 8) & 0xff] << 8) | s[s1 & 0xff]) ^ rk[-2],
+        ((s[s3 >> 24] << 24) | (s[(s0 >> 16) & 0xff] << 16) | (s[(s1 >> 8) & 0xff] << 8) | s[s2 & 0xff]) ^ rk[-1])
+
+
+def ttable_decrypt(block, inverse_round_key_words) -> bytes:
+    """
+    Decrypt one 16-byte block with the 32-bit T-table engine (equivalent inverse cipher).
+
+    Args:
+        block: 16 bytes (bytes or list of integers), column by column as in CustomAES
+        inverse_round_key_words: round keys as returned by inverse_key_words
+    Returns:
+        decrypted block as bytes
+    """
+    dk = inverse_round_key_words
+    s0, s1, s2, s3 = _block_words.unpack(bytes(block))
+    s0 ^= dk[0]
+    s1 ^= dk[1]
+    s2 ^= dk[2]
+    s3 ^= dk[3]
+    for i in range(4, len(dk) - 4, 4):
+        t0 = Td0[s0 >> 24] ^ Td1[(s3 >> 16) & 0xff] ^ Td2[(s2 >> 8) & 0xff] ^ Td3[s1 & 0xff] ^ dk[i]
+        t1 = Td0[s1 >> 24] ^ Td1[(s0 >> 16) & 0xff] ^ Td2[(s3 >> 8) & 0xff] ^ Td3[s2 & 0xff] ^ dk[i + 1]
+        t2 = Td0[s2 >> 24] ^ Td1[(s1 >> 16) & 0xff] ^ Td2[(s0 >> 8) & 0xff] ^ Td3[s3 & 0xff] ^ dk[i + 2]
+        t3 = Td0[s3 >> 24] ^ Td1[(s2 >> 16) & 0xff] ^ Td2[(s1 >> 8) & 0xff] ^ Td3[s0 & 0xff] ^ dk[i + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+    s = reversed_box
+    return _block_words.pack(
+        ((s[s0 >> 24] << 24) | (s[(s3 >> 16) & 0xff] << 16) | (s[(s2 >> 8) & 0xff] << 8) | s[s1 & 0xff]) ^ dk[-4],
+        ((s[s1 >> 24] << 24) | (s[(s0 >> 16) & 0xff] << 16) | (s[(s3 >> 8) & 0xff] << 8) | s[s2 & 0xff]) ^ dk[-3],
+        ((s[s2 >> 24] << 24) | (s[(s1 >> 16) & 0xff] << 16) | (s[(s0 >> 8) & 0xff] << 8) | s[s3 & 0xff]) ^ dk[-2],
+        ((s[s3 >> 24] << 24) | (s[(s2 >> 16) & 0xff] << 16) | (s[(s1 >> 8) & 0xff] << 8) | s[s0 & 0xff]) ^ dk[-1])
+
+
+_SBOX = np.array(sbox_table, dtype=np.uint8)
+_INV_SBOX = np.array(reversed_box, dtype=np.uint8)
+_XTIME = gf256.MUL_TABLE[0x02]
+_XTIME_4 = gf256.MUL_TABLE[0x04]
+# Byte i = 4 * column + row of a block, as in array_to_matrix
+_SHIFT_ROWS = np.array([4 * ((c + r) % 4) + r for c in range(4) for r in range(4)])
+_INV_SHIFT_ROWS = np.argsort(_SHIFT_ROWS)
+
+
+def round_keys_array(round_key_words) -> np.ndarray:
+    """
+    Convert round keys from words to a (rounds + 1, 16) uint8 array for the batch engine.
+
+    Args:
+        round_key_words: round keys as returned by expand_key_words
+    Returns:
+        uint8 array whose row r is round key r
+    """
+    raw = struct.pack(">%dI" % len(round_key_words), *round_key_words)
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 16)
+
+
+def _as_blocks(blocks) -> np.ndarray:
+    out = np.asarray(blocks, dtype=np.uint8)
+    if out.ndim != 2 or out.shape[1] != 16:
+        raise ValueError(f"Expected an (N, 16) array of blocks, got shape {out.shape}")
+    return out
+
+
+def _mix_columns(state: np.ndarray) -> np.ndarray:
+    s = state.reshape(-1, 4, 4)
+    total = s[:, :, 0] ^ s[:, :, 1] ^ s[:, :, 2] ^ s[:, :, 3]
+    out = s ^ total[:, :, None] ^ _XTIME[s ^ s[:, :, [1, 2, 3, 0]]]
+    return out.reshape(-1, 16)
+
+
+def _inv_mix_columns(state: np.ndarray) -> np.ndarray:
+    s = state.reshape(-1, 4, 4).copy()
+    u = _XTIME_4[s[:, :, 0] ^ s[:, :, 2]]
+    v = _XTIME_4[s[:, :, 1] ^ s[:, :, 3]]
+    s[:, :, 0] ^= u
+    s[:, :, 2] ^= u
+    s[:, :, 1] ^= v
+    s[:, :, 3] ^= v
+    return _mix_columns(s)
+
+
+def batch_encrypt(blocks, round_keys: np.ndarray) -> np.ndarray:
+    """
+    Encrypt N blocks at once. Every round operation is applied to the whole (N, 16) state with NumPy indexing and
+    XORs.
+
+    Args:
+        blocks: (N, 16) uint8 array, one block per row
+        round_keys: (rounds + 1, 16) uint8 array as returned by round_keys_array
+    Returns:
+        (N, 16) uint8 array of cipher texts
+    """
+    state = _as_blocks(blocks) ^ round_keys[0]
+    for rk in round_keys[1:-1]:
+        state = _mix_columns(_SBOX[state[:, _SHIFT_ROWS]]) ^ rk
+    return _SBOX[state[:, _SHIFT_ROWS]] ^ round_keys[-1]
+
+
+def batch_decrypt(blocks, round_keys: np.ndarray) -> np.ndarray:
+    """
+    Decrypt N blocks at once, inverse of batch_encrypt.
+
+    Args:
+        blocks: (N, 16) uint8 array, one block per row
+        round_keys: (rounds + 1, 16) uint8 array as returned by round_keys_array
+    Returns:
+        (N, 16) uint8 array of plain texts
+    """
+    state = _INV_SBOX[(_as_blocks(blocks) ^ round_keys[-1])[:, _INV_SHIFT_ROWS]]
+    for rk in round_keys[-2:0:-1]:
+        state = _INV_SBOX[_inv_mix_columns(state ^ rk)[:, _INV_SHIFT_ROWS]]
+    return state ^ round_keys[0]
+
+
+# Maximum number of expanded keys kept by expand_key
+KEY_CACHE_SIZE = 256
+# Key schedule identifier of the ExpandedKey of CustomAES
+CUSTOM_SCHEDULE = "custom-10"
+
+
+class ExpandedKey:
+    """
+    CustomAES key schedule computed once and reusable across encrypt/decrypt calls.
+        key: the 16-byte cipher key
+        round_keys: the 11 round keys concatenated (176 bytes)
+        words: round keys as 32-bit words for the T-table engine
+        inverse_words: decryption round keys for the T-table engine, computed on first use
+        schedule: identifier of the key schedule the round keys come from
+    """
+    __slots__ = ('key', 'round_keys', 'words', '_inverse_words', 'schedule')
+
+    def __init__(self, key, words=None, inverse_words=None, schedule: str = CUSTOM_SCHEDULE):
+        """
+        Args:
+            key: 16-byte key as a list of integers or bytes
+            words: round key words of another key schedule (see aes_variants) - default: CustomAES key schedule
+            inverse_words: decryption round key words matching words - default: derived with inverse_key_words
+            schedule: identifier of the key schedule of words
+        """
+        self.key = bytes(key)
+        self.schedule = schedule
+        self.words = tuple(expand_key_words(self.key) if words is None else words)
+        self.round_keys = struct.pack(">%dI" % len(self.words), *self.words)
+        self._inverse_words = None if inverse_words is None else tuple(inverse_words)
+
+    @property
+    def inverse_words(self) -> tuple:
+        if self._inverse_words is None:
+            self._inverse_words = tuple(inverse_key_words(self.words))
+        return self._inverse_words
+
+    @property
+    def array(self) -> np.ndarray:
+        """ Round keys as a read-only (11, 16) uint8 array for the batch engine """
+        return np.frombuffer(self.round_keys, dtype=np.uint8).reshape(-1, 16)
+
+    def __eq__(self, other):
+        return isinstance(other, ExpandedKey) and (self.key, self.schedule) == (other.key, other.schedule)
+
+    def __hash__(self):
+        return hash((self.key, self.schedule))
+
+    def __repr__(self):
+        return f"ExpandedKey({self.key.hex()}, schedule={self.schedule})"
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def _cached_key(key: bytes) -> ExpandedKey:
+    return ExpandedKey(key)
+
+
+def expand_key(key) -> ExpandedKey:
+    """
+    Expanded key for a cipher key, served from a bounded LRU cache keyed by the key bytes.
+
+    Args:
+        key: ExpandedKey (returned as is), or 16-byte key as a list of integers or bytes
+    Returns:
+        ExpandedKey
+    """
+    if isinstance(key, ExpandedKey):
+        return key
+    return _cached_key(bytes(key))
+
+
+def key_cache_info():
+    """ Hits, misses, maximum and current size of the expand_key cache (functools CacheInfo) """
+    return _cached_key.cache_info()
+
+
+def clear_key_cache() -> None:
+    _cached_key.cache_clear()
+
+
 class CustomAES:
 
+    def __init__(self, hooks=None):
+        """
+        Args:
+            hooks: objects notified of the intermediate states of encrypt and encrypt_blocks, see
+                crypto_pkg.ciphers.symmetric.aes_hooks.AESHook. Without hooks the table engines run untouched.
+        """
+        self.hooks = list(hooks) if hooks else []
+
+    def register_hook(self, hook) -> None:
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        self.hooks.remove(hook)
+
+    def _emit(self, callback: str, *args) -> None:
+        for hook in self.hooks:
+            getattr(hook, callback)(*args)
+
+    def _traced_encrypt(self, blocks: np.ndarray, expanded_key: ExpandedKey, sub_bytes: bool = True,
+                        shift_rows: bool = True, mix_columns: bool = True,
+                        final_mix_columns: bool = False) -> np.ndarray:
+        """
+        Batch encryption one operation at a time, notifying the hooks after each of them. The flags describe the
+        round structure (see aes_variants.AESVariant), operations that do not run are not notified.
+        """
+        round_keys = expanded_key.array
+        rounds = len(round_keys) - 1
+        self._emit('start', blocks, expanded_key)
+        state = blocks ^ round_keys[0]
+        self._emit('after_add_round_key', 0, state)
+        for i in range(1, rounds + 1):
+            self._emit('round_start', i, state)
+            if sub_bytes:
+                state = _SBOX[state]
+                self._emit('after_sub_bytes', i, state)
+            if shift_rows:
+                state = state[:, _SHIFT_ROWS]
+                self._emit('after_shift_rows', i, state)
+            if mix_columns and (i != rounds or final_mix_columns):
+                state = _mix_columns(state)
+                self._emit('after_mix_columns', i, state)
+            state = state ^ round_keys[i]
+            self._emit('after_add_round_key', i, state)
+        self._emit('end', state)
+        return state
+
     def aes_add_round_key(self, byte_matrix, key_matrix):
         r = []
         for i in range(len(byte_matrix)):
@@ -166,23 +509,10 @@ class CustomAES:
         return key_schedule
 
     def encrypt(self, plain_text, key):
-        ks = self.generate_keys(base_key=key)
-        state = array_to_matrix(plain_text)
-        s_k = self.aes_add_round_key(state, ks[0])
-        print("plaintext : ")
-        print_byte_array(plain_text)
-        print("stateMatrix  : ")
-        print_byte_matrix(state)
-        print("roundkey  : ")
-        print_byte_matrix(ks[0])
-        print("\n")
-
-        pn = get_array_from_state(s_k)
-        for i in range(1, 10):
-            tmp = self.aes_round_trans(plain_text=pn, round_key=ks[i])
-            pn = tmp
-        pn = self.aes_round_trans(plain_text=pn, round_key=ks[-1], last=True)
-        return pn
+        expanded_key = expand_key(key)
+        if self.hooks:
+            return self._traced_encrypt(_as_blocks([list(plain_text)]), expanded_key)[0].tolist()
+        return list(ttable_encrypt(plain_text, expanded_key.words))
 
     def aes_sub_bytes(self, byte_matrix, inverse=False):
         box = sbox_table
@@ -219,14 +549,7 @@ class CustomAES:
         if inverse:
             mix_col = [[0x0e, 0x0b, 0x0d, 0x09], [0x09, 0x0e, 0x0b, 0x0d], [0x0d, 0x09, 0x0e, 0x0b],
                        [0x0b, 0x0d, 0x09, 0x0e]]
-        new = copy.deepcopy(byte_matrix)
-        for i in range(len(byte_matrix)):
-            for j in range(len(byte_matrix[i])):
-                sum = 0
-                for k in range(4):
-                    sum ^= gf256_mul(mix_col[i][k], byte_matrix[k][j])
-                new[i][j] = sum % 256
-        return new
+        return gf256.mat_mul(mix_col, byte_matrix).tolist()
 
     def aes_round_trans(self, plain_text, round_key=None, last=False):
         state_matrix = array_to_matrix(plain_text)
@@ -253,14 +576,30 @@ class CustomAES:
         return get_array_from_state(s_inv)
 
     def decrypt(self, cipher_text, key):
-        ks = self.generate_keys(base_key=key)[::-1]
-        ci = cipher_text
-        for i in range(10):
-            if i == 0:
-                tmp = self.aes_inv_round_trans(plain_text=ci, round_key=ks[i], first=True)
-            else:
-                tmp = self.aes_inv_round_trans(plain_text=ci, round_key=ks[i])
-            ci = tmp
-        state_matrix = array_to_matrix(ci)
-        out = self.aes_add_round_key(state_matrix, ks[10])
-        return get_array_from_state(out)
+        return list(ttable_decrypt(cipher_text, expand_key(key).inverse_words))
+
+    def encrypt_blocks(self, blocks, key) -> np.ndarray:
+        """
+        Encrypt many blocks under one key
+
+        Args:
+            blocks: (N, 16) uint8 array of plain texts
+            key: 16-byte key as a list of integers or bytes, or an ExpandedKey
+        Returns:
+            (N, 16) uint8 array of cipher texts
+        """
+        if self.hooks:
+            return self._traced_encrypt(_as_blocks(blocks), expand_key(key))
+        return batch_encrypt(blocks, expand_key(key).array)
+
+    def decrypt_blocks(self, blocks, key) -> np.ndarray:
+        """
+        Decrypt many blocks under one key
+
+        Args:
+            blocks: (N, 16) uint8 array of cipher texts
+            key: 16-byte key as a list of integers or bytes, or an ExpandedKey
+        Returns:
+            (N, 16) uint8 array of plain texts
+        """
+        return batch_decrypt(blocks, expand_key(key).array)
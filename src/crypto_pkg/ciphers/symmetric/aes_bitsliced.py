@@ -0,0 +1,332 @@
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import CustomAES, expand_key
+
+# Bit-plane layout: plane 8 * i + j holds bit j (j = 0 is the most significant bit) of byte i of every block, a
+# block being indexed as in array_to_matrix. A plane is either a Python integer whose bit w belongs to block w, or
+# a NumPy uint64 array whose bit w % 64 of word w // 64 belongs to block w.
+
+_SHIFT_ROWS = [4 * ((c + r) % 4) + r for c in range(4) for r in range(4)]
+_INV_SHIFT_ROWS = [_SHIFT_ROWS.index(i) for i in range(16)]
+
+
+def sbox_circuit(U0, U1, U2, U3, U4, U5, U6, U7, ones):
+    """
+    AES S-box as the 113-gate boolean circuit of Boyar and Peralta (32 AND, 77 XOR, 4 XNOR), evaluated on
+    bit-planes. U0 and S0 are the most significant bits; ones is the all-ones plane used for the XNOR gates.
+    """
+    T1 = U0 ^ U3
+    T2 = U0 ^ U5
+    T3 = U0 ^ U6
+    T4 = U3 ^ U5
+    T5 = U4 ^ U6
+    T6 = T1 ^ T5
+    T7 = U1 ^ U2
+    T8 = U7 ^ T6
+    T9 = U7 ^ T7
+    T10 = T6 ^ T7
+    T11 = U1 ^ U5
+    T12 = U2 ^ U5
+    T13 = T3 ^ T4
+    T14 = T6 ^ T11
+    T15 = T5 ^ T11
+    T16 = T5 ^ T12
+    T17 = T9 ^ T16
+    T18 = U3 ^ U7
+    T19 = T7 ^ T18
+    T20 = T1 ^ T19
+    T21 = U6 ^ U7
+    T22 = T7 ^ T21
+    T23 = T2 ^ T22
+    T24 = T2 ^ T10
+    T25 = T20 ^ T17
+    T26 = T3 ^ T16
+    T27 = T1 ^ T12
+    M1 = T13 & T6
+    M2 = T23 & T8
+    M3 = T14 ^ M1
+    M4 = T19 & U7
+    M5 = M4 ^ M1
+    M6 = T3 & T16
+    M7 = T22 & T9
+    M8 = T26 ^ M6
+    M9 = T20 & T17
+    M10 = M9 ^ M6
+    M11 = T1 & T15
+    M12 = T4 & T27
+    M13 = M12 ^ M11
+    M14 = T2 & T10
+    M15 = M14 ^ M11
+    M16 = M3 ^ M2
+    M17 = M5 ^ T24
+    M18 = M8 ^ M7
+    M19 = M10 ^ M15
+    M20 = M16 ^ M13
+    M21 = M17 ^ M15
+    M22 = M18 ^ M13
+    M23 = M19 ^ T25
+    M24 = M22 ^ M23
+    M25 = M22 & M20
+    M26 = M21 ^ M25
+    M27 = M20 ^ M21
+    M28 = M23 ^ M25
+    M29 = M28 & M27
+    M30 = M26 & M24
+    M31 = M20 & M23
+    M32 = M27 & M31
+    M33 = M27 ^ M25
+    M34 = M21 & M22
+    M35 = M24 & M34
+    M36 = M24 ^ M25
+    M37 = M21 ^ M29
+    M38 = M32 ^ M33
+    M39 = M23 ^ M30
+    M40 = M35 ^ M36
+    M41 = M38 ^ M40
+    M42 = M37 ^ M39
+    M43 = M37 ^ M38
+    M44 = M39 ^ M40
+    M45 = M42 ^ M41
+    M46 = M44 & T6
+    M47 = M40 & T8
+    M48 = M39 & U7
+    M49 = M43 & T16
+    M50 = M38 & T9
+    M51 = M37 & T17
+    M52 = M42 & T15
+    M53 = M45 & T27
+    M54 = M41 & T10
+    M55 = M44 & T13
+    M56 = M40 & T23
+    M57 = M39 & T19
+    M58 = M43 & T3
+    M59 = M38 & T22
+    M60 = M37 & T20
+    M61 = M42 & T1
+    M62 = M45 & T4
+    M63 = M41 & T2
+    L0 = M61 ^ M62
+    L1 = M50 ^ M56
+    L2 = M46 ^ M48
+    L3 = M47 ^ M55
+    L4 = M54 ^ M58
+    L5 = M49 ^ M61
+    L6 = M62 ^ L5
+    L7 = M46 ^ L3
+    L8 = M51 ^ M59
+    L9 = M52 ^ M53
+    L10 = M53 ^ L4
+    L11 = M60 ^ L2
+    L12 = M48 ^ M51
+    L13 = M50 ^ L0
+    L14 = M52 ^ M61
+    L15 = M55 ^ L1
+    L16 = M56 ^ L0
+    L17 = M57 ^ L1
+    L18 = M58 ^ L8
+    L19 = M63 ^ L4
+    L20 = L0 ^ L1
+    L21 = L1 ^ L7
+    L22 = L3 ^ L12
+    L23 = L18 ^ L2
+    L24 = L15 ^ L9
+    L25 = L6 ^ L10
+    L26 = L7 ^ L9
+    L27 = L8 ^ L10
+    L28 = L11 ^ L14
+    L29 = L11 ^ L17
+    S0 = L6 ^ L24
+    S1 = L16 ^ L26 ^ ones
+    S2 = L19 ^ L28 ^ ones
+    S3 = L6 ^ L21
+    S4 = L20 ^ L22
+    S5 = L25 ^ L29
+    S6 = L13 ^ L27 ^ ones
+    S7 = L6 ^ L23 ^ ones
+    return S0, S1, S2, S3, S4, S5, S6, S7
+
+
+def _inv_affine(b, ones):
+    # s = rotl(b, 1) ^ rotl(b, 3) ^ rotl(b, 6) ^ 0x05 with bit k stored at index 7 - k
+    out = [b[(k + 1) % 8] ^ b[(k + 3) % 8] ^ b[(k + 6) % 8] for k in range(8)]
+    out[5] ^= ones
+    out[7] ^= ones
+    return out
+
+
+def inv_sbox_circuit(b, ones):
+    """ Inverse S-box on 8 bit-planes, as InvAffine(S(InvAffine(b))) since S^-1 = (A^-1 o S o A^-1) """
+    return _inv_affine(sbox_circuit(*_inv_affine(b, ones), ones=ones), ones)
+
+
+def _xtime(a):
+    return [a[1], a[2], a[3], a[4] ^ a[0], a[5] ^ a[0], a[6], a[7] ^ a[0], a[0]]
+
+
+def _xor(a, b):
+    return [x ^ y for x, y in zip(a, b)]
+
+
+def _mix_columns(planes):
+    out = []
+    for c in range(4):
+        a = [planes[32 * c + 8 * r:32 * c + 8 * r + 8] for r in range(4)]
+        total = _xor(_xor(a[0], a[1]), _xor(a[2], a[3]))
+        for r in range(4):
+            out += _xor(_xor(a[r], total), _xtime(_xor(a[r], a[(r + 1) % 4])))
+    return out
+
+
+def _inv_mix_columns(planes):
+    out = []
+    for c in range(4):
+        a = [planes[32 * c + 8 * r:32 * c + 8 * r + 8] for r in range(4)]
+        u = _xtime(_xtime(_xor(a[0], a[2])))
+        v = _xtime(_xtime(_xor(a[1], a[3])))
+        out += _xor(a[0], u) + _xor(a[1], v) + _xor(a[2], u) + _xor(a[3], v)
+    return _mix_columns(out)
+
+
+def _sub_bytes(planes, ones, inverse=False):
+    out = []
+    for i in range(0, 128, 8):
+        out += inv_sbox_circuit(planes[i:i + 8], ones) if inverse else sbox_circuit(*planes[i:i + 8], ones=ones)
+    return out
+
+
+def _shift_rows(planes, permutation):
+    return [planes[8 * permutation[i] + j] for i in range(16) for j in range(8)]
+
+
+def _add_round_key(planes, key_bits, ones):
+    out = list(planes)
+    for k in key_bits:
+        out[k] = out[k] ^ ones
+    return out
+
+
+def round_key_bits(round_keys: bytes) -> list:
+    """ For every round key, the planes to complement in AddRoundKey (the positions of its 1 bits) """
+    bits = np.unpackbits(np.frombuffer(round_keys, dtype=np.uint8)).reshape(-1, 128)
+    return [np.flatnonzero(row).tolist() for row in bits]
+
+
+def bitsliced_encrypt(planes: list, key_bits: list, ones) -> list:
+    """
+    Encrypt all blocks held in 128 bit-planes.
+
+    Args:
+        planes: 128 bit-planes
+        key_bits: round keys as returned by round_key_bits
+        ones: all-ones plane of the same type and width as the planes
+    Returns:
+        128 bit-planes of the cipher texts
+    """
+    planes = _add_round_key(planes, key_bits[0], ones)
+    for bits in key_bits[1:-1]:
+        planes = _add_round_key(_mix_columns(_shift_rows(_sub_bytes(planes, ones), _SHIFT_ROWS)), bits, ones)
+    return _add_round_key(_shift_rows(_sub_bytes(planes, ones), _SHIFT_ROWS), key_bits[-1], ones)
+
+
+def bitsliced_decrypt(planes: list, key_bits: list, ones) -> list:
+    """
+    Decrypt all blocks held in 128 bit-planes, inverse of bitsliced_encrypt.
+    """
+    planes = _sub_bytes(_shift_rows(_add_round_key(planes, key_bits[-1], ones), _INV_SHIFT_ROWS), ones, True)
+    for bits in key_bits[-2:0:-1]:
+        planes = _inv_mix_columns(_add_round_key(planes, bits, ones))
+        planes = _sub_bytes(_shift_rows(planes, _INV_SHIFT_ROWS), ones, True)
+    return _add_round_key(planes, key_bits[0], ones)
+
+
+def to_planes(blocks: np.ndarray, lanes: str = 'int') -> list:
+    """
+    Transpose blocks into bit-planes
+
+    Args:
+        blocks: (W, 16) uint8 array; W must be a multiple of 64 for 'uint64' lanes
+        lanes: 'int' for Python integer planes, 'uint64' for NumPy uint64 planes
+    Returns:
+        list of 128 planes
+    """
+    bits = np.packbits(np.unpackbits(blocks, axis=1).T, axis=1, bitorder='little')
+    if lanes == 'uint64':
+        return list(np.ascontiguousarray(bits).view('<u8'))
+    return [int.from_bytes(row.tobytes(), 'little') for row in bits]
+
+
+def from_planes(planes: list, n_blocks: int) -> np.ndarray:
+    """
+    Transpose bit-planes back into blocks, inverse of to_planes
+
+    Returns:
+        (n_blocks, 16) uint8 array
+    """
+    if isinstance(planes[0], np.ndarray):
+        raw = np.stack(planes).view(np.uint8)
+    else:
+        size = (n_blocks + 7) // 8
+        raw = np.frombuffer(b''.join(p.to_bytes(size, 'little') for p in planes), dtype=np.uint8).reshape(128, size)
+    bits = np.unpackbits(raw, axis=1, bitorder='little')[:, :n_blocks]
+    return np.packbits(bits.T, axis=1)
+
+
+class BitslicedAES(CustomAES):
+    """
+    Bitsliced CustomAES: blocks are processed `width` at a time, SubBytes being evaluated as a boolean circuit and
+    ShiftRows/MixColumns as wire permutations and XORs over the bit-planes.
+    The bit-planes hold no byte states to report, so with hooks registered encryption runs on the traced CustomAES
+    path instead.
+    """
+
+    def __init__(self, width: int = 1024, lanes: str = 'int', hooks=None):
+        """
+        Args:
+            width: number of blocks evaluated in parallel (a multiple of 64 for 'uint64' lanes)
+            lanes: 'int' to store planes as Python integers, 'uint64' as NumPy uint64 arrays
+            hooks: see CustomAES
+        """
+        super().__init__(hooks=hooks)
+        if lanes not in ('int', 'uint64'):
+            raise ValueError(f"Unknown lanes type {lanes}")
+        if width < 1 or lanes == 'uint64' and width % 64:
+            raise ValueError(f"Invalid width {width} for {lanes} lanes")
+        self.width = width
+        self.lanes = lanes
+
+    def _ones(self, width):
+        if self.lanes == 'uint64':
+            return np.full(width // 64, np.iinfo(np.uint64).max, dtype=np.uint64)
+        return (1 << width) - 1
+
+    def _process(self, blocks, key, decrypt: bool) -> np.ndarray:
+        blocks = np.asarray(blocks, dtype=np.uint8)
+        if blocks.ndim != 2 or blocks.shape[1] != 16:
+            raise ValueError(f"Expected an (N, 16) array of blocks, got shape {blocks.shape}")
+        key_bits = round_key_bits(expand_key(key).round_keys)
+        operation = bitsliced_decrypt if decrypt else bitsliced_encrypt
+        out = np.empty_like(blocks)
+        for start in range(0, len(blocks), self.width):
+            chunk = blocks[start:start + self.width]
+            width = self.width if self.lanes == 'uint64' else len(chunk)
+            padded = np.zeros((width, 16), dtype=np.uint8)
+            padded[:len(chunk)] = chunk
+            planes = operation(to_planes(padded, self.lanes), key_bits, self._ones(width))
+            out[start:start + len(chunk)] = from_planes(planes, width)[:len(chunk)]
+        return out
+
+    def encrypt(self, plain_text, key):
+        if self.hooks:
+            return super().encrypt(plain_text, key)
+        return self._process([list(plain_text)], key, decrypt=False)[0].tolist()
+
+    def decrypt(self, cipher_text, key):
+        return self._process([list(cipher_text)], key, decrypt=True)[0].tolist()
+
+    def encrypt_blocks(self, blocks, key) -> np.ndarray:
+        if self.hooks:
+            return super().encrypt_blocks(blocks, key)
+        return self._process(blocks, key, decrypt=False)
+
+    def decrypt_blocks(self, blocks, key) -> np.ndarray:
+        return self._process(blocks, key, decrypt=True)
@@ -0,0 +1,163 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import array_to_matrix, print_byte_array, print_byte_matrix
+from crypto_pkg.ciphers.symmetric.aes_variants import CUSTOM_AES, AESVariant
+
+OPERATIONS = ('sub_bytes', 'shift_rows', 'mix_columns', 'add_round_key')
+
+HAMMING_WEIGHT = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+
+class AESHook:
+    """
+    Base class of the CustomAES tracing hooks, override the callbacks of interest.
+    The states are (N, 16) uint8 arrays holding the N blocks being encrypted (N = 1 for CustomAES.encrypt), byte i
+    of a block being at index i as in array_to_matrix. They must not be modified.
+    Round 0 is the initial AddRoundKey, the last round has no MixColumns.
+    """
+
+    def start(self, plain_texts: np.ndarray, expanded_key) -> None:
+        pass
+
+    def round_start(self, round_index: int, state: np.ndarray) -> None:
+        pass
+
+    def after_sub_bytes(self, round_index: int, state: np.ndarray) -> None:
+        pass
+
+    def after_shift_rows(self, round_index: int, state: np.ndarray) -> None:
+        pass
+
+    def after_mix_columns(self, round_index: int, state: np.ndarray) -> None:
+        pass
+
+    def after_add_round_key(self, round_index: int, state: np.ndarray) -> None:
+        pass
+
+    def end(self, cipher_texts: np.ndarray) -> None:
+        pass
+
+
+class PrintHook(AESHook):
+    """ Prints the plain text, its state matrix and the first round key, as CustomAES.encrypt used to """
+
+    def start(self, plain_texts, expanded_key):
+        for plain_text in plain_texts:
+            print("plaintext : ")
+            print_byte_array(plain_text)
+            print("stateMatrix  : ")
+            print_byte_matrix(array_to_matrix(plain_text))
+            print("roundkey  : ")
+            print_byte_matrix(array_to_matrix(expanded_key.key))
+            print("\n")
+
+
+def schedule(variant: AESVariant = CUSTOM_AES):
+    """ (round, operation) pairs notified during an encryption with the given variant, in execution order """
+    events = [(0, 'add_round_key')]
+    for i in range(1, variant.rounds + 1):
+        runs = {'sub_bytes': variant.sub_bytes, 'shift_rows': variant.shift_rows, 'add_round_key': True,
+                'mix_columns': variant.mix_columns and (i != variant.rounds or variant.final_mix_columns)}
+        events += [(i, op) for op in OPERATIONS if runs[op]]
+    return events
+
+
+class _Recorder(AESHook, ABC):
+
+    def __init__(self, n_blocks: int, operations: Sequence[str], rounds: Optional[Sequence[int]],
+                 variant: AESVariant, width: int, dtype):
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown operations {unknown}")
+        self.events = [(i, op) for i, op in schedule(variant) if op in operations and (rounds is None or i in rounds)]
+        self._index = {event: i for i, event in enumerate(self.events)}
+        self.n_blocks = n_blocks
+        self.buffer = np.zeros((n_blocks, len(self.events), width), dtype=dtype)
+        self.count = 0
+
+    def _record(self, operation: str, round_index: int, state: np.ndarray) -> None:
+        i = self._index.get((round_index, operation))
+        if i is None:
+            return
+        if self.count + len(state) > self.n_blocks:
+            raise ValueError(f"Recorder full: buffer allocated for {self.n_blocks} blocks")
+        self.buffer[self.count:self.count + len(state), i] = self.transform(state)
+
+    @abstractmethod
+    def transform(self, state: np.ndarray) -> np.ndarray:
+        """ Row recorded for each block of the state """
+
+    def after_sub_bytes(self, round_index, state):
+        self._record('sub_bytes', round_index, state)
+
+    def after_shift_rows(self, round_index, state):
+        self._record('shift_rows', round_index, state)
+
+    def after_mix_columns(self, round_index, state):
+        self._record('mix_columns', round_index, state)
+
+    def after_add_round_key(self, round_index, state):
+        self._record('add_round_key', round_index, state)
+
+    def end(self, cipher_texts):
+        self.count += len(cipher_texts)
+
+    def reset(self) -> None:
+        self.count = 0
+
+
+class StateRecorder(_Recorder):
+    """
+    Records the selected intermediate states.
+        events: the recorded (round, operation) pairs in execution order
+        buffer: preallocated (n_blocks, events, 16) uint8 array
+        count: number of blocks recorded so far
+    """
+
+    def __init__(self, n_blocks: int, operations: Sequence[str] = OPERATIONS, rounds: Optional[Sequence[int]] = None,
+                 variant: AESVariant = CUSTOM_AES):
+        """
+        Args:
+            n_blocks: maximum number of blocks to record
+            operations: operations after which the state is recorded
+            rounds: rounds to record - default: all
+            variant: round structure of the traced cipher
+        """
+        super().__init__(n_blocks, operations, rounds, variant, width=16, dtype=np.uint8)
+
+    def transform(self, state):
+        return state
+
+
+class HammingWeightRecorder(_Recorder):
+    """
+    Records the Hamming weight of the selected intermediate states, i.e. a simulated leakage trace per block.
+        events: the recorded (round, operation) pairs in execution order
+        buffer: preallocated (n_blocks, events, 16) per-byte weights if per_byte, otherwise (n_blocks, events, 1)
+        count: number of blocks recorded so far
+    """
+
+    def __init__(self, n_blocks: int, operations: Sequence[str] = ('sub_bytes',),
+                 rounds: Optional[Sequence[int]] = None, variant: AESVariant = CUSTOM_AES, per_byte: bool = False):
+        """
+        Args:
+            n_blocks: maximum number of blocks to record
+            operations: operations after which the leakage is recorded - default: SubBytes output
+            rounds: rounds to record - default: all
+            variant: round structure of the traced cipher
+            per_byte: record the weight of each byte rather than of the whole state
+        """
+        super().__init__(n_blocks, operations, rounds, variant, width=16 if per_byte else 1, dtype=np.uint8)
+        self.per_byte = per_byte
+
+    def transform(self, state):
+        weights = HAMMING_WEIGHT[state]
+        return weights if self.per_byte else weights.sum(axis=1, dtype=np.uint8)[:, None]
+
+    @property
+    def traces(self) -> np.ndarray:
+        """ Recorded leakage as a (blocks, samples) array """
+        return self.buffer[:self.count].reshape(self.count, -1)
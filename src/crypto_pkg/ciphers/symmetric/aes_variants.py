@@ -0,0 +1,368 @@
+import struct
+from enum import Enum
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import (KEY_CACHE_SIZE, CustomAES, ExpandedKey, _as_blocks, build_t_tables,
+                                              expand_key_words, r_con, reversed_box, sbox_table)
+
+_IDENTITY = list(range(256))
+_MIX = [0x02, 0x01, 0x01, 0x03]
+_INV_MIX = [0x0e, 0x09, 0x0d, 0x0b]
+# Column of a matrix that only moves the byte to its row, i.e. no MixColumns
+_NO_MIX = [0x01, 0x00, 0x00, 0x00]
+_NP_SBOX = np.array(sbox_table, dtype=np.uint32)
+_NP_R_CON = np.array([rc[0] for rc in r_con], dtype=np.uint32) << 24
+# Keys expanded and encrypted at once by the many-keys engine, bounding the memory used by the round keys
+KEY_CHUNK = 1 << 16
+
+
+class KeySchedule(str, Enum):
+    CUSTOM = "custom"  # CustomAES.generate_keys
+    FIPS197 = "fips197"  # standard AES-128, as pycryptodome's AES
+    REPEAT = "repeat"  # the cipher key is used as every round key, as in ModifiedAES
+
+
+class AESVariant(NamedTuple):
+    """
+    Declarative description of an AES-like cipher.
+        rounds: number of rounds after the initial AddRoundKey
+        sub_bytes, shift_rows, mix_columns: operations run in every round (AddRoundKey always runs)
+        final_mix_columns: whether the last round also runs MixColumns
+        key_schedule: how the round keys are derived from the 16-byte key
+    """
+    rounds: int = 10
+    sub_bytes: bool = True
+    shift_rows: bool = True
+    mix_columns: bool = True
+    final_mix_columns: bool = False
+    key_schedule: KeySchedule = KeySchedule.CUSTOM
+
+
+CUSTOM_AES = AESVariant()
+STANDARD_AES = AESVariant(key_schedule=KeySchedule.FIPS197)
+MODIFIED_AES = AESVariant(shift_rows=False, key_schedule=KeySchedule.REPEAT)
+
+
+def fips197_key_words(key) -> list:
+    """
+    Standard AES-128 key expansion (FIPS-197)
+
+    Args:
+        key: 16-byte key as a list of integers or bytes
+    Returns:
+        list of 44 big-endian words, word 4 * r + c being column c of round key r
+    """
+    s = sbox_table
+    w = list(struct.unpack(">4I", bytes(key)))
+    for i in range(4, 44):
+        t = w[i - 1]
+        if i % 4 == 0:
+            t = ((s[(t >> 16) & 0xff] << 24) | (s[(t >> 8) & 0xff] << 16) | (s[t & 0xff] << 8) | s[t >> 24]) ^ (
+                    r_con[i // 4 - 1][0] << 24)
+        w.append(w[i - 4] ^ t)
+    return w
+
+
+def keys_array(keys) -> np.ndarray:
+    """ (K, 16) uint8 array from an array of keys or an iterable of 16-byte keys """
+    if not isinstance(keys, np.ndarray):
+        keys = np.frombuffer(b"".join(bytes(k) for k in keys), dtype=np.uint8)
+    keys = np.asarray(keys, dtype=np.uint8).reshape(-1, 16)
+    return keys
+
+
+def pack_blocks(blocks) -> np.ndarray:
+    """
+    Pack 16-byte blocks in two big-endian 64-bit integers
+
+    Args:
+        blocks: (N, 16) uint8 array
+    Returns:
+        (N, 2) uint64 array whose rows (high, low) read as the 128-bit big-endian value of the blocks
+    """
+    return np.ascontiguousarray(blocks, dtype=np.uint8).view('>u8').astype(np.uint64)
+
+
+def unpack_blocks(packed) -> np.ndarray:
+    """ Inverse of pack_blocks """
+    return np.ascontiguousarray(packed, dtype='>u8').view(np.uint8).reshape(-1, 16)
+
+
+def _sub_word(w: np.ndarray, order) -> np.ndarray:
+    # S-box applied to the bytes of w, byte i of the result (from the most significant) taken from byte order[i]
+    s = _NP_SBOX
+    return ((s[(w >> (24 - 8 * order[0])) & 0xff] << 24) | (s[(w >> (24 - 8 * order[1])) & 0xff] << 16) |
+            (s[(w >> (24 - 8 * order[2])) & 0xff] << 8) | s[(w >> (24 - 8 * order[3])) & 0xff])
+
+
+def key_words_array(keys, key_schedule: KeySchedule, rounds: int = 10) -> np.ndarray:
+    """
+    Key schedules of many keys at once
+
+    Args:
+        keys: (K, 16) uint8 array
+        key_schedule: key schedule to run
+        rounds: number of rounds, the schedule producing rounds + 1 round keys
+    Returns:
+        (K, rounds + 1, 4) uint32 array of round key words
+    """
+    base = np.ascontiguousarray(keys, dtype=np.uint8).view('>u4').astype(np.uint32)
+    if key_schedule == KeySchedule.REPEAT:
+        return np.repeat(base[:, None, :], rounds + 1, axis=1)
+    out = np.empty((len(base), rounds + 1, 4), dtype=np.uint32)
+    out[:, 0] = base
+    for r in range(1, rounds + 1):
+        w0, w1, w2, w3 = (out[:, r - 1, j] for j in range(4))
+        if key_schedule == KeySchedule.FIPS197:
+            out[:, r, 0] = w0 ^ _sub_word(w3, (1, 2, 3, 0)) ^ _NP_R_CON[r - 1]
+            for j in range(1, 4):
+                out[:, r, j] = out[:, r - 1, j] ^ out[:, r, j - 1]
+        else:
+            # See expand_key_words for the CustomAES schedule
+            out[:, r, 0] = w0 ^ _sub_word(w3, (3, 2, 1, 0)) ^ _NP_R_CON[r - 1]
+            for j in range(1, 4):
+                out[:, r, j] = ((w0 << np.uint32(8 * j)) | (w1 >> np.uint32(32 - 8 * j))) ^ out[:, r, j - 1]
+    return out
+
+
+def _inv_mix_word(tables, w):
+    return tables[0][w >> 24] ^ tables[1][(w >> 16) & 0xff] ^ tables[2][(w >> 8) & 0xff] ^ tables[3][w & 0xff]
+
+
+def _round_source(offset, tables, key, sources):
+    lines = []
+    for j in range(4):
+        a, b, c, d = sources[j]
+        lines.append(f"    t{j} = {tables}0[s{a} >> 24] ^ {tables}1[(s{b} >> 16) & 0xff]"
+                     f" ^ {tables}2[(s{c} >> 8) & 0xff] ^ {tables}3[s{d} & 0xff] ^ {key}[{offset + j}]")
+    lines.append("    s0, s1, s2, s3 = t0, t1, t2, t3")
+    return lines
+
+
+class CompiledVariant:
+    """
+    Table-driven implementation of an AESVariant. Every round is fused into 16 lookups in four 32-bit tables
+    combining the selected operations, and the block functions are generated with all rounds unrolled.
+    """
+
+    def __init__(self, variant: AESVariant):
+        if variant.rounds < 1:
+            raise ValueError("A variant needs at least one round")
+        if variant.key_schedule != KeySchedule.REPEAT and variant.rounds > 10:
+            raise ValueError(f"The {variant.key_schedule.value} key schedule defines at most 10 rounds")
+        self.variant = variant
+        box = sbox_table if variant.sub_bytes else _IDENTITY
+        inv_box = reversed_box if variant.sub_bytes else _IDENTITY
+        self.tables = {
+            "E": build_t_tables(box, _MIX if variant.mix_columns else _NO_MIX),
+            "L": build_t_tables(box, _MIX if variant.mix_columns and variant.final_mix_columns else _NO_MIX),
+            "D": build_t_tables(inv_box, _INV_MIX if variant.mix_columns else _NO_MIX),
+            "F": build_t_tables(inv_box, _NO_MIX),
+            "M": build_t_tables(_IDENTITY, _INV_MIX),
+        }
+        shift = (lambda j, r: (j + r) % 4) if variant.shift_rows else (lambda j, r: j)
+        inv_shift = (lambda j, r: (j - r) % 4) if variant.shift_rows else (lambda j, r: j)
+        self.sources = np.array([[shift(j, r) for r in range(4)] for j in range(4)])
+        self.inv_sources = np.array([[inv_shift(j, r) for r in range(4)] for j in range(4)])
+        self.encrypt_block, self.decrypt_block = self._generate()
+        # Expanded keys of the variant, cached by key bytes
+        self.expand_key = lru_cache(maxsize=KEY_CACHE_SIZE)(self._expand_key)
+        self._np_tables = {name: np.array(t, dtype=np.uint32) for name, t in self.tables.items()}
+
+    def _generate(self):
+        rounds = self.variant.rounds
+        encrypt = ["def encrypt_block(block, rk):", "    s0, s1, s2, s3 = _unpack(bytes(block))",
+                   "    s0 ^= rk[0]", "    s1 ^= rk[1]", "    s2 ^= rk[2]", "    s3 ^= rk[3]"]
+        for i in range(1, rounds + 1):
+            encrypt += _round_source(4 * i, "E" if i < rounds else "L", "rk", self.sources.tolist())
+        encrypt.append("    return _pack(s0, s1, s2, s3)")
+
+        decrypt = ["def decrypt_block(block, dk):", "    s0, s1, s2, s3 = _unpack(bytes(block))",
+                   "    s0 ^= dk[0]", "    s1 ^= dk[1]", "    s2 ^= dk[2]", "    s3 ^= dk[3]"]
+        if self.variant.mix_columns and self.variant.final_mix_columns:
+            decrypt += _round_source(0, "M", "_zero", [[j] * 4 for j in range(4)])
+        for i in range(1, rounds):
+            decrypt += _round_source(4 * i, "D", "dk", self.inv_sources.tolist())
+        decrypt += _round_source(4 * rounds, "F", "dk", self.inv_sources.tolist())
+        decrypt.append("    return _pack(s0, s1, s2, s3)")
+
+        namespace = {"_unpack": struct.Struct(">4I").unpack, "_pack": struct.Struct(">4I").pack, "_zero": [0] * 4}
+        for name, tables in self.tables.items():
+            for i, table in enumerate(tables):
+                namespace[f"{name}{i}"] = table
+        exec(compile("\n".join(encrypt + [""] + decrypt), f"<aes variant {self.variant}>", "exec"), namespace)
+        return namespace["encrypt_block"], namespace["decrypt_block"]
+
+    def key_words(self, key) -> list:
+        """ Encryption round keys of the variant as 32-bit words """
+        n = 4 * (self.variant.rounds + 1)
+        if self.variant.key_schedule == KeySchedule.REPEAT:
+            return list(struct.unpack(">4I", bytes(key))) * (self.variant.rounds + 1)
+        if self.variant.key_schedule == KeySchedule.FIPS197:
+            return fips197_key_words(key)[:n]
+        return expand_key_words(key)[:n]
+
+    def inverse_key_words(self, words) -> list:
+        """ Decryption round keys: reversed round order, InvMixColumns applied to the inner round keys """
+        rounds = self.variant.rounds
+        out = list(words[4 * rounds:])
+        for r in range(rounds - 1, 0, -1):
+            round_key = words[4 * r:4 * r + 4]
+            if self.variant.mix_columns:
+                round_key = [_inv_mix_word(self.tables["M"], w) for w in round_key]
+            out += round_key
+        out += words[:4]
+        return out
+
+    @property
+    def schedule(self) -> str:
+        """ Identifier of the key schedule, shared by the variants deriving the same round keys (see ExpandedKey) """
+        schedule = f"{self.variant.key_schedule.value}-{self.variant.rounds}"
+        return schedule if self.variant.mix_columns else f"{schedule}-no-mix-columns"
+
+    def _expand_key(self, key: bytes) -> ExpandedKey:
+        words = self.key_words(key)
+        return ExpandedKey(key, words=words, inverse_words=self.inverse_key_words(words), schedule=self.schedule)
+
+    def _rounds(self, state, rk, tables, final_tables, sources, inverse) -> np.ndarray:
+        # state: (N, 4) words, rk: (R + 1, 4) words of one key or (N, R + 1, 4) words of one key per block
+        state = state ^ rk[..., 0, :]
+        if inverse and self.variant.mix_columns and self.variant.final_mix_columns:
+            m = self._np_tables["M"]
+            state = m[0][state >> 24] ^ m[1][(state >> 16) & 0xff] ^ m[2][(state >> 8) & 0xff] ^ m[3][state & 0xff]
+        n = rk.shape[-2]
+        for i in range(1, n):
+            t = tables if i < n - 1 else final_tables
+            state = (t[0][state[:, sources[:, 0]] >> 24] ^ t[1][(state[:, sources[:, 1]] >> 16) & 0xff] ^
+                     t[2][(state[:, sources[:, 2]] >> 8) & 0xff] ^ t[3][state[:, sources[:, 3]] & 0xff] ^
+                     rk[..., i, :])
+        # Fancy indexing along the columns may leave the state in Fortran order
+        return np.ascontiguousarray(state, dtype='>u4').view(np.uint8).reshape(-1, 16)
+
+    def _batch(self, blocks, words, inverse) -> np.ndarray:
+        state = np.ascontiguousarray(_as_blocks(blocks)).view('>u4').astype(np.uint32)
+        rk = np.array(words, dtype=np.uint32).reshape(-1, 4)
+        if inverse:
+            return self._rounds(state, rk, self._np_tables["D"], self._np_tables["F"], self.inv_sources, True)
+        return self._rounds(state, rk, self._np_tables["E"], self._np_tables["L"], self.sources, False)
+
+    def encrypt_blocks(self, blocks, words) -> np.ndarray:
+        """ Encrypt an (N, 16) uint8 array of blocks with the given encryption round key words """
+        return self._batch(blocks, words, False)
+
+    def decrypt_blocks(self, blocks, inverse_words) -> np.ndarray:
+        """ Decrypt an (N, 16) uint8 array of blocks with the given decryption round key words """
+        return self._batch(blocks, inverse_words, True)
+
+    def key_words_array(self, keys) -> np.ndarray:
+        """ (K, R + 1, 4) encryption round key words of a (K, 16) uint8 array of keys """
+        return key_words_array(keys, self.variant.key_schedule, self.variant.rounds)
+
+    def inverse_key_words_array(self, words: np.ndarray) -> np.ndarray:
+        """ (K, R + 1, 4) decryption round key words, vectorized inverse_key_words """
+        out = words[:, ::-1].copy()
+        if self.variant.mix_columns:
+            w = out[:, 1:-1]
+            m = self._np_tables["M"]
+            out[:, 1:-1] = m[0][w >> 24] ^ m[1][(w >> 16) & 0xff] ^ m[2][(w >> 8) & 0xff] ^ m[3][w & 0xff]
+        return out
+
+    def _under_keys(self, block, keys, inverse, packed) -> np.ndarray:
+        keys = keys_array(keys)
+        state = np.frombuffer(bytes(block), dtype='>u4').astype(np.uint32).reshape(1, 4)
+        out = np.empty((len(keys), 2), dtype=np.uint64) if packed else np.empty((len(keys), 16), dtype=np.uint8)
+        for start in range(0, len(keys), KEY_CHUNK):
+            rk = self.key_words_array(keys[start:start + KEY_CHUNK])
+            if inverse:
+                result = self._rounds(state, self.inverse_key_words_array(rk), self._np_tables["D"],
+                                      self._np_tables["F"], self.inv_sources, True)
+            else:
+                result = self._rounds(state, rk, self._np_tables["E"], self._np_tables["L"], self.sources, False)
+            out[start:start + len(result)] = pack_blocks(result) if packed else result
+        return out
+
+    def encrypt_under_keys(self, block, keys, packed: bool = False) -> np.ndarray:
+        """
+        Encrypt one block under many keys at once
+
+        Args:
+            block: 16-byte plain text block
+            keys: (K, 16) uint8 array of keys, or an iterable of 16-byte keys
+            packed: return the cipher texts packed as in pack_blocks
+        Returns:
+            (K, 16) uint8 array, or (K, 2) uint64 array if packed, row i being the cipher text under key i
+        """
+        return self._under_keys(block, keys, False, packed)
+
+    def decrypt_under_keys(self, block, keys, packed: bool = False) -> np.ndarray:
+        """ Decrypt one block under many keys at once, see encrypt_under_keys """
+        return self._under_keys(block, keys, True, packed)
+
+
+@lru_cache(maxsize=None)
+def compile_variant(variant: AESVariant) -> CompiledVariant:
+    """ Compiled implementation of a variant, built once per distinct variant """
+    return CompiledVariant(AESVariant(*variant[:-1], KeySchedule(variant.key_schedule)))
+
+
+class VariantAES(CustomAES):
+    """
+    CustomAES interface running the compiled implementation of an AESVariant.
+    Subclasses set the `variant` class attribute, or an instance is built with an explicit variant.
+    """
+    variant = CUSTOM_AES
+
+    def __init__(self, variant: AESVariant = None, hooks=None):
+        super().__init__(hooks=hooks)
+        if variant is not None:
+            self.variant = variant
+
+    @property
+    def compiled(self) -> CompiledVariant:
+        return compile_variant(self.variant)
+
+    def expand_key(self, key) -> ExpandedKey:
+        """
+        Raises:
+            ValueError: if key is an ExpandedKey of another key schedule
+        """
+        if isinstance(key, ExpandedKey):
+            if key.schedule != self.compiled.schedule:
+                raise ValueError(f"Expanded key of the {key.schedule} key schedule, the variant uses "
+                                 f"{self.compiled.schedule}")
+            return key
+        return self.compiled.expand_key(bytes(key))
+
+    def _traced(self, blocks, expanded_key) -> np.ndarray:
+        v = self.variant
+        return self._traced_encrypt(_as_blocks(blocks), expanded_key, sub_bytes=v.sub_bytes, shift_rows=v.shift_rows,
+                                    mix_columns=v.mix_columns, final_mix_columns=v.final_mix_columns)
+
+    def encrypt(self, plain_text, key):
+        expanded_key = self.expand_key(key)
+        if self.hooks:
+            return self._traced([list(plain_text)], expanded_key)[0].tolist()
+        return list(self.compiled.encrypt_block(plain_text, expanded_key.words))
+
+    def decrypt(self, cipher_text, key):
+        return list(self.compiled.decrypt_block(cipher_text, self.expand_key(key).inverse_words))
+
+    def encrypt_blocks(self, blocks, key) -> np.ndarray:
+        expanded_key = self.expand_key(key)
+        if self.hooks:
+            return self._traced(blocks, expanded_key)
+        return self.compiled.encrypt_blocks(blocks, expanded_key.words)
+
+    def decrypt_blocks(self, blocks, key) -> np.ndarray:
+        return self.compiled.decrypt_blocks(blocks, self.expand_key(key).inverse_words)
+
+    def encrypt_under_keys(self, plain_text, keys, packed: bool = False) -> np.ndarray:
+        """ Cipher texts of one plain text block under every key, see CompiledVariant.encrypt_under_keys """
+        return self.compiled.encrypt_under_keys(plain_text, keys, packed=packed)
+
+    def decrypt_under_keys(self, cipher_text, keys, packed: bool = False) -> np.ndarray:
+        """ Plain texts of one cipher text block under every key, see CompiledVariant.decrypt_under_keys """
+        return self.compiled.decrypt_under_keys(cipher_text, keys, packed=packed)
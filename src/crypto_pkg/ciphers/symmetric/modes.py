@@ -0,0 +1,255 @@
+import mmap
+import os
+from enum import Enum
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import batch_decrypt, batch_encrypt, expand_key, ttable_encrypt
+from crypto_pkg.utils.logging import get_logger
+
+log = get_logger(__name__)
+
+BLOCK_SIZE = 16
+# Blocks handed to one worker task (1 MiB)
+CHUNK_BLOCKS = 1 << 16
+
+
+class Mode(str, Enum):
+    ECB = "ECB"
+    CBC = "CBC"
+    CTR = "CTR"
+
+
+def pad(data: bytes) -> bytes:
+    """ PKCS#7 padding to a multiple of the block size """
+    n = BLOCK_SIZE - len(data) % BLOCK_SIZE
+    return bytes(data) + bytes([n]) * n
+
+
+def padding_length(last_block: bytes) -> int:
+    """
+    Number of PKCS#7 padding bytes at the end of the last decrypted block
+
+    Raises:
+        ValueError: if the padding is malformed (wrong key, wrong mode or corrupted file)
+    """
+    n = last_block[-1]
+    if not 1 <= n <= BLOCK_SIZE or last_block[-n:] != bytes([n]) * n:
+        raise ValueError("Invalid padding: wrong key or mode, or corrupted input")
+    return n
+
+
+def counter_blocks(iv: bytes, first: int, count: int) -> np.ndarray:
+    """
+    CTR counter blocks iv + first, ..., iv + first + count - 1 (big-endian, modulo 2^128)
+
+    Returns:
+        (count, 16) uint8 array
+    """
+    value = (int.from_bytes(iv, 'big') + first) % (1 << 128)
+    hi, lo = np.uint64(value >> 64), np.uint64(value & 0xffffffffffffffff)
+    steps = np.arange(count, dtype=np.uint64)
+    counters = np.empty((count, 2), dtype='>u8')
+    counters[:, 1] = lo + steps
+    # Carry into the high word where the low word wrapped around
+    counters[:, 0] = hi + (counters[:, 1] < lo).astype(np.uint64)
+    return counters.view(np.uint8).reshape(count, BLOCK_SIZE)
+
+
+class _MappedFiles:
+    """ Input and output files mapped in memory, exposed as flat uint8 arrays without copies """
+
+    def __init__(self, in_path: str, out_path: str):
+        self._in_file = open(in_path, 'rb')
+        self._out_file = open(out_path, 'r+b')
+        self._in_map = mmap.mmap(self._in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._out_map = mmap.mmap(self._out_file.fileno(), 0, access=mmap.ACCESS_WRITE)
+        self.source = np.frombuffer(memoryview(self._in_map), dtype=np.uint8)
+        self.target = np.frombuffer(memoryview(self._out_map), dtype=np.uint8)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # The array views must be released before the maps can be closed
+        del self.source, self.target
+        self._out_map.flush()
+        self._in_map.close()
+        self._out_map.close()
+        self._in_file.close()
+        self._out_file.close()
+
+
+def _transform(files: _MappedFiles, mode: Mode, encrypt: bool, round_keys: np.ndarray, iv: Optional[bytes],
+               in_offset: int, out_offset: int, first: int, count: int) -> None:
+    start = in_offset + first * BLOCK_SIZE
+    stop = min(start + count * BLOCK_SIZE, len(files.source))
+    data = files.source[start:stop]
+    out_start = out_offset + first * BLOCK_SIZE
+    if mode == Mode.CTR:
+        keystream = batch_encrypt(counter_blocks(iv, first, count), round_keys).reshape(-1)
+        result = data ^ keystream[:len(data)]
+    elif mode == Mode.ECB:
+        blocks = data.reshape(-1, BLOCK_SIZE)
+        result = batch_encrypt(blocks, round_keys) if encrypt else batch_decrypt(blocks, round_keys)
+    else:
+        # CBC decryption: P_i = D(C_i) ^ C_{i-1}, all C_i are known so blocks are independent
+        blocks = data.reshape(-1, BLOCK_SIZE)
+        previous = np.empty_like(blocks)
+        previous[1:] = blocks[:-1]
+        previous[0] = np.frombuffer(iv, dtype=np.uint8) if first == 0 else files.source[start - BLOCK_SIZE:start]
+        result = batch_decrypt(blocks, round_keys) ^ previous
+    files.target[out_start:out_start + result.size] = result.reshape(-1)
+
+
+def _process_chunk(task: Tuple) -> None:
+    """
+    Worker task: transform the blocks [first, first + count) of the input body into the output body.
+
+    Args:
+        task: (mode, encrypt, key, iv, in_path, in_offset, out_path, out_offset, first, count) where offsets locate
+            the bodies in the files (after the IV header) and first/count are measured in blocks
+    """
+    mode, encrypt, key, iv, in_path, in_offset, out_path, out_offset, first, count = task
+    round_keys = expand_key(key).array
+    with _MappedFiles(in_path, out_path) as files:
+        _transform(files, mode, encrypt, round_keys, iv, in_offset, out_offset, first, count)
+
+
+def _tasks(mode: Mode, encrypt: bool, key: bytes, iv: Optional[bytes], in_path: str, in_offset: int, out_path: str,
+           out_offset: int, n_blocks: int, chunk_blocks: int) -> List[Tuple]:
+    return [(mode, encrypt, key, iv, in_path, in_offset, out_path, out_offset, first,
+             min(chunk_blocks, n_blocks - first)) for first in range(0, n_blocks, chunk_blocks)]
+
+
+def _run(tasks: List[Tuple], workers: Optional[int]) -> None:
+    if not tasks:
+        return
+    if workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            _process_chunk(task)
+        return
+    log.debug(f"Processing {len(tasks)} chunks in parallel")
+    with Pool(workers) as pool:
+        pool.map(_process_chunk, tasks, chunksize=1)
+
+
+def _allocate(path: str, size: int) -> None:
+    with open(path, 'wb') as f:
+        f.truncate(size)
+
+
+def _cbc_encrypt(in_path: str, out_path: str, key: bytes, iv: bytes, n_blocks: int) -> bytes:
+    """ Sequential CBC chaining over the full blocks, returns the last cipher text block """
+    round_keys = expand_key(key).words
+    previous = int.from_bytes(iv, 'big')
+    with _MappedFiles(in_path, out_path) as files:
+        source = memoryview(files.source)
+        target = memoryview(files.target)
+        for i in range(n_blocks):
+            block = int.from_bytes(source[i * BLOCK_SIZE:(i + 1) * BLOCK_SIZE], 'big') ^ previous
+            c = ttable_encrypt(block.to_bytes(BLOCK_SIZE, 'big'), round_keys)
+            target[BLOCK_SIZE + i * BLOCK_SIZE:BLOCK_SIZE * (i + 2)] = c
+            previous = int.from_bytes(c, 'big')
+        del source, target
+    return previous.to_bytes(BLOCK_SIZE, 'big')
+
+
+def _read(path: str, offset: int, size: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def _write(path: str, offset: int, data: bytes) -> None:
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def encrypt_file(in_path: str, out_path: str, key: bytes, mode: Mode = Mode.CTR, iv: Optional[bytes] = None,
+                 workers: Optional[int] = None, chunk_blocks: int = CHUNK_BLOCKS) -> None:
+    """
+    Encrypt a file with CustomAES in the given mode, streaming it through memory maps.
+    CBC and CTR outputs start with the 16-byte IV (initial counter for CTR); ECB and CBC use PKCS#7 padding.
+    ECB and CTR chunks are processed by a process pool, CBC encryption is sequential by construction.
+
+    Args:
+        in_path: file to encrypt
+        out_path: destination file, overwritten
+        key: 16-byte key
+        mode: block cipher mode of operation
+        iv: 16-byte IV, random if not provided (ignored in ECB mode)
+        workers: number of processes - default: number of cores
+        chunk_blocks: blocks per worker task
+    """
+    mode = Mode(mode)
+    size = os.path.getsize(in_path)
+    header = b''
+    if mode != Mode.ECB:
+        header = iv if iv is not None else os.urandom(BLOCK_SIZE)
+    n_full = size // BLOCK_SIZE
+    out_size = len(header) + (size if mode == Mode.CTR else (n_full + 1) * BLOCK_SIZE)
+    log.info(f"Encrypting {size} bytes from {in_path} in {mode.value} mode")
+    _allocate(out_path, out_size)
+    _write(out_path, 0, header)
+    if mode == Mode.CTR:
+        if size:
+            _run(_tasks(mode, True, key, header, in_path, 0, out_path, BLOCK_SIZE, -(-size // BLOCK_SIZE),
+                        chunk_blocks), workers)
+        return
+    tail = pad(_read(in_path, n_full * BLOCK_SIZE, BLOCK_SIZE))
+    if mode == Mode.ECB:
+        if n_full:
+            _run(_tasks(mode, True, key, None, in_path, 0, out_path, 0, n_full, chunk_blocks), workers)
+        _write(out_path, n_full * BLOCK_SIZE, ttable_encrypt(tail, expand_key(key).words))
+        return
+    previous = _cbc_encrypt(in_path, out_path, key, header, n_full) if n_full else header
+    last = bytes(a ^ b for a, b in zip(tail, previous))
+    _write(out_path, BLOCK_SIZE * (n_full + 1), ttable_encrypt(last, expand_key(key).words))
+
+
+def decrypt_file(in_path: str, out_path: str, key: bytes, mode: Mode = Mode.CTR, workers: Optional[int] = None,
+                 chunk_blocks: int = CHUNK_BLOCKS) -> None:
+    """
+    Decrypt a file produced by encrypt_file. All modes are decrypted in parallel chunks.
+
+    Args:
+        in_path: file to decrypt
+        out_path: destination file, overwritten
+        key: 16-byte key
+        mode: block cipher mode of operation used for the encryption
+        workers: number of processes - default: number of cores
+        chunk_blocks: blocks per worker task
+    Raises:
+        ValueError: if the input size or the padding is not valid for the mode
+    """
+    mode = Mode(mode)
+    size = os.path.getsize(in_path)
+    header_size = 0 if mode == Mode.ECB else BLOCK_SIZE
+    body = size - header_size
+    if body < 0 or (mode != Mode.CTR and (body == 0 or body % BLOCK_SIZE)):
+        raise ValueError(f"Invalid {mode.value} cipher text size {size}")
+    iv = _read(in_path, 0, header_size) if header_size else None
+    log.info(f"Decrypting {size} bytes from {in_path} in {mode.value} mode")
+    if mode == Mode.CTR:
+        _allocate(out_path, body)
+        if body:
+            _run(_tasks(mode, False, key, iv, in_path, header_size, out_path, 0, -(-body // BLOCK_SIZE),
+                        chunk_blocks), workers)
+        return
+    # The last block is decrypted first to know the plain text size
+    n_blocks = body // BLOCK_SIZE
+    last_block = _read(in_path, header_size + body - BLOCK_SIZE, BLOCK_SIZE)
+    previous = (iv if n_blocks == 1 else _read(in_path, header_size + body - 2 * BLOCK_SIZE, BLOCK_SIZE)
+                ) if mode == Mode.CBC else bytes(BLOCK_SIZE)
+    round_keys = expand_key(key).array
+    last = bytes(batch_decrypt(np.frombuffer(last_block, dtype=np.uint8).reshape(1, BLOCK_SIZE), round_keys)[0]
+                 ^ np.frombuffer(previous, dtype=np.uint8))
+    tail = last[:BLOCK_SIZE - padding_length(last)]
+    _allocate(out_path, body - BLOCK_SIZE + len(tail))
+    if n_blocks > 1:
+        _run(_tasks(mode, False, key, iv, in_path, header_size, out_path, 0, n_blocks - 1, chunk_blocks), workers)
+    _write(out_path, body - BLOCK_SIZE, tail)
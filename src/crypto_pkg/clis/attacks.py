@@ -1,3 +1,4 @@
+import logging
 import os
 from decimal import Decimal
 import random
@@ -7,9 +8,14 @@ import typer
 from Crypto.Cipher import AES
 
 from crypto_pkg.attacks.block_ciphers.double_encryption import DoubleAESAttack
+from crypto_pkg.attacks.block_ciphers.integral import IntegralAttack, last_round_key, reduced_round_oracle
 from crypto_pkg.attacks.block_ciphers.modified_aes import ModifiedAES
+from crypto_pkg.attacks.block_ciphers.rainbow import crack, generate_tables
 from crypto_pkg.attacks.block_ciphers.utils import prepare_key
-from crypto_pkg.attacks.power_analysis.correlation_power_analysis import Attack as PowerAnalysisAttack
+from crypto_pkg.attacks.distributed import DEFAULT_PORT, LEASE_SIZE, Coordinator, double_aes_attack, \
+    modified_aes_attack, run_worker
+from crypto_pkg.attacks.power_analysis.correlation_power_analysis import Attack as PowerAnalysisAttack, \
+    CPAAccumulator, load_batches
 from crypto_pkg.attacks.stream_ciphers.geffe_cipher import Attack as GeffeAttack, ThresholdsOperator
 from crypto_pkg.contracts.cli_dto import ModifiedAESIn
 from importlib import resources
@@ -23,6 +29,9 @@ def get_hex(x):
 
 @app.command('geffe')
 def attack_geffe(
+        workers: Optional[int] = typer.Option(None, help="Number of processes - default: number of cores"),
+        checkpoint_dir: Optional[str] = typer.Option(None, help="Directory of the progress checkpoints, an "
+                                                                "interrupted attack resumes from them"),
         verbose: bool = typer.Option(False, help="Show debug logs")
 ):
     """
@@ -42,7 +51,7 @@ def attack_geffe(
     tsh = [(ThresholdsOperator.MAX, Decimal('0.5') - epsilon_0), None,
            (ThresholdsOperator.MIN, Decimal('0.5') + epsilon_1)]
 
-    attack.attack(thresholds=tsh, _verbose=verbose)
+    attack.attack(thresholds=tsh, workers=workers, checkpoint_dir=checkpoint_dir, _verbose=verbose)
 
 
 @app.command("modifiedAES")
@@ -50,6 +59,9 @@ def attack_modifier_aes(
         plain_text: Optional[str] = typer.Option(None, help="128bits plain text to encrypt"),
         cipher_text: Optional[str] = typer.Option(None, help="128bits encryption of the plain_text"),
         key: Optional[str] = typer.Option(None, help="Encryption 128bits key to Find"),
+        workers: Optional[int] = typer.Option(None, help="Number of processes - default: number of cores"),
+        checkpoint_dir: Optional[str] = typer.Option(None, help="Directory of the progress checkpoints, an "
+                                                                "interrupted attack resumes from them"),
         verbose: bool = typer.Option(False, help="Show debug logs")
 ):
     """
@@ -96,7 +108,11 @@ def attack_modifier_aes(
     # ---- Run the attack
     print(f"Run the attack with plain-text {p} and cipher-text {p}")
     aes = ModifiedAES()
-    result = aes.attack(plain_text=model.plain_text, cipher_text=ct, _verbose=verbose)
+    result = aes.attack(plain_text=model.plain_text, cipher_text=ct, workers=workers, checkpoint_dir=checkpoint_dir,
+                        _verbose=verbose)
+    if result is None:
+        print("\nNo key found")
+        return
     if model.key is not None:
         # Check that the key is the one provided
         assert result == int(model.key, 16)
@@ -118,10 +134,35 @@ def attack_modifier_aes(
     print(f"\nSuccess: key {result} recovered")
 
 
+@app.command("integral")
+def attack_integral(
+        key: Optional[str] = typer.Option(None, help="128bits key of the 4-round CustomAES oracle, random if not "
+                                                     "provided"),
+        verbose: bool = typer.Option(False, help="Show debug logs")
+):
+    """
+    Example of the integral (Square) attack on CustomAES reduced to 4 rounds.\n
+    An encryption oracle is built with the key, the attack queries Λ-sets of 256 chosen plain texts and recovers the
+    last round key byte by byte.
+    """
+    k = bytes.fromhex(key) if key is not None else os.urandom(16)
+    attack = IntegralAttack(oracle=reduced_round_oracle(k, rounds=4), rounds=4)
+    found = attack.attack_4_rounds(_verbose=verbose)
+    assert found == last_round_key(k, rounds=4)
+    print(f"\nSuccess: last round key {found.hex()} recovered with {attack.queries} chosen plain texts")
+
+
 @app.command("AES-double-encryption")
 def attack_double_encryption(
         plain_text: Optional[str] = typer.Option(None, help="128bits plain text to encrypt"),
         cipher_text: Optional[str] = typer.Option(None, help="128bits encryption of the plain_text"),
+        workers: Optional[int] = typer.Option(None, help="Number of processes - default: number of cores"),
+        cache: bool = typer.Option(True, help="Reuse the lookup table stored by a previous run with the same plain "
+                                              "text"),
+        memory_budget: Optional[int] = typer.Option(None, help="Memory budget in bytes, the attack runs out of core "
+                                                               "with sorted runs on disk if the table exceeds it"),
+        checkpoint: Optional[str] = typer.Option(None, help="Progress file of the search, an interrupted search "
+                                                            "resumes from it"),
         verbose: Optional[bool] = typer.Option(False, help="Show debug logs"),
 ):
     """
@@ -162,19 +203,101 @@ def attack_double_encryption(
 
     print("\nStating the attack")
     print("It might take a bit, but don't worry we'll find it")
-    ks = DoubleAESAttack.attack(plain_text=pt, cipher_text=ct, max_key=24, _verbose=verbose)
+    ks = DoubleAESAttack.attack(plain_text=pt, cipher_text=ct, max_key=24, workers=workers, cache=cache,
+                                memory_budget=memory_budget, checkpoint=checkpoint, _verbose=verbose)
     if ks:
         print("\nKeys found:")
         print(f"\tk1: 0x{ks[0].hex}")
         print(f"\tk2: 0x{ks[1].hex}")
 
 
+@app.command("rainbow")
+def attack_rainbow(
+        max_key: int = typer.Option(20, help="Number of unknown leading key bits, at most 32"),
+        chain_length: int = typer.Option(256, help="Keys per chain: longer chains give smaller tables and slower "
+                                                   "lookups"),
+        chains: int = typer.Option(2 ** 13, help="Chains per table"),
+        tables: int = typer.Option(4, help="Number of independent tables"),
+        keys: int = typer.Option(10, help="Number of random keys to recover"),
+        directory: Optional[str] = typer.Option(None, help="Directory of the tables, reused between runs"),
+        workers: Optional[int] = typer.Option(None, help="Number of processes - default: number of cores"),
+        verbose: bool = typer.Option(False, help="Show debug logs")
+):
+    """
+    Example of the time-memory trade-off on single AES with reduced keys.\n
+    Rainbow tables are generated once for a fixed plain text (or loaded from the directory), then the keys of the
+    encryptions of that plain text under random keys are looked up in the tables.
+    """
+    pt = bytes(16)
+    rainbow_tables = generate_tables(pt, max_key=max_key, chain_length=chain_length, n_chains=chains,
+                                     n_tables=tables, workers=workers, directory=directory)
+    print(f"{tables} tables of {sum(len(t) for t in rainbow_tables)} chains in total")
+    found = 0
+    for _ in range(keys):
+        k = prepare_key(random.getrandbits(max_key), max_key=max_key).ascii_hex
+        ct = AES.new(k, AES.MODE_ECB).encrypt(pt)
+        found += crack(rainbow_tables, ct, _verbose=verbose) == k
+    print(f"\n{found}/{keys} keys recovered")
+
+
+@app.command("serve")
+def serve(
+        attack: str = typer.Argument(..., help="Attack to distribute: modifiedAES or AES-double-encryption"),
+        plain_text: str = typer.Option(..., help="128bits plain text in hexadecimal"),
+        cipher_text: str = typer.Option(..., help="128bits (double) encryption of the plain text in hexadecimal"),
+        max_key: int = typer.Option(24, help="Number of unknown leading bits of each key (AES-double-encryption)"),
+        host: str = typer.Option("0.0.0.0", help="Interface to listen on"),
+        port: int = typer.Option(DEFAULT_PORT, help="TCP port to listen on"),
+        lease_size: int = typer.Option(LEASE_SIZE, help="Keys per range handed to a worker"),
+        cache: bool = typer.Option(True, help="AES-double-encryption: the workers reuse the lookup table stored by a "
+                                              "previous run with the same plain text"),
+        verbose: bool = typer.Option(False, help="Show debug logs")
+):
+    """
+    Coordinator of a key search spread over several hosts.\n
+    Workers started with `crypto attacks work` connect to it and search the key ranges it hands out; the ranges of
+    workers that stop sending heartbeats are handed out again, and all workers stop once the key is found.
+    """
+    if verbose:
+        logging.getLogger("crypto_pkg.attacks.distributed").setLevel(logging.DEBUG)
+    pt, ct = bytes.fromhex(plain_text), bytes.fromhex(cipher_text)
+    with Coordinator(host=host, port=port, lease_size=lease_size) as coordinator:
+        if attack == "modifiedAES":
+            key = modified_aes_attack(coordinator, pt, ct)
+            found = get_hex(key) if key is not None else None
+        elif attack == "AES-double-encryption":
+            keys = double_aes_attack(coordinator, pt, ct, max_key=max_key, cache=cache)
+            found = f"k1: 0x{keys[0].hex}, k2: 0x{keys[1].hex}" if keys else None
+        else:
+            raise typer.BadParameter(f"Unknown attack {attack}")
+    print(f"\nKey found: {found}" if found else "\nNo key found")
+
+
+@app.command("work")
+def work(
+        host: str = typer.Option("127.0.0.1", help="Address of the coordinator"),
+        port: int = typer.Option(DEFAULT_PORT, help="Port of the coordinator"),
+        workers: Optional[int] = typer.Option(None, help="Number of processes - default: number of cores"),
+        verbose: bool = typer.Option(False, help="Show debug logs")
+):
+    """
+    Worker of a key search run by `crypto attacks serve`, searching the ranges it hands out until it shuts down.
+    """
+    if verbose:
+        logging.getLogger("crypto_pkg.attacks.distributed").setLevel(logging.DEBUG)
+    run_worker(host=host, port=port, workers=workers)
+
+
 @app.command("correlation-power-analysis")
 def attack_correlation_power_analysis(
         filename: str = typer.Argument('test_file.pickle',
                                        help="Filename of the pickle file with the measurements"),
         max_datapoints: Optional[int] = typer.Option(400, help="Maximum number of data points to consider"),
         byte_position: Optional[int] = typer.Option(None, help="Byte position to attack"),
+        batch_size: Optional[int] = typer.Option(
+            None, help="Attack online, updating the correlations with batches of this many traces"),
+        stable_batches: Optional[int] = typer.Option(
+            None, help="Online attack: stop once the key is unchanged for this many batches"),
         verbose: Optional[bool] = typer.Option(None, help="Show debug logs")
 ):
     """
@@ -182,6 +305,7 @@ def attack_correlation_power_analysis(
     The filename of the measurement file is required. This file mush be a valid pickle file with at leas
      'max_datapoints' datapoints
     If a byte position is provided, only the provided key byte will be attacked, otherwise the whole key will be.
+    With a batch size, the traces are read and correlated batch by batch, reporting the key after each batch.
     """
     with resources.open_binary('crypto_pkg.attacks.power_analysis', 'test_file.pickle') as file:
         content = file.read()
@@ -193,16 +317,30 @@ def attack_correlation_power_analysis(
         print(msg)
         raise Exception(f"File {msg}")
 
-    # Run the correlation attack on the provided byte position
-    attack = PowerAnalysisAttack(data_filename=filename, max_datapoints=max_datapoints)
-    if byte_position is not None:
-        key_byte = attack.attack_byte(byte_position=byte_position, plot=False,
-                                      store=False,
-                                      re_calculate=True, _verbose=verbose)
-        print(f"Key byte found: {hex(key_byte[1])[2:]}")
-    else:
-        key = attack.attack_full_key(store_correlation_matrices=False, re_calculate_correlation_matrices=False,
-                                     show_plot_correlations=False, _verbose=verbose)
-        print("Key Found")
-        print(key)
-    os.remove(filename)
+    try:
+        if batch_size is not None:
+            positions = range(16) if byte_position is None else [byte_position]
+            accumulator = CPAAccumulator(n_datapoints=max_datapoints, byte_positions=positions)
+            key_bytes, _ = accumulator.run(load_batches(filename, batch_size=batch_size, max_datapoints=max_datapoints),
+                                           stable_batches=stable_batches, _verbose=verbose)
+            if byte_position is not None:
+                print(f"Key byte found: {key_bytes[0]:02x}")
+            else:
+                print("Key Found")
+                print(bytes(key_bytes[::-1]).hex())
+            return
+
+        # Run the correlation attack on the provided byte position
+        attack = PowerAnalysisAttack(data_filename=filename, max_datapoints=max_datapoints)
+        if byte_position is not None:
+            key_byte = attack.attack_byte(byte_position=byte_position, plot=False,
+                                          store=False,
+                                          re_calculate=True, _verbose=verbose)
+            print(f"Key byte found: {hex(key_byte[1])[2:]}")
+        else:
+            key = attack.attack_full_key(store_correlation_matrices=False, re_calculate_correlation_matrices=False,
+                                         show_plot_correlations=False, _verbose=verbose)
+            print("Key Found")
+            print(key)
+    finally:
+        os.remove(filename)
@@ -0,0 +1,32 @@
+from typing import Optional
+
+import typer
+
+from crypto_pkg.benchmarks.suite import TOLERANCE, compare, load_report, run_suite, save_report
+
+
+def benchmark(
+        output: Optional[str] = typer.Option(None, help="Write the JSON report to this file"),
+        baseline: Optional[str] = typer.Option(None, help="JSON report of a previous run to compare with"),
+        tolerance: float = typer.Option(TOLERANCE, help="Relative slow-down over the baseline flagged as regression"),
+        match: Optional[str] = typer.Option(None, help="Only run the cases whose name contains this string"),
+        min_time: float = typer.Option(0.5, help="Minimum duration of each measurement in seconds")
+):
+    """
+    Measure the throughput of the AES engines (blocks/s, keys/s) for single blocks, batches, key search and key
+    schedules, pycryptodome included.\n
+    With --baseline, each case is compared with the previous run and the command fails if any case regressed.
+    """
+    report = run_suite(min_time=min_time, match=match)
+    if output:
+        save_report(report, output)
+    if not baseline:
+        for r in report["results"]:
+            typer.echo(f"{r['name']:>34}: {r['rate']:>14.0f} {r['unit']}")
+        return
+    rows = compare(report, load_report(baseline), tolerance=tolerance)
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        typer.echo(f"{row['name']:>34}: {row['rate']:>14.0f} vs {row['baseline']:>14.0f} (x{row['ratio']:.2f}){flag}")
+    if any(row["regression"] for row in rows):
+        raise typer.Exit(code=1)
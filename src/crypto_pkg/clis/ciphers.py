@@ -0,0 +1,57 @@
+from typing import Optional
+
+import typer
+
+from crypto_pkg.ciphers.symmetric.modes import Mode, decrypt_file, encrypt_file
+
+
+def _parse_hex(value: Optional[str], name: str) -> Optional[bytes]:
+    if value is None:
+        return None
+    try:
+        out = bytes.fromhex(value)
+    except ValueError:
+        raise typer.BadParameter(f"{name} must be an hexadecimal string")
+    if len(out) != 16:
+        raise typer.BadParameter(f"{name} must be 128 bits long (32 hexadecimal digits)")
+    return out
+
+
+def encrypt(
+        input_file: str = typer.Argument(..., help="File to encrypt"),
+        output_file: str = typer.Argument(..., help="Destination of the cipher text"),
+        key: str = typer.Option(..., help="128bits encryption key in hexadecimal"),
+        mode: Mode = typer.Option(Mode.CTR, help="Block cipher mode of operation"),
+        iv: Optional[str] = typer.Option(None, help="128bits IV in hexadecimal, random if not provided"),
+        workers: Optional[int] = typer.Option(None, help="Number of processes - default: number of cores")
+):
+    """
+    Encrypt a file with CustomAES in ECB, CBC or CTR mode.\n
+    The file is streamed through memory maps, so it does not need to fit in memory. In CBC and CTR modes the IV is
+    written at the beginning of the output file.
+    """
+    key, iv = _parse_hex(key, "key"), _parse_hex(iv, "iv")
+    try:
+        encrypt_file(in_path=input_file, out_path=output_file, key=key, mode=mode, iv=iv, workers=workers)
+    except ValueError as exc:
+        typer.echo(f"Error: {exc}", err=True)
+        raise typer.Exit(code=1)
+
+
+def decrypt(
+        input_file: str = typer.Argument(..., help="File to decrypt"),
+        output_file: str = typer.Argument(..., help="Destination of the plain text"),
+        key: str = typer.Option(..., help="128bits encryption key in hexadecimal"),
+        mode: Mode = typer.Option(Mode.CTR, help="Block cipher mode of operation used for the encryption"),
+        workers: Optional[int] = typer.Option(None, help="Number of processes - default: number of cores")
+):
+    """
+    Decrypt a file encrypted with the encrypt command.
+    """
+    key = _parse_hex(key, "key")
+    try:
+        decrypt_file(in_path=input_file, out_path=output_file, key=key, mode=mode, workers=workers)
+    except ValueError as exc:
+        # Wrong key or mode, or corrupted input
+        typer.echo(f"Error: {exc}", err=True)
+        raise typer.Exit(code=1)
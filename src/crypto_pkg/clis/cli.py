@@ -1,6 +1,11 @@
 import typer
 
 from crypto_pkg.clis.attacks import app as attacks
+from crypto_pkg.clis.benchmark import benchmark
+from crypto_pkg.clis.ciphers import decrypt, encrypt
 
 app = typer.Typer(pretty_exceptions_show_locals=False, no_args_is_help=True)
 app.add_typer(attacks, name='attacks')
+app.command('encrypt')(encrypt)
+app.command('decrypt')(decrypt)
+app.command('benchmark')(benchmark)
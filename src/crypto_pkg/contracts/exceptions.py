@@ -8,3 +8,7 @@ class PrimeNotGeneratedException(Exception):
 
 class KValueException(Exception):
     """ Raised when k is not an even number"""
+
+
+class IntegrityException(Exception):
+    """ Raised when a file read back from disk does not match its recorded checksum or format """
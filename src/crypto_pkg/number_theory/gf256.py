@@ -0,0 +1,83 @@
+import numpy as np
+
+# Arithmetic in GF(2^8) = GF(2)[x] / (x^8 + x^4 + x^3 + x + 1), the field of AES. All operations are table lookups
+# vectorized over uint8 NumPy arrays (scalars and lists are accepted too).
+
+POLYNOMIAL = 0x11b
+GENERATOR = 0x03
+
+
+def _exp_log_tables():
+    exp = np.zeros(510, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int64)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        # x * 3 = x * 2 ^ x
+        x ^= (x << 1) ^ (POLYNOMIAL if x & 0x80 else 0)
+    exp[255:] = exp[:255]
+    return exp, log
+
+
+EXP_TABLE, LOG_TABLE = _exp_log_tables()
+
+# MUL_TABLE[a, b] = a * b
+_a, _b = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+MUL_TABLE = np.where((_a == 0) | (_b == 0), 0, EXP_TABLE[LOG_TABLE[_a] + LOG_TABLE[_b]]).astype(np.uint8)
+del _a, _b
+
+# INV_TABLE[a] = a^-1, with the AES convention 0^-1 = 0
+INV_TABLE = np.concatenate(([0], EXP_TABLE[(255 - LOG_TABLE[1:]) % 255])).astype(np.uint8)
+
+# POW_TABLE[a, e] = a^e for 0 <= e < 256, with 0^0 = 1
+_a, _e = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+POW_TABLE = np.where(_a == 0, (_e == 0).astype(np.uint8), EXP_TABLE[(LOG_TABLE[_a] * _e) % 255]).astype(np.uint8)
+del _a, _e
+
+
+def mul(a, b) -> np.ndarray:
+    """ Element-wise product of a and b (broadcast) """
+    return MUL_TABLE[np.asarray(a, dtype=np.uint8), np.asarray(b, dtype=np.uint8)]
+
+
+def inv(a) -> np.ndarray:
+    """ Element-wise multiplicative inverse, 0 being mapped to 0 """
+    return INV_TABLE[np.asarray(a, dtype=np.uint8)]
+
+
+def power(a, e) -> np.ndarray:
+    """ Element-wise a^e for integer exponents e >= 0 """
+    e = np.asarray(e, dtype=np.int64)
+    # a^e = a^(e mod 255) for a != 0, while 0^e = 0 for e > 0
+    reduced = np.where(e == 0, 0, (e - 1) % 255 + 1)
+    return POW_TABLE[np.asarray(a, dtype=np.uint8), reduced]
+
+
+def matvec(matrix, vectors) -> np.ndarray:
+    """
+    Matrix-vector products over GF(2^8)
+
+    Args:
+        matrix: (m, n) array
+        vectors: (..., n) array, one vector per row
+    Returns:
+        (..., m) array of matrix . vector
+    """
+    matrix = np.asarray(matrix, dtype=np.uint8)
+    vectors = np.asarray(vectors, dtype=np.uint8)
+    products = MUL_TABLE[matrix, vectors[..., None, :]]
+    return np.bitwise_xor.reduce(products, axis=-1)
+
+
+def mat_mul(a, b) -> np.ndarray:
+    """
+    Matrix product over GF(2^8)
+
+    Args:
+        a: (m, n) array
+        b: (n, p) array
+    Returns:
+        (m, p) array a . b
+    """
+    return matvec(a, np.asarray(b, dtype=np.uint8).T).T
@@ -1,5 +1,11 @@
 import logging
+import os
 
 log_level = logging.INFO
 
 logging.basicConfig(level=log_level)
+
+# Directory of the results cached on disk (e.g. S-box tables, meet-in-the-middle tables)
+cache_dir = os.environ.get("CRYPTO_PKG_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "crypto_pkg"))
+# Size above which the least recently used meet-in-the-middle tables are evicted from the cache
+mitm_cache_size = int(os.environ.get("CRYPTO_PKG_MITM_CACHE_SIZE", 4 * 2 ** 30))
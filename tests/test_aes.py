@@ -0,0 +1,78 @@
+import random
+import unittest
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import (CustomAES, ExpandedKey, array_to_matrix, clear_key_cache, expand_key,
+                                              get_array_from_state, key_cache_info)
+
+# (key, plain text, cipher text) produced by the reference list-matrix implementation of CustomAES
+KNOWN_ANSWERS = [
+    ('000102030405060708090a0b0c0d0e0f', '00112233445566778899aabbccddeeff', '435da65ea7bada84c5b34e4fde124354'),
+    ('2b7e151628aed2a6abf7158809cf4f3c', '3243f6a8885a308d313198a2e0370734', '170197eae7fd1399e485cab7faa2143c'),
+]
+
+
+def reference_encrypt(aes, plain_text, key):
+    ks = aes.generate_keys(base_key=key)
+    pn = get_array_from_state(aes.aes_add_round_key(array_to_matrix(plain_text), ks[0]))
+    for i in range(1, 10):
+        pn = aes.aes_round_trans(plain_text=pn, round_key=ks[i])
+    return aes.aes_round_trans(plain_text=pn, round_key=ks[-1], last=True)
+
+
+class TestCustomAES(unittest.TestCase):
+
+    def test_known_answers(self):
+        aes = CustomAES()
+        for key, plain_text, cipher_text in KNOWN_ANSWERS:
+            k, p, c = list(bytes.fromhex(key)), list(bytes.fromhex(plain_text)), list(bytes.fromhex(cipher_text))
+            self.assertEqual(aes.encrypt(plain_text=p, key=k), c)
+            self.assertEqual(aes.decrypt(cipher_text=c, key=k), p)
+
+    def test_table_engine_matches_reference_rounds(self):
+        aes = CustomAES()
+        rng = random.Random(0)
+        for _ in range(20):
+            k = [rng.getrandbits(8) for _ in range(16)]
+            p = [rng.getrandbits(8) for _ in range(16)]
+            c = aes.encrypt(plain_text=p, key=k)
+            self.assertEqual(c, reference_encrypt(aes, p, k))
+            self.assertEqual(aes.decrypt(cipher_text=c, key=k), p)
+
+    def test_batch_matches_single_block(self):
+        aes = CustomAES()
+        rng = np.random.default_rng(1)
+        key = list(bytes.fromhex(KNOWN_ANSWERS[1][0]))
+        blocks = rng.integers(0, 256, size=(64, 16), dtype=np.uint8)
+        cipher_texts = aes.encrypt_blocks(blocks, key)
+        self.assertEqual(cipher_texts.shape, (64, 16))
+        self.assertEqual(cipher_texts.dtype, np.uint8)
+        for block, cipher_text in zip(blocks, cipher_texts):
+            self.assertEqual(list(cipher_text), aes.encrypt(plain_text=list(block), key=key))
+        np.testing.assert_array_equal(aes.decrypt_blocks(cipher_texts, key), blocks)
+
+    def test_batch_rejects_bad_shape(self):
+        with self.assertRaises(ValueError):
+            CustomAES().encrypt_blocks(np.zeros((4, 8), dtype=np.uint8), [0] * 16)
+
+    def test_expanded_key(self):
+        aes = CustomAES()
+        key, plain_text, cipher_text = (list(bytes.fromhex(item)) for item in KNOWN_ANSWERS[0])
+        expanded_key = ExpandedKey(key)
+        self.assertEqual(len(expanded_key.round_keys), 176)
+        self.assertEqual([list(expanded_key.round_keys[16 * r:16 * r + 16]) for r in range(11)],
+                         [get_array_from_state(m) for m in aes.generate_keys(base_key=key)])
+        self.assertEqual(aes.encrypt(plain_text=plain_text, key=expanded_key), cipher_text)
+        self.assertEqual(aes.decrypt(cipher_text=cipher_text, key=expanded_key), plain_text)
+
+    def test_key_cache(self):
+        clear_key_cache()
+        key = bytes(range(16))
+        first = expand_key(key)
+        self.assertIs(expand_key(list(key)), first)
+        self.assertIs(expand_key(first), first)
+        info = key_cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+        CustomAES().decrypt(cipher_text=[0] * 16, key=key)
+        self.assertEqual(key_cache_info().hits, 2)
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import CustomAES, reversed_box, sbox_table
+from crypto_pkg.ciphers.symmetric.aes_bitsliced import BitslicedAES, inv_sbox_circuit, sbox_circuit
+from crypto_pkg.ciphers.symmetric.aes_hooks import StateRecorder
+
+
+def bits(x):
+    return [(x >> (7 - i)) & 1 for i in range(8)]
+
+
+def value(planes):
+    return sum(b << (7 - i) for i, b in enumerate(planes))
+
+
+class TestBitslicedAES(unittest.TestCase):
+
+    def test_sbox_circuits(self):
+        for x in range(256):
+            self.assertEqual(value(sbox_circuit(*bits(x), ones=1)), sbox_table[x])
+            self.assertEqual(value(inv_sbox_circuit(bits(x), ones=1)), reversed_box[x])
+
+    def test_matches_table_engine(self):
+        rng = np.random.default_rng(2)
+        key = list(rng.integers(0, 256, size=16))
+        blocks = rng.integers(0, 256, size=(200, 16), dtype=np.uint8)
+        expected = CustomAES().encrypt_blocks(blocks, key)
+        for lanes, width in [('int', 64), ('int', 1000), ('uint64', 128)]:
+            with self.subTest(lanes=lanes, width=width):
+                aes = BitslicedAES(width=width, lanes=lanes)
+                cipher_texts = aes.encrypt_blocks(blocks, key)
+                np.testing.assert_array_equal(cipher_texts, expected)
+                np.testing.assert_array_equal(aes.decrypt_blocks(cipher_texts, key), blocks)
+
+    def test_single_block_contract(self):
+        aes = BitslicedAES(width=64)
+        key, plain_text = list(range(16)), list(range(16, 32))
+        cipher_text = aes.encrypt(plain_text=plain_text, key=key)
+        self.assertEqual(cipher_text, CustomAES().encrypt(plain_text=plain_text, key=key))
+        self.assertTrue(all(type(x) is int for x in cipher_text + aes.decrypt(cipher_text=cipher_text, key=key)))
+        self.assertEqual(CustomAES().decrypt(cipher_text=cipher_text, key=key), plain_text)
+        self.assertEqual(aes.decrypt(cipher_text=cipher_text, key=key), plain_text)
+
+    def test_hooks(self):
+        key, blocks = list(range(16)), np.arange(64, dtype=np.uint8).reshape(4, 16)
+        recorder, traced = StateRecorder(n_blocks=5), StateRecorder(n_blocks=5)
+        aes = BitslicedAES(width=64)
+        aes.register_hook(recorder)
+        reference = CustomAES(hooks=[traced])
+        np.testing.assert_array_equal(aes.encrypt_blocks(blocks, key), reference.encrypt_blocks(blocks, key))
+        self.assertEqual(aes.encrypt(list(blocks[0]), key), reference.encrypt(list(blocks[0]), key))
+        np.testing.assert_array_equal(recorder.buffer, traced.buffer)
+        self.assertEqual(recorder.count, 5)
+        aes.remove_hook(recorder)
+        aes.encrypt_blocks(blocks, key)
+        self.assertEqual(recorder.count, 5)
+
+    def test_invalid_width(self):
+        with self.assertRaises(ValueError):
+            BitslicedAES(width=100, lanes='uint64')
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import unittest
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import CustomAES, array_to_matrix, get_array_from_state
+from crypto_pkg.ciphers.symmetric.aes_hooks import (AESHook, HammingWeightRecorder, PrintHook, StateRecorder,
+                                                    schedule)
+
+
+class EventLog(AESHook):
+
+    def __init__(self):
+        self.events = []
+
+    def after_sub_bytes(self, round_index, state):
+        self.events.append((round_index, 'sub_bytes'))
+
+    def after_shift_rows(self, round_index, state):
+        self.events.append((round_index, 'shift_rows'))
+
+    def after_mix_columns(self, round_index, state):
+        self.events.append((round_index, 'mix_columns'))
+
+    def after_add_round_key(self, round_index, state):
+        self.events.append((round_index, 'add_round_key'))
+
+
+class TestAESHooks(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.key = list(rng.integers(0, 256, size=16))
+        self.blocks = rng.integers(0, 256, size=(32, 16), dtype=np.uint8)
+
+    def test_no_output_without_hooks(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            CustomAES().encrypt(plain_text=list(self.blocks[0]), key=self.key)
+        self.assertEqual(out.getvalue(), '')
+
+    def test_hooks_do_not_change_results(self):
+        log = EventLog()
+        traced = CustomAES(hooks=[log])
+        expected = CustomAES().encrypt_blocks(self.blocks, self.key)
+        np.testing.assert_array_equal(traced.encrypt_blocks(self.blocks, self.key), expected)
+        self.assertEqual(traced.encrypt(plain_text=list(self.blocks[0]), key=self.key), list(expected[0]))
+        self.assertEqual(log.events, schedule() * 2)
+
+    def test_print_hook(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            CustomAES(hooks=[PrintHook()]).encrypt(plain_text=list(range(16)), key=self.key)
+        self.assertTrue(out.getvalue().startswith("plaintext : \n0x000102030405060708090a0b0c0d0e0f\n"))
+
+    def test_state_recorder(self):
+        recorder = StateRecorder(n_blocks=64, operations=['sub_bytes'], rounds=[1])
+        aes = CustomAES(hooks=[recorder])
+        aes.encrypt_blocks(self.blocks, self.key)
+        aes.encrypt_blocks(self.blocks, self.key)
+        self.assertEqual(recorder.count, 64)
+        self.assertEqual(recorder.events, [(1, 'sub_bytes')])
+        first_key = array_to_matrix(self.key)
+        for block, recorded in zip(self.blocks, recorder.buffer[:32, 0]):
+            state = aes.aes_add_round_key(array_to_matrix(list(block)), first_key)
+            self.assertEqual(list(recorded), get_array_from_state(aes.aes_sub_bytes(state)))
+        with self.assertRaises(ValueError):
+            aes.encrypt_blocks(self.blocks[:1], self.key)
+
+    def test_hamming_weight_recorder(self):
+        states = StateRecorder(n_blocks=32, operations=['sub_bytes', 'mix_columns'])
+        weights = HammingWeightRecorder(n_blocks=32, operations=['sub_bytes', 'mix_columns'])
+        CustomAES(hooks=[states, weights]).encrypt_blocks(self.blocks, self.key)
+        self.assertEqual(weights.traces.shape, (32, 19))
+        expected = np.unpackbits(states.buffer, axis=2).sum(axis=2)
+        np.testing.assert_array_equal(weights.traces, expected)
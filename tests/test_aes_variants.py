@@ -0,0 +1,127 @@
+import unittest
+
+import numpy as np
+from Crypto.Cipher import AES
+
+from crypto_pkg.attacks.block_ciphers.modified_aes import ModifiedAES
+from crypto_pkg.ciphers.symmetric.aes import CustomAES, array_to_matrix, expand_key, get_array_from_state
+from crypto_pkg.ciphers.symmetric.aes_hooks import StateRecorder
+from crypto_pkg.ciphers.symmetric.aes_variants import (KEY_CHUNK, MODIFIED_AES, STANDARD_AES, AESVariant,
+                                                       CompiledVariant, KeySchedule, VariantAES, compile_variant,
+                                                       pack_blocks, unpack_blocks)
+
+
+def reference_modified_encrypt(aes, plain_text, key):
+    ks = array_to_matrix(key)
+    pn = get_array_from_state(aes.aes_add_round_key(array_to_matrix(plain_text), ks))
+    for _ in range(1, 10):
+        pn = aes.aes_round_trans(plain_text=pn, round_key=ks)
+    return aes.aes_round_trans(plain_text=pn, round_key=ks, last=True)
+
+
+class TestAESVariants(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.key = rng.integers(0, 256, size=16, dtype=np.uint8).tolist()
+        self.blocks = rng.integers(0, 256, size=(16, 16), dtype=np.uint8)
+
+    def assert_round_trip(self, aes):
+        cipher_texts = aes.encrypt_blocks(self.blocks, self.key)
+        for block, cipher_text in zip(self.blocks, cipher_texts):
+            self.assertEqual(aes.encrypt(plain_text=block.tolist(), key=self.key), cipher_text.tolist())
+            self.assertEqual(aes.decrypt(cipher_text=cipher_text.tolist(), key=self.key), block.tolist())
+        np.testing.assert_array_equal(aes.decrypt_blocks(cipher_texts, self.key), self.blocks)
+        return cipher_texts
+
+    def test_default_variant_is_custom_aes(self):
+        cipher_texts = self.assert_round_trip(VariantAES())
+        np.testing.assert_array_equal(cipher_texts, CustomAES().encrypt_blocks(self.blocks, self.key))
+
+    def test_standard_variant_matches_pycryptodome(self):
+        cipher_texts = self.assert_round_trip(VariantAES(STANDARD_AES))
+        cipher = AES.new(bytes(self.key), AES.MODE_ECB)
+        self.assertEqual(cipher_texts.tobytes(), cipher.encrypt(self.blocks.tobytes()))
+
+    def test_modified_aes(self):
+        aes = ModifiedAES()
+        cipher_texts = self.assert_round_trip(aes)
+        for block, cipher_text in zip(self.blocks[:4], cipher_texts):
+            self.assertEqual(reference_modified_encrypt(aes, block.tolist(), self.key), cipher_text.tolist())
+
+    def test_other_variants_round_trip(self):
+        for variant in [AESVariant(rounds=4), AESVariant(rounds=1), AESVariant(rounds=5, final_mix_columns=True),
+                        AESVariant(sub_bytes=False, key_schedule=KeySchedule.FIPS197),
+                        AESVariant(rounds=12, mix_columns=False, key_schedule=KeySchedule.REPEAT)]:
+            with self.subTest(variant=variant):
+                self.assert_round_trip(VariantAES(variant))
+
+    def test_reduced_rounds_match_full_cipher_state(self):
+        recorder = StateRecorder(n_blocks=16, operations=['add_round_key'], rounds=[3])
+        CustomAES(hooks=[recorder]).encrypt_blocks(self.blocks, self.key)
+        three = VariantAES(AESVariant(rounds=3, final_mix_columns=True))
+        np.testing.assert_array_equal(three.encrypt_blocks(self.blocks, self.key), recorder.buffer[:, 0])
+
+    def test_hooks_follow_variant(self):
+        recorder = StateRecorder(n_blocks=16, variant=MODIFIED_AES)
+        aes = ModifiedAES(hooks=[recorder])
+        cipher_texts = aes.encrypt_blocks(self.blocks, self.key)
+        np.testing.assert_array_equal(cipher_texts, ModifiedAES().encrypt_blocks(self.blocks, self.key))
+        self.assertNotIn('shift_rows', [op for _, op in recorder.events])
+        np.testing.assert_array_equal(recorder.buffer[:, -1], cipher_texts)
+
+    def test_expanded_keys(self):
+        standard, custom = VariantAES(STANDARD_AES), VariantAES()
+        self.assertIs(standard.expand_key(self.key), standard.expand_key(self.key))
+        self.assertNotEqual(standard.expand_key(self.key), custom.expand_key(self.key))
+        # CustomAES and its default variant share the key schedule
+        self.assertEqual(custom.expand_key(expand_key(self.key)), custom.expand_key(self.key))
+        with self.assertRaises(ValueError):
+            standard.expand_key(custom.expand_key(self.key))
+        with self.assertRaises(ValueError):
+            VariantAES(AESVariant(mix_columns=False)).decrypt_blocks(self.blocks, custom.expand_key(self.key))
+        # Each compiled variant has its own cache
+        first, second = CompiledVariant(AESVariant(rounds=3)), CompiledVariant(AESVariant(rounds=3))
+        first.expand_key(bytes(16))
+        self.assertEqual(first.expand_key.cache_info().currsize, 1)
+        self.assertEqual(second.expand_key.cache_info().currsize, 0)
+
+    def test_invalid_variants(self):
+        with self.assertRaises(ValueError):
+            compile_variant(AESVariant(rounds=11))
+        with self.assertRaises(ValueError):
+            compile_variant(AESVariant(rounds=0))
+
+
+class TestManyKeys(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.keys = rng.integers(0, 256, size=(KEY_CHUNK + 3, 16), dtype=np.uint8)
+        self.block = bytes(range(16))
+
+    def test_matches_single_key(self):
+        for aes in [VariantAES(), VariantAES(STANDARD_AES), ModifiedAES(),
+                    VariantAES(AESVariant(rounds=5, final_mix_columns=True))]:
+            with self.subTest(variant=aes.variant):
+                cipher_texts = aes.encrypt_under_keys(self.block, self.keys)
+                plain_texts = aes.decrypt_under_keys(self.block, self.keys)
+                for i in [0, 1, KEY_CHUNK - 1, KEY_CHUNK, KEY_CHUNK + 2]:
+                    key = self.keys[i].tolist()
+                    self.assertEqual(cipher_texts[i].tolist(), aes.encrypt(plain_text=list(self.block), key=key))
+                    self.assertEqual(plain_texts[i].tolist(), aes.decrypt(cipher_text=list(self.block), key=key))
+
+    def test_standard_matches_pycryptodome(self):
+        cipher_texts = VariantAES(STANDARD_AES).encrypt_under_keys(self.block, self.keys[:50])
+        for key, cipher_text in zip(self.keys[:50], cipher_texts):
+            self.assertEqual(cipher_text.tobytes(), AES.new(key.tobytes(), AES.MODE_ECB).encrypt(self.block))
+
+    def test_packed_output(self):
+        aes = VariantAES()
+        keys = [bytes([i]) * 16 for i in range(10)]
+        packed = aes.encrypt_under_keys(self.block, keys, packed=True)
+        self.assertEqual((packed.shape, packed.dtype), ((10, 2), np.uint64))
+        cipher_texts = aes.encrypt_under_keys(self.block, keys)
+        np.testing.assert_array_equal(unpack_blocks(packed), cipher_texts)
+        np.testing.assert_array_equal(pack_blocks(cipher_texts), packed)
+        self.assertEqual(int(packed[3, 0]) << 64 | int(packed[3, 1]), int.from_bytes(cipher_texts[3].tobytes(), 'big'))
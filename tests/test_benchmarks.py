@@ -0,0 +1,37 @@
+import json
+import os
+import tempfile
+import unittest
+
+from typer.testing import CliRunner
+
+from crypto_pkg.benchmarks.suite import compare, load_report, run_suite, save_report
+from crypto_pkg.clis.cli import app
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_report(self):
+        report = run_suite(min_time=0.01, match="key_search", batch_size=16, n_keys=16)
+        self.assertEqual({r["shape"] for r in report["results"]}, {"key_search"})
+        self.assertIn("pycryptodome/key_search", [r["name"] for r in report["results"]])
+        self.assertTrue(all(r["rate"] > 0 for r in report["results"]))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            save_report(report, path)
+            self.assertEqual(load_report(path), json.loads(json.dumps(report)))
+
+    def test_compare(self):
+        baseline = {"results": [{"name": "a", "rate": 100.}, {"name": "b", "rate": 100.}, {"name": "c", "rate": 1.}]}
+        report = {"results": [{"name": "a", "rate": 90.}, {"name": "b", "rate": 50.}, {"name": "d", "rate": 1.}]}
+        rows = compare(report, baseline, tolerance=0.15)
+        self.assertEqual([(row["name"], row["regression"]) for row in rows], [("a", False), ("b", True)])
+
+    def test_cli_flags_regressions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            save_report({"results": [{"name": "pycryptodome/single", "rate": 1e12}]}, baseline)
+            result = CliRunner().invoke(app, ["benchmark", "--match", "pycryptodome/single", "--min-time", "0.01",
+                                              "--baseline", baseline])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("REGRESSION", result.output)
@@ -0,0 +1,102 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from crypto_pkg.attacks.power_analysis.correlation_power_analysis import Attack, CPAAccumulator, load, \
+    load_batches, pearson_matrix, plain_text_bytes
+from crypto_pkg.ciphers.symmetric.aes import sbox_table
+
+HW_SBOX = np.array([bin(v).count('1') for v in sbox_table])
+
+
+def write_traces(path, key, n_traces=300, n_samples=24, seed=0):
+    """ Simulated measurements: sample b leaks the Hamming weight of SBOX(key byte b ^ plain text byte b) """
+    rng = np.random.default_rng(seed)
+    plain_texts = rng.integers(0, 256, size=(n_traces, 16), dtype=np.uint8)
+    traces = rng.normal(size=(n_traces, n_samples))
+    # Byte position b is the b-th least significant byte of the plain text integer
+    traces[:, :16] += HW_SBOX[plain_texts[:, ::-1] ^ np.frombuffer(key, dtype=np.uint8)[::-1]]
+    with open(path, 'wb') as f:
+        pickle.dump(([int.from_bytes(p.tobytes(), 'big') for p in plain_texts], list(traces)), f)
+
+
+class TestCorrelationPowerAnalysis(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.key = bytes(range(0x30, 0x40))
+        cls.path = os.path.join(cls.directory.name, "traces.pickle")
+        write_traces(cls.path, cls.key)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_pearson_matrix(self):
+        rng = np.random.default_rng(1)
+        x, y = rng.normal(size=(7, 300)), rng.normal(size=(11, 300))
+        y[3] = 2.5
+        with np.errstate(invalid='ignore'):
+            expected = np.corrcoef(x, y)[:7, 7:]
+        expected[:, 3] = 0
+        np.testing.assert_allclose(pearson_matrix(x, y, tile=4), expected, atol=1e-12)
+        np.testing.assert_allclose(pearson_matrix(x, y, dtype=np.float32, tile=5), expected, atol=1e-5)
+        self.assertAlmostEqual(Attack.calculate_pearson_coefficient(x[0], y[0]), expected[0, 0])
+
+    def test_predicted_currents(self):
+        plain_texts = plain_text_bytes([0x000102030405060708090a0b0c0d0e0f, 2 ** 128 - 1, 0x42])
+        self.assertEqual(plain_texts.tolist()[0], list(range(15, -1, -1)))
+        predicted = Attack.generate_predicted_currents(plain_texts)
+        self.assertEqual((predicted.shape, predicted.dtype), ((16, 256, 3), np.uint8))
+        for byte_position in (0, 9):
+            p = Attack.generate_predicted_currents(plain_texts, byte_position=byte_position)
+            np.testing.assert_array_equal(p, predicted[byte_position])
+            self.assertEqual(p[0x2b, 2], bin(sbox_table[0x2b ^ plain_texts[2, byte_position]]).count('1'))
+        self.assertEqual(Attack.predict_current(key_byte=0x2b, plaintext_byte=0x42), HW_SBOX[0x2b ^ 0x42])
+
+    def test_attack_byte(self):
+        attack = Attack(data_filename=self.path, max_datapoints=24)
+        self.assertEqual(attack.measurements.shape, (24, 300))
+        self.assertEqual(attack.plain_texts.shape, (300, 16))
+        for byte_position in (0, 7, 15):
+            _, key_byte = attack.attack_byte(byte_position=byte_position, store=False, re_calculate=True)
+            self.assertEqual(key_byte, self.key[15 - byte_position])
+
+    def test_online(self):
+        plain_texts, measurements = load(self.path, max_datapoints=20)
+        batches = list(load_batches(self.path, batch_size=64, max_datapoints=20))
+        self.assertEqual([len(p) for p, _ in batches], [64, 64, 64, 64, 44])
+        whole = CPAAccumulator(20, byte_positions=[2, 5])
+        for batch in batches:
+            whole.update(*batch)
+        for i, byte_position in enumerate((2, 5)):
+            expected = pearson_matrix(Attack.generate_predicted_currents(plain_texts, byte_position), measurements)
+            np.testing.assert_allclose(whole.correlation()[i], expected, atol=1e-9)
+        # Accumulators of separate halves of the traces, merged
+        first, second = CPAAccumulator(20, byte_positions=[2, 5]), CPAAccumulator(20, byte_positions=[2, 5])
+        for i, batch in enumerate(batches):
+            (first if i % 2 else second).update(*batch)
+        merged = first.merge(second)
+        self.assertEqual(merged.n, 300)
+        np.testing.assert_allclose(merged.correlation(), whole.correlation(), atol=1e-9)
+        with self.assertRaises(ValueError):
+            merged.merge(CPAAccumulator(20, byte_positions=[2]))
+
+    def test_online_run(self):
+        reports = []
+        accumulator = CPAAccumulator(24)
+        key_bytes, peaks = accumulator.run(load_batches(self.path, batch_size=50, max_datapoints=24),
+                                           stable_batches=2, on_batch=lambda n, k, c: reports.append(n))
+        self.assertEqual(bytes(key_bytes[::-1]), self.key)
+        self.assertTrue((peaks > .5).all())
+        # Stopped once the key bytes were unchanged for 2 batches
+        self.assertEqual(reports, [50, 100, 150])
+        self.assertEqual(accumulator.n, 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import socket
+import threading
+import time
+import unittest
+from multiprocessing import get_context
+from unittest import mock
+
+from Crypto.Cipher import AES
+
+from crypto_pkg.attacks.block_ciphers.modified_aes import ModifiedAES, column_encrypt
+from crypto_pkg.attacks.block_ciphers.utils import prepare_key
+from crypto_pkg.attacks.distributed import RUNNERS, Coordinator, Job, double_aes_attack, modified_aes_attack, \
+    run_worker
+
+
+def start_workers(coordinator, n):
+    # Forking while the coordinator threads hold locks can deadlock the children
+    spawn = get_context("spawn")
+    workers = [spawn.Process(target=run_worker, args=coordinator.address, kwargs={"workers": 1}) for _ in range(n)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+class SlowRunner:
+    """ Runner taking several lease timeouts to set up, as when a worker builds a large MITM table """
+    runs = []
+
+    def __init__(self, params, workers):
+        time.sleep(1.5)
+
+    def run(self, first, count, workers, stop):
+        self.runs.append(first)
+        # Gives up, as a search does, if a heartbeat is answered by stop meanwhile
+        return None if stop.wait(.5) else first + 7
+
+    def close(self):
+        pass
+
+
+class TestDistributed(unittest.TestCase):
+
+    def coordinator(self, lease_size):
+        return Coordinator("127.0.0.1", 0, lease_size=lease_size, heartbeat=.2, lease_timeout=.6)
+
+    def assert_stopped(self, workers):
+        for worker in workers:
+            worker.join(timeout=30)
+            self.assertEqual(worker.exitcode, 0)
+
+    def test_modified_aes(self):
+        key = bytes.fromhex('00000001000000100000000000000a01')
+        plain_text = bytes(range(16))
+        cipher_text = bytes(ModifiedAES().encrypt(plain_text=list(plain_text), key=list(key)))
+        with self.coordinator(lease_size=1 << 14) as coordinator:
+            workers = start_workers(coordinator, 3)
+            found = modified_aes_attack(coordinator, plain_text, cipher_text, batch_size=1 << 12)
+        self.assertEqual(found, int.from_bytes(key, 'big'))
+        self.assert_stopped(workers)
+
+    def test_double_aes(self):
+        k1, k2 = prepare_key(700, max_key=10), prepare_key(900, max_key=10)
+        plain_text = bytes(range(16))
+        cipher_text = AES.new(k2.ascii_hex, AES.MODE_ECB).encrypt(
+            AES.new(k1.ascii_hex, AES.MODE_ECB).encrypt(plain_text))
+        with self.coordinator(lease_size=128) as coordinator:
+            workers = start_workers(coordinator, 2)
+            keys = double_aes_attack(coordinator, plain_text, cipher_text, max_key=10)
+        self.assertEqual((keys[0].hex, keys[1].hex), (k1.hex, k2.hex))
+        self.assert_stopped(workers)
+
+    def test_dead_worker(self):
+        key_word = 0x1234
+        job = Job("modified-aes-column", {"word": 0x01020304, "target": column_encrypt(0x01020304, key_word),
+                                          "batch_size": 1 << 12}, 1 << 20)
+        with self.coordinator(lease_size=1 << 16) as coordinator:
+            results = []
+            search = threading.Thread(target=lambda: results.append(coordinator.run(job)))
+            search.start()
+            # A worker takes the range holding the key, then never sends a heartbeat
+            dead = socket.create_connection(coordinator.address)
+            stream = dead.makefile('rwb')
+            lease = {"type": "wait"}
+            while lease["type"] != "lease":
+                stream.write(json.dumps({"type": "request"}).encode() + b"\n")
+                stream.flush()
+                lease = json.loads(stream.readline())
+                time.sleep(.05)
+            self.assertEqual(lease["first"], 0)
+            workers = start_workers(coordinator, 1)
+            search.join(timeout=60)
+            dead.close()
+        self.assertEqual(results, [key_word])
+        self.assert_stopped(workers)
+
+    def test_slow_runner_keeps_its_lease(self):
+        SlowRunner.runs.clear()
+        with mock.patch.dict(RUNNERS, {"slow": SlowRunner}), self.coordinator(lease_size=100) as coordinator:
+            worker = threading.Thread(target=run_worker, args=coordinator.address, kwargs={"workers": 1})
+            worker.start()
+            self.assertEqual(coordinator.run(Job("slow", {}, 100)), 7)
+        worker.join(timeout=30)
+        # Heartbeats were sent while the runner was built, so the lease was not handed out again
+        self.assertEqual(SlowRunner.runs, [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from Crypto.Cipher import AES
+
+from crypto_pkg.attacks.block_ciphers.double_encryption import DoubleAESAttack
+from crypto_pkg.attacks.block_ciphers.external_mitm import RECORD, ExternalMITM, merge_join, merge_runs
+from crypto_pkg.attacks.block_ciphers.utils import prepare_key
+
+
+def records(fingerprints, keys):
+    out = np.empty(len(fingerprints), dtype=RECORD)
+    out['fingerprint'], out['key'] = fingerprints, keys
+    return out[np.argsort(out['fingerprint'], kind='stable')]
+
+
+def blocks(array, size):
+    return iter([array[i:i + size] for i in range(0, len(array), size)])
+
+
+class TestExternalMITM(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_merge_runs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            fingerprints = self.rng.integers(0, 500, size=3000, dtype=np.uint64)
+            paths = []
+            for i, start in enumerate(range(0, 3000, 700)):
+                paths.append(os.path.join(directory, f"{i}.run"))
+                records(fingerprints[start:start + 700], np.arange(start, min(start + 700, 3000))).tofile(paths[-1])
+            merged = np.concatenate(list(merge_runs(paths, block=64)))
+        np.testing.assert_array_equal(merged['fingerprint'], np.sort(fingerprints))
+        self.assertEqual(sorted(merged['key'].tolist()), list(range(3000)))
+
+    def test_merge_join(self):
+        a = records(self.rng.integers(0, 300, size=1000, dtype=np.uint64), np.arange(1000))
+        b = records(self.rng.integers(0, 300, size=800, dtype=np.uint64), np.arange(800))
+        pairs = set()
+        for left, right in merge_join(blocks(a, 37), blocks(b, 51)):
+            pairs.update(zip(left.tolist(), right.tolist()))
+        expected = {(int(x['key']), int(y['key'])) for x in a for y in b if x['fingerprint'] == y['fingerprint']}
+        self.assertEqual(pairs, expected)
+
+    def test_attack(self):
+        p = bytes(range(16))
+        k1, k2 = prepare_key(1000, max_key=13), prepare_key(8000, max_key=13)
+        c = AES.new(k2.ascii_hex, AES.MODE_ECB).encrypt(AES.new(k1.ascii_hex, AES.MODE_ECB).encrypt(p))
+        attack = ExternalMITM(p, c, max_key=13, memory_budget=2 ** 16)
+        self.assertGreater(2 ** 13, attack.run_size)
+        self.assertEqual(list(attack.matches()), [(1000, 8000)])
+        keys = DoubleAESAttack.attack(plain_text=p.hex(), cipher_text=c.hex(), max_key=13, memory_budget=2 ** 16)
+        self.assertEqual((keys[0].hex, keys[1].hex), (k1.hex, k2.hex))
@@ -0,0 +1,32 @@
+import unittest
+
+import numpy as np
+
+from crypto_pkg.ciphers.symmetric.aes import gf256_mul
+from crypto_pkg.number_theory import gf256
+
+
+class TestGF256(unittest.TestCase):
+
+    def test_mul_matches_log_antilog(self):
+        a, b = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+        expected = [[gf256_mul(x, y) for y in range(256)] for x in range(256)]
+        np.testing.assert_array_equal(gf256.mul(a, b), expected)
+
+    def test_inverse_and_power(self):
+        a = np.arange(1, 256)
+        np.testing.assert_array_equal(gf256.mul(a, gf256.inv(a)), 1)
+        self.assertEqual(int(gf256.inv(0)), 0)
+        np.testing.assert_array_equal(gf256.power(a, 254), gf256.inv(a))
+        np.testing.assert_array_equal(gf256.power(a, 255), 1)
+        np.testing.assert_array_equal(gf256.power(a, 257), gf256.mul(a, a))
+        self.assertEqual(int(gf256.power(0, 0)), 1)
+        self.assertEqual(int(gf256.power(0, 3)), 0)
+
+    def test_mix_columns_inverse(self):
+        mix = [[2, 3, 1, 1], [1, 2, 3, 1], [1, 1, 2, 3], [3, 1, 1, 2]]
+        inv_mix = [[0x0e, 0x0b, 0x0d, 0x09], [0x09, 0x0e, 0x0b, 0x0d], [0x0d, 0x09, 0x0e, 0x0b],
+                   [0x0b, 0x0d, 0x09, 0x0e]]
+        np.testing.assert_array_equal(gf256.mat_mul(mix, inv_mix), np.eye(4, dtype=np.uint8))
+        column = np.array([[0xdb, 0x13, 0x53, 0x45], [0xf2, 0x0a, 0x22, 0x5c]], dtype=np.uint8)
+        np.testing.assert_array_equal(gf256.matvec(mix, column), [[0x8e, 0x4d, 0xa1, 0xbc], [0x9f, 0xdc, 0x58, 0x9d]])
@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.integral import (IntegralAttack, balanced_guesses, column_positions, lambda_set,
+                                                       last_round_key, reduced_round_oracle)
+
+
+class TestIntegralAttack(unittest.TestCase):
+
+    def setUp(self):
+        self.key = bytes(range(0x40, 0x50))
+
+    def test_true_key_is_balanced(self):
+        oracle = reduced_round_oracle(self.key, rounds=4)
+        guesses = balanced_guesses(oracle(lambda_set(active=5)))
+        k4 = last_round_key(self.key, rounds=4)
+        self.assertTrue(all(guesses[i, k4[i]] for i in range(16)))
+
+    def test_4_rounds(self):
+        attack = IntegralAttack(reduced_round_oracle(self.key, rounds=4), rounds=4)
+        self.assertEqual(attack.attack_4_rounds(), last_round_key(self.key, rounds=4))
+        self.assertLessEqual(attack.queries, 8 * 256)
+
+    def test_5_rounds(self):
+        column = 2
+        k5 = np.frombuffer(last_round_key(self.key, rounds=5), dtype=np.uint8)[column_positions(column)]
+        candidates = np.random.default_rng(0).integers(0, 256, size=(512, 4), dtype=np.uint8)
+        candidates[100] = k5
+        attack = IntegralAttack(reduced_round_oracle(self.key, rounds=5), rounds=5)
+        left = attack.attack_5_rounds(candidates, column=column)
+        np.testing.assert_array_equal(left, k5[None, :])
+
+    def test_rounds(self):
+        with self.assertRaises(ValueError):
+            IntegralAttack(reduced_round_oracle(self.key, rounds=6), rounds=6)
+        with self.assertRaises(ValueError):
+            IntegralAttack(reduced_round_oracle(self.key, rounds=5), rounds=5).attack_4_rounds()
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.mitm import key_space
+from crypto_pkg.attacks.block_ciphers.utils import KeySpace, Text, prepare_key
+
+
+class TestKeySpace(unittest.TestCase):
+
+    def test_prefix(self):
+        space = KeySpace.prefix(24)
+        self.assertEqual(space.size, 2 ** 24)
+        for i in (0, 1, 12345, 2 ** 24 - 1):
+            self.assertEqual(space.key(i), prepare_key(i, max_key=24).ascii_hex)
+            self.assertEqual(space.index(space.key(i)), i)
+        self.assertEqual(key_space(24), "aes128-fips197/prefix-24")
+
+    def test_field(self):
+        rng = np.random.default_rng(0)
+        for bits, shift, key_size in ((32, 0, 128), (32, 48, 128), (20, 70, 128), (64, 30, 256), (8, 120, 128)):
+            space = KeySpace(bits, shift=shift, key_size=key_size)
+            indices = rng.integers(0, 2 ** bits, size=64, dtype=np.uint64)
+            keys = space.keys(indices)
+            self.assertEqual(keys.shape, (64, key_size // 8))
+            for i, key in zip(indices.tolist(), keys):
+                self.assertEqual(key.tobytes(), (i << shift).to_bytes(key_size // 8, 'big'))
+                self.assertEqual(space.index(key.tobytes()), i)
+
+    def test_base(self):
+        space = KeySpace(16, shift=32, base=0xabc << 100)
+        self.assertEqual(space.key(3), ((0xabc << 100) | 3 << 32).to_bytes(16, 'big'))
+        np.testing.assert_array_equal(space.blocks(5, 3), [list(space.key(i)) for i in (5, 6, 7)])
+        self.assertEqual(list(space.iter_keys(5, 8)), [space.key(i) for i in (5, 6, 7)])
+        self.assertIn(space.key(9), space)
+        self.assertNotIn(bytes(16), space)
+        with self.assertRaises(ValueError):
+            KeySpace(16, shift=32, base=1 << 40)
+        with self.assertRaises(ValueError):
+            space.key(2 ** 16)
+
+    def test_chunks_shards(self):
+        space = KeySpace.prefix(10)
+        self.assertEqual(space.chunks(300), [(0, 300), (300, 300), (600, 300), (900, 124)])
+        shards = space.shards(3)
+        self.assertEqual([len(s) for s in shards], [342, 341, 341])
+        self.assertEqual([i for s in shards for i in s], list(range(1024)))
+
+    def test_text(self):
+        text = Text(text=bytes.fromhex("00ff"))
+        self.assertEqual((text.hex, text.integer), ("00ff", 255))
+
+
+if __name__ == '__main__':
+    unittest.main()
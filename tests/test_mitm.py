@@ -0,0 +1,175 @@
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+
+import numpy as np
+from Crypto.Cipher import AES
+
+from crypto_pkg.attacks.block_ciphers.double_encryption import DoubleAESAttack
+from crypto_pkg.attacks.block_ciphers import mitm
+from crypto_pkg.attacks.block_ciphers.mitm import HEADER_SIZE, MITMCache, MITMTable, key_space
+from crypto_pkg.attacks.block_ciphers.utils import key_blocks, prepare_key
+from crypto_pkg.ciphers.symmetric.aes_variants import CUSTOM_AES, STANDARD_AES, VariantAES, pack_blocks
+from crypto_pkg.contracts.exceptions import IntegrityException
+
+
+class TestMITMTable(unittest.TestCase):
+
+    def setUp(self):
+        self.plain_text = bytes(range(16))
+        self.table = MITMTable.build(self.plain_text, max_key=12, chunk=1000)
+
+    def test_key_blocks(self):
+        for max_key in (8, 24, 40, 64):
+            indices = [0, 1, 2 ** max_key - 1, random.getrandbits(max_key)]
+            np.testing.assert_array_equal(key_blocks(indices, max_key),
+                                          [list(prepare_key(i, max_key=max_key).ascii_hex) for i in indices])
+
+    def test_lookup(self):
+        self.assertEqual((len(self.table), self.table.nbytes), (4096, 4096 * 12))
+        indices = [0, 7, 4095, 1234]
+        cipher_texts = [AES.new(prepare_key(i, max_key=12).ascii_hex, AES.MODE_ECB).encrypt(self.plain_text)
+                        for i in indices]
+        values = pack_blocks(np.frombuffer(b"".join(cipher_texts), dtype=np.uint8).reshape(-1, 16))
+        self.assertEqual(self.table.lookup(values).tolist(), indices)
+        # Same fingerprint, different low half: rejected by the full re-check
+        values[:, 1] ^= np.uint64(1)
+        self.assertEqual(self.table.lookup(values).tolist(), [-1] * 4)
+
+    def test_double_encryption_attack(self):
+        k1, k2 = prepare_key(random.getrandbits(12), max_key=12), prepare_key(random.getrandbits(12), max_key=12)
+        c = AES.new(k2.ascii_hex, AES.MODE_ECB).encrypt(AES.new(k1.ascii_hex, AES.MODE_ECB).encrypt(self.plain_text))
+        keys = DoubleAESAttack.attack(plain_text=self.plain_text.hex(), cipher_text=c.hex(), max_key=12)
+        self.assertEqual((keys[0].hex, keys[1].hex), (k1.hex, k2.hex))
+        self.assertIsNone(self.table.search(bytes(16)))
+
+    def test_parallel(self):
+        k1, k2 = prepare_key(3000, max_key=12), prepare_key(17, max_key=12)
+        c = AES.new(k2.ascii_hex, AES.MODE_ECB).encrypt(AES.new(k1.ascii_hex, AES.MODE_ECB).encrypt(self.plain_text))
+        with MITMTable.build(self.plain_text, max_key=12, chunk=512, workers=2) as table:
+            np.testing.assert_array_equal(table.fingerprints, self.table.fingerprints)
+            np.testing.assert_array_equal(table.indices, self.table.indices)
+            self.assertEqual(table.search(c, chunk=512, workers=2), (3000, 17))
+            self.assertIsNone(table.search(bytes(16), chunk=512, workers=2))
+        # A table in private memory is copied to shared memory for the search
+        self.assertEqual(self.table.search(c, chunk=512, workers=2), (3000, 17))
+
+    def test_parallel_variant(self):
+        aes = VariantAES(CUSTOM_AES)
+        k1, k2 = prepare_key(1000, max_key=10).ascii_hex, prepare_key(200, max_key=10).ascii_hex
+        c = bytes(aes.encrypt(aes.encrypt(self.plain_text, k1), k2))
+        single = MITMTable.build(self.plain_text, max_key=10, aes=aes)
+        with MITMTable.build(self.plain_text, max_key=10, aes=aes, chunk=256, workers=2) as table:
+            np.testing.assert_array_equal(table.fingerprints, single.fingerprints)
+            self.assertEqual(table.search(c, chunk=256, workers=2), (1000, 200))
+        self.assertEqual(single.search(c, chunk=256, workers=2), (1000, 200))
+
+    def test_search_keeps_no_worker_state(self):
+        self.assertIsNone(self.table.search(bytes(16), chunk=1024))
+        self.assertNotIn("table", mitm._worker)
+
+    def test_search_checkpoint(self):
+        k1, k2 = prepare_key(5, max_key=12), prepare_key(2000, max_key=12)
+        c = AES.new(k2.ascii_hex, AES.MODE_ECB).encrypt(AES.new(k1.ascii_hex, AES.MODE_ECB).encrypt(self.plain_text))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "search.json")
+            self.assertEqual(self.table.search(c, chunk=256, checkpoint=path), (5, 2000))
+            with open(path) as f:
+                self.assertEqual(len(json.load(f)["completed"]), 2000 // 256 + 1)
+            self.assertEqual(self.table.search(c, chunk=256, checkpoint=path), (5, 2000))
+
+
+class TestMITMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = MITMCache(self.directory.name)
+        self.plain_text = bytes(range(16))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_load(self):
+        table = MITMTable.build(self.plain_text, max_key=10)
+        path = os.path.join(self.directory.name, "table.mitm")
+        table.save(path)
+        self.assertEqual(os.path.getsize(path), HEADER_SIZE + 12 * 1024)
+        with MITMTable.load(path) as loaded:
+            self.assertIsInstance(loaded.fingerprints, np.memmap)
+            np.testing.assert_array_equal(loaded.fingerprints, table.fingerprints)
+            np.testing.assert_array_equal(loaded.indices, table.indices)
+            self.assertEqual((loaded.plain_text, loaded.max_key), (self.plain_text, 10))
+            c = AES.new(prepare_key(5, max_key=10).ascii_hex, AES.MODE_ECB).encrypt(
+                AES.new(prepare_key(700, max_key=10).ascii_hex, AES.MODE_ECB).encrypt(self.plain_text))
+            self.assertEqual(loaded.search(c, chunk=256, workers=2), (700, 5))
+        # Flip one byte of the fingerprints
+        with open(path, 'r+b') as f:
+            f.seek(HEADER_SIZE + 100)
+            byte = f.read(1)
+            f.seek(HEADER_SIZE + 100)
+            f.write(bytes([byte[0] ^ 1]))
+        with self.assertRaises(IntegrityException):
+            MITMTable.load(path)
+        with open(path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + 50)
+        with self.assertRaises(IntegrityException):
+            MITMTable.load(path, verify=False)
+
+    def test_save_load_variant(self):
+        aes = VariantAES(CUSTOM_AES)
+        c = bytes(aes.encrypt(aes.encrypt(self.plain_text, prepare_key(5, max_key=10).ascii_hex),
+                              prepare_key(7, max_key=10).ascii_hex))
+        table = MITMTable.build(self.plain_text, max_key=10, aes=aes)
+        path = os.path.join(self.directory.name, "table.mitm")
+        table.save(path)
+        with MITMTable.load(path) as loaded:
+            self.assertEqual(loaded.aes.variant, CUSTOM_AES)
+            self.assertEqual(loaded.key_space, table.key_space)
+            self.assertNotEqual(loaded.key_space, key_space(10))
+            self.assertEqual(loaded.search(c, chunk=256), (5, 7))
+        # An unknown cipher in the header is rejected
+        with open(path, 'r+b') as f:
+            header = f.read(HEADER_SIZE)
+            f.seek(header.index(b"aes128-custom"))
+            f.write(b"aes128-cust0m")
+        with self.assertRaises(IntegrityException):
+            MITMTable.load(path)
+
+    def test_cache_variant(self):
+        aes = VariantAES(CUSTOM_AES)
+        standard = self.cache.put(MITMTable.build(self.plain_text, max_key=8))
+        custom = self.cache.put(MITMTable.build(self.plain_text, max_key=8, aes=aes))
+        self.assertNotEqual(standard, custom)
+        self.assertEqual(self.cache.get(self.plain_text, 8).aes.variant, STANDARD_AES)
+        self.assertEqual(self.cache.get(self.plain_text, 8, CUSTOM_AES).aes.variant, CUSTOM_AES)
+        with self.cache.get_or_build(self.plain_text, max_key=8, aes=aes) as table:
+            self.assertEqual(table.path, custom)
+            np.testing.assert_array_equal(table.fingerprints, MITMTable.build(self.plain_text, 8, aes=aes).fingerprints)
+
+    def test_cache(self):
+        self.assertIsNone(self.cache.get(self.plain_text, 10))
+        table = self.cache.get_or_build(self.plain_text, max_key=10)
+        self.assertEqual(table.path, self.cache.path(self.plain_text, 10))
+        self.assertIsNotNone(self.cache.get(self.plain_text, 10))
+        self.assertIsNone(self.cache.get(self.plain_text, 9))
+        # Corrupted files are discarded
+        with open(table.path, 'r+b') as f:
+            f.truncate(HEADER_SIZE)
+        self.assertIsNone(self.cache.get(self.plain_text, 10))
+        self.assertFalse(os.path.exists(table.path))
+
+    def test_lru_eviction(self):
+        size = HEADER_SIZE + 12 * 256
+        cache = MITMCache(self.directory.name, max_bytes=2 * size)
+        plain_texts = [bytes([i]) * 16 for i in range(3)]
+        paths = []
+        for i, p in enumerate(plain_texts[:2]):
+            paths.append(cache.put(MITMTable.build(p, max_key=8)))
+            os.utime(paths[-1], (time.time() - 100 + i, time.time() - 100 + i))
+        # Using the first table makes the second one the least recently used
+        cache.get(plain_texts[0], 8)
+        paths.append(cache.put(MITMTable.build(plain_texts[2], max_key=8)))
+        self.assertEqual([os.path.exists(p) for p in paths], [True, False, True])
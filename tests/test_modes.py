@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Crypto.Cipher import AES
+
+from crypto_pkg.ciphers.symmetric.aes import CustomAES
+from crypto_pkg.ciphers.symmetric.modes import Mode, decrypt_file, encrypt_file
+
+
+class TestModes(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.key = bytes(range(16))
+        self.iv = bytes.fromhex('000102030405060708090a0bfffffffe')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def round_trip(self, data, mode, workers, chunk_blocks=3):
+        with open(self.path('plain'), 'wb') as f:
+            f.write(data)
+        encrypt_file(self.path('plain'), self.path('cipher'), key=self.key, mode=mode, iv=self.iv, workers=workers,
+                     chunk_blocks=chunk_blocks)
+        decrypt_file(self.path('cipher'), self.path('decrypted'), key=self.key, mode=mode, workers=workers,
+                     chunk_blocks=chunk_blocks)
+        with open(self.path('cipher'), 'rb') as f:
+            cipher_text = f.read()
+        with open(self.path('decrypted'), 'rb') as f:
+            self.assertEqual(f.read(), data)
+        return cipher_text
+
+    def test_round_trip_all_modes(self):
+        for mode in Mode:
+            for size in [0, 1, 16, 47, 200]:
+                for workers in [1, 2]:
+                    with self.subTest(mode=mode, size=size, workers=workers):
+                        self.round_trip(os.urandom(size), mode, workers)
+
+    def test_modes_match_block_cipher(self):
+        aes = CustomAES()
+        data = os.urandom(40)
+        blocks = [data[:16], data[16:32], data[32:] + bytes([8]) * 8]
+
+        ecb = self.round_trip(data, Mode.ECB, workers=2, chunk_blocks=1)
+        self.assertEqual(ecb, b''.join(bytes(aes.encrypt_blocks([list(b)], self.key)[0]) for b in blocks))
+
+        cbc = self.round_trip(data, Mode.CBC, workers=2, chunk_blocks=1)
+        previous, expected = self.iv, self.iv
+        for block in blocks:
+            previous = bytes(aes.encrypt_blocks([[a ^ b for a, b in zip(block, previous)]], self.key)[0])
+            expected += previous
+        self.assertEqual(cbc, expected)
+
+        ctr = self.round_trip(data, Mode.CTR, workers=2, chunk_blocks=1)
+        counters = [(int.from_bytes(self.iv, 'big') + i).to_bytes(16, 'big') for i in range(3)]
+        keystream = b''.join(bytes(aes.encrypt_blocks([list(c)], self.key)[0]) for c in counters)
+        self.assertEqual(ctr, self.iv + bytes(a ^ b for a, b in zip(data, keystream)))
+
+    def test_ctr_carry(self):
+        # The low 64-bit word of the counter overflows after the first block
+        self.iv = bytes.fromhex('0123456789abcdef') + b'\xff' * 8
+        data = os.urandom(32)
+        # CustomAES has its own key schedule: the counter blocks of the reference CTR mode are recovered by decrypting
+        # its keystream with the same reference cipher, then encrypted with CustomAES
+        keystream = AES.new(self.key, AES.MODE_CTR, nonce=b'', initial_value=self.iv).encrypt(bytes(len(data)))
+        counters = AES.new(self.key, AES.MODE_ECB).decrypt(keystream)
+        self.assertEqual(counters[16:], bytes.fromhex('0123456789abcdf0') + bytes(8))
+        blocks = CustomAES().encrypt_blocks([list(counters[i:i + 16]) for i in (0, 16)], self.key)
+        expected = bytes(a ^ b for a, b in zip(data, blocks.tobytes()))
+        for workers, chunk_blocks in [(1, 3), (2, 1)]:
+            with self.subTest(workers=workers):
+                ctr = self.round_trip(data, Mode.CTR, workers=workers, chunk_blocks=chunk_blocks)
+                self.assertEqual(ctr, self.iv + expected)
+
+    def test_wrong_key_padding(self):
+        with open(self.path('plain'), 'wb') as f:
+            f.write(b'some data')
+        encrypt_file(self.path('plain'), self.path('cipher'), key=self.key, mode=Mode.CBC, workers=1)
+        with self.assertRaises(ValueError):
+            decrypt_file(self.path('cipher'), self.path('decrypted'), key=bytes(16), mode=Mode.CBC, workers=1)
@@ -0,0 +1,51 @@
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.modified_aes import (ModifiedAES, column_encrypt, column_encrypt_batch,
+                                                           search_column)
+from crypto_pkg.attacks.block_ciphers.utils import Text
+
+
+class TestModifiedAESAttack(unittest.TestCase):
+
+    def test_column_encrypt(self):
+        aes = ModifiedAES()
+        rng = random.Random(0)
+        for _ in range(20):
+            k = [rng.getrandbits(8) for _ in range(16)]
+            p = [rng.getrandbits(8) for _ in range(16)]
+            c = aes.encrypt(plain_text=p, key=k)
+            for n in range(4):
+                word, key_word = (int.from_bytes(bytes(x[4 * n:4 * n + 4]), 'big') for x in (p, k))
+                self.assertEqual(column_encrypt(word, key_word), int.from_bytes(bytes(c[4 * n:4 * n + 4]), 'big'))
+
+    def test_column_encrypt_batch(self):
+        keys = np.random.default_rng(0).integers(0, 2 ** 32, size=100, dtype=np.uint32)
+        out = column_encrypt_batch(0x0123abcd, keys)
+        self.assertEqual(out.tolist(), [column_encrypt(0x0123abcd, int(k)) for k in keys])
+
+    def test_search_column(self):
+        key_word = 0x9e3779b9
+        target = column_encrypt(0x01020304, key_word)
+        self.assertEqual(search_column(0x01020304, target, start=key_word - 5000, stop=key_word + 10, batch_size=1024),
+                         key_word)
+        self.assertIsNone(search_column(0x01020304, target, start=0, stop=4096, batch_size=1024))
+
+    def test_attack(self):
+        aes = ModifiedAES()
+        key = bytes.fromhex('00000001000000100000000000000a01')
+        plain_text = bytes(range(16))
+        cipher_text = bytes(aes.encrypt(plain_text=list(plain_text), key=list(key)))
+        for batch_size in (0, 1 << 12):
+            self.assertEqual(aes.attack(plain_text=plain_text.hex(), cipher_text=cipher_text.hex(),
+                                        batch_size=batch_size), int.from_bytes(key, 'big'))
+
+    def test_attack_column_not_found(self):
+        aes = ModifiedAES()
+        with mock.patch.object(ModifiedAES, 'attack_section', side_effect=[Text(bytes(16)), None]) as section:
+            self.assertIsNone(aes.attack(plain_text=bytes(16).hex(), cipher_text=bytes(16).hex()))
+        # The search stops at the first column without a solution
+        self.assertEqual(section.call_count, 2)
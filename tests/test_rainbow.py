@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.rainbow import RainbowTable, crack, generate_tables, table_path, walk
+from crypto_pkg.attacks.block_ciphers.utils import key_blocks
+from crypto_pkg.ciphers.symmetric.aes_variants import STANDARD_AES, VariantAES
+from crypto_pkg.contracts.exceptions import IntegrityException
+
+
+class TestRainbowTable(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.aes = VariantAES(STANDARD_AES)
+        cls.plain_text = bytes(range(16))
+        cls.table = RainbowTable.generate(cls.plain_text, max_key=12, chain_length=32, n_chains=256, table_index=1,
+                                          chunk=64)
+
+    def encrypt(self, keys):
+        return self.aes.encrypt_under_keys(self.plain_text, key_blocks(np.asarray(keys, dtype=np.uint64), 12))
+
+    def test_chains(self):
+        ends = walk(self.aes, self.plain_text, self.table.starts, 0, 32, table_index=1, max_key=12)
+        np.testing.assert_array_equal(ends, self.table.ends)
+        self.assertTrue((np.diff(self.table.ends.astype(np.int64)) > 0).all())
+        self.assertLessEqual(self.table.coverage, 1.)
+
+    def test_lookup(self):
+        for column in (0, 1, 17, 31):
+            keys = walk(self.aes, self.plain_text, self.table.starts[:8], 0, column, table_index=1, max_key=12)
+            for key, cipher_text in zip(keys, self.encrypt(keys)):
+                found = self.table.lookup(cipher_text.tobytes())
+                self.assertIsNotNone(found)
+                np.testing.assert_array_equal(self.encrypt([found])[0], cipher_text)
+        self.assertIsNone(self.table.lookup(bytes(16)))
+
+    def test_parallel_generation(self):
+        table = RainbowTable.generate(self.plain_text, max_key=12, chain_length=32, n_chains=256, table_index=1,
+                                      workers=2, chunk=64)
+        np.testing.assert_array_equal(table.starts, self.table.starts)
+        np.testing.assert_array_equal(table.ends, self.table.ends)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "table.rbt")
+            self.table.save(path)
+            loaded = RainbowTable.load(path)
+            self.assertEqual((loaded.max_key, loaded.chain_length, loaded.table_index), (12, 32, 1))
+            np.testing.assert_array_equal(loaded.starts, self.table.starts)
+            np.testing.assert_array_equal(loaded.ends, self.table.ends)
+            del loaded
+            with open(path, 'r+b') as f:
+                f.seek(-1, os.SEEK_END)
+                f.write(b"\xff")
+            with self.assertRaises(IntegrityException):
+                RainbowTable.load(path)
+
+    def test_crack(self):
+        with tempfile.TemporaryDirectory() as directory:
+            tables = generate_tables(self.plain_text, max_key=12, chain_length=32, n_chains=256, n_tables=2,
+                                     directory=directory)
+            self.assertTrue(os.path.exists(table_path(directory, self.plain_text, 12, 32, 256, 1)))
+            reloaded = generate_tables(self.plain_text, max_key=12, chain_length=32, n_chains=256, n_tables=2,
+                                       directory=directory)
+            np.testing.assert_array_equal(reloaded[1].ends, tables[1].ends)
+            # Independent reductions per table
+            self.assertFalse(np.array_equal(tables[0].starts, tables[1].starts) and
+                             np.array_equal(tables[0].ends, tables[1].ends))
+            key = int(walk(self.aes, self.plain_text, tables[0].starts[:1], 0, 5, table_index=0, max_key=12)[0])
+            found = crack(reloaded, self.encrypt([key])[0].tobytes())
+            self.assertEqual(found, key_blocks(np.array([key], dtype=np.uint64), 12)[0].tobytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
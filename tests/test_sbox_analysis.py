@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from crypto_pkg.attacks.block_ciphers.sbox_analysis import analyze, bct, ddt, fwht, lat, sbox_hash
+from crypto_pkg.ciphers.symmetric.aes import reversed_box
+from crypto_pkg.number_theory import gf256
+
+PRESENT_SBOX = [0xc, 0x5, 0x6, 0xb, 0x9, 0x0, 0xa, 0xd, 0x3, 0xe, 0xf, 0x8, 0x4, 0x7, 0x1, 0x2]
+
+
+def parity(x):
+    return bin(x).count("1") % 2
+
+
+class TestSBoxAnalysis(unittest.TestCase):
+
+    def test_tables_match_definitions(self):
+        s = PRESENT_SBOX
+        inverse = [s.index(y) for y in range(16)]
+        for a in range(16):
+            for b in range(16):
+                self.assertEqual(ddt(s)[a, b], sum(s[x] ^ s[x ^ a] == b for x in range(16)))
+                self.assertEqual(lat(s)[a, b], sum(parity(a & x) == parity(b & s[x]) for x in range(16)) - 8)
+                self.assertEqual(bct(s)[a, b],
+                                 sum(inverse[s[x] ^ b] ^ inverse[s[x ^ a] ^ b] == a for x in range(16)))
+
+    def test_fwht(self):
+        values = np.random.default_rng(0).integers(-5, 5, size=(32, 3))
+        naive = np.array([[sum((-1) ** parity(a & x) * values[x, j] for x in range(32)) for j in range(3)]
+                          for a in range(32)])
+        np.testing.assert_array_equal(fwht(values, axis=0), naive)
+        np.testing.assert_array_equal(fwht(values.T, axis=1), naive.T)
+
+    def test_aes_sbox(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result = analyze(cache_dir=directory)
+            self.assertEqual((result["differential_uniformity"], result["nonlinearity"],
+                              result["boomerang_uniformity"]), (4, 112, 6))
+            path = os.path.join(directory, "sbox", f"{result['hash']}.npz")
+            self.assertTrue(os.path.exists(path))
+            cached = analyze(cache_dir=directory)
+            for name in ("ddt", "lat", "bct"):
+                np.testing.assert_array_equal(cached[name], result[name])
+        # The inverse S-box and the bare field inversion share the differential and linear properties
+        for sbox in (reversed_box, gf256.INV_TABLE):
+            result = analyze(sbox, cache=False)
+            self.assertEqual((result["differential_uniformity"], result["nonlinearity"]), (4, 112))
+
+    def test_non_permutation(self):
+        sbox = [x * x % 16 for x in range(16)]
+        result = analyze(sbox, cache=False)
+        self.assertNotIn("bct", result)
+        self.assertEqual(result["ddt"].sum(), 256)
+        with self.assertRaises(ValueError):
+            bct(sbox)
+
+    def test_invalid_sbox(self):
+        for sbox in ([0, 1, 2], list(range(512)), [0, 256]):
+            with self.assertRaises(ValueError):
+                sbox_hash(sbox)
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from crypto_pkg.attacks.scheduler import Progress, Scheduler
+
+TARGET = 7777
+calls = []
+
+
+def find_target(first, count):
+    return TARGET if first <= TARGET < first + count else None
+
+
+def multiples(first, count):
+    found = [i for i in range(first, first + count) if i % 300 == 0]
+    return found or None
+
+
+def record(first, count):
+    calls.append(first)
+    if first == 500:
+        raise KeyboardInterrupt
+    return None
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_first_match(self):
+        for workers in (1, 2):
+            self.assertEqual(Scheduler(find_target, 10000, chunk=100, workers=workers).run(), TARGET)
+        self.assertIsNone(Scheduler(find_target, 5000, chunk=100, workers=2).run())
+
+    def test_collect(self):
+        for workers in (1, 2):
+            found = Scheduler(multiples, 1000, chunk=64, workers=workers, first_match=False).run()
+            self.assertEqual([i for chunk in found for i in chunk], [0, 300, 600, 900])
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "job.json")
+            with self.assertRaises(KeyboardInterrupt):
+                Scheduler(record, 1000, chunk=100, workers=1, checkpoint=path, job="a", checkpoint_interval=60).run()
+            with open(path) as f:
+                self.assertEqual([first for first, _ in json.load(f)["completed"]], [0, 100, 200, 300, 400])
+            calls.clear()
+            scheduler = Scheduler(find_target, 10000, chunk=100, workers=1, checkpoint=path, job="a")
+            # Another total: the checkpoint is ignored
+            self.assertEqual(scheduler.run(), TARGET)
+            self.assertEqual(len(scheduler.completed), TARGET // 100 + 1)
+            resumed = Scheduler(find_target, 10000, chunk=100, workers=1, checkpoint=path, job="a")
+            self.assertEqual(resumed.run(), TARGET)
+            self.assertEqual(resumed.completed, scheduler.completed)
+
+    def test_progress(self):
+        reports = []
+        Scheduler(multiples, 1000, chunk=100, workers=1, first_match=False, report_interval=0,
+                  on_progress=reports.append).run()
+        self.assertEqual(len(reports), 10)
+        self.assertIsInstance(reports[-1], Progress)
+        self.assertEqual((reports[-1].done, reports[-1].total), (1000, 1000))
+        self.assertIn("1000/1000 keys (100.0%)", str(reports[-1]))
+
+
+if __name__ == '__main__':
+    unittest.main()